@@ -0,0 +1,158 @@
+"""
+Détection des recettes anormales.
+
+Pour chaque conducteur et chaque jour de la semaine, une recette est
+signalée quand son montant (ou sa dépense) s'écarte fortement de la médiane
+glissante des mêmes jours précédents. L'écart est mesuré de façon robuste :
+    score = 0,6745 * (valeur - médiane) / MAD
+
+Les séries sont chargées d'un bloc par conducteur (`values_list` trié, en
+flux), puis parcourues avec une fenêtre triée maintenue par `bisect` : la
+médiane s'y lit par indice, et seules les recettes postérieures au filigrane
+sont notées, l'historique ne sert qu'à remplir la fenêtre. Aucun accès ORM
+par ligne.
+
+Le filigrane (dernier jour analysé) recule quand une recette est saisie,
+modifiée ou supprimée à une date déjà analysée (import, saisie tardive) :
+le passage suivant la juge, ainsi que les jours qui la suivent. Les
+signalements des jours réanalysés qui ne sont plus produits sont retirés.
+Le filigrane est recopié dans le cache 'versions' : une saisie du jour,
+postérieure au filigrane, ne coûte pas d'écriture dans `Traitement`.
+"""
+from bisect import bisect_right, insort, bisect_left
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import groupby
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AnomalieRecette, Recette, Traitement
+
+
+NOM_TRAITEMENT = 'anomalies_recettes'
+FENETRE = 8          # nombre de mêmes jours précédents dans la médiane
+MINIMUM = 4          # historique minimal avant de juger une valeur
+SEUIL = 3.5          # score robuste au-delà duquel on signale
+CHAMPS = ('montant', 'depense')
+
+_CLE_FILIGRANE = 'anomalies:filigrane'
+
+
+def _mediane(triees):
+    """Médiane d'une liste déjà triée."""
+    milieu = len(triees) // 2
+    return triees[milieu] if len(triees) % 2 else (triees[milieu - 1] + triees[milieu]) / 2
+
+
+def _scores(valeurs, fenetre=FENETRE, minimum=MINIMUM, debut=0):
+    """Pour chaque valeur : (médiane, score) des `fenetre` valeurs précédentes, ou None.
+
+    Les valeurs d'indice inférieur à `debut` (déjà analysées) ne sont pas
+    notées : elles remplissent seulement la fenêtre.
+    """
+    triees = []
+    resultats = [None] * len(valeurs)
+    for i, valeur in enumerate(valeurs):
+        if i >= debut and len(triees) >= minimum:
+            mediane = _mediane(triees)
+            mad = _mediane(sorted(abs(v - mediane) for v in triees))
+            # Série quasi constante : on borne la dispersion pour éviter les faux positifs
+            mad = max(mad, 0.05 * abs(mediane), 1.0)
+            resultats[i] = (mediane, 0.6745 * (valeur - mediane) / mad)
+        insort(triees, valeur)
+        if len(triees) > fenetre:
+            del triees[bisect_left(triees, valeurs[i - fenetre])]
+    return resultats
+
+
+def _anomalies_conducteur(conducteur_id, lignes, depuis, fenetre, seuil):
+    """`lignes` : (id, date, montant, depense) triées par date pour un conducteur."""
+    par_jour = {}
+    for ligne in lignes:
+        par_jour.setdefault(ligne[1].weekday(), []).append(ligne)
+
+    anomalies = []
+    for serie in par_jour.values():
+        debut = bisect_right(serie, depuis, key=lambda ligne: ligne[1]) if depuis else 0
+        for indice_champ, champ in enumerate(CHAMPS, start=2):
+            valeurs = [float(ligne[indice_champ]) for ligne in serie]
+            for ligne, resultat in zip(serie, _scores(valeurs, fenetre, debut=debut)):
+                if resultat is None:
+                    continue
+                mediane, score = resultat
+                if abs(score) >= seuil:
+                    anomalies.append(AnomalieRecette(
+                        recette_id=ligne[0],
+                        conducteur_id=conducteur_id,
+                        date=ligne[1],
+                        champ=champ,
+                        valeur=ligne[indice_champ],
+                        mediane=Decimal(str(round(mediane, 2))),
+                        score=round(score, 2),
+                    ))
+    return anomalies
+
+
+def a_reverifier(jour):
+    """Fait réanalyser `jour` et les jours suivants au prochain passage (recette écrite après coup)."""
+    filigrane = caches['versions'].get(_CLE_FILIGRANE)
+    if filigrane is not None and jour > filigrane:
+        return      # jour pas encore analysé : le prochain passage le verra
+    veille = jour - timedelta(days=1)
+    Traitement.objects.filter(nom=NOM_TRAITEMENT, dernier_jour__gte=jour).update(dernier_jour=veille)
+    # Une copie plus haute que la base ne coûte qu'une écriture sans effet, jamais un jour oublié
+    caches['versions'].set(_CLE_FILIGRANE, veille, None)
+
+
+def detecter(complet=False, fenetre=FENETRE, seuil=SEUIL):
+    """Analyse les recettes (toutes, ou seulement celles après le dernier filigrane).
+
+    Retourne (nombre de recettes analysées, nombre d'anomalies enregistrées). Les
+    signalements des jours analysés qui ne s'appliquent plus sont supprimés.
+    """
+    traitement, _ = Traitement.objects.get_or_create(nom=NOM_TRAITEMENT)
+    filigrane = traitement.dernier_jour
+    depuis = None if complet else filigrane
+
+    lignes = Recette.objects.order_by('conducteur_id', 'date')
+    if depuis:
+        # Historique juste suffisant pour remplir la fenêtre de chaque jour de la semaine
+        lignes = lignes.filter(date__gt=depuis - timedelta(weeks=fenetre + 1))
+    lignes = lignes.values_list('conducteur_id', 'id', 'date', 'montant', 'depense').iterator(chunk_size=5000)
+
+    anomalies, analysees, dernier_jour = [], 0, depuis
+    for conducteur_id, groupe in groupby(lignes, key=lambda ligne: ligne[0]):
+        serie = [ligne[1:] for ligne in groupe]
+        analysees += sum(1 for ligne in serie if not depuis or ligne[1] > depuis)
+        dernier_jour = max(filter(None, [dernier_jour, serie[-1][1]]))
+        anomalies.extend(_anomalies_conducteur(conducteur_id, serie, depuis, fenetre, seuil))
+
+    produites = {(anomalie.recette_id, anomalie.champ) for anomalie in anomalies}
+    deja_signalees = AnomalieRecette.objects.filter(date__gt=depuis) if depuis else AnomalieRecette.objects.all()
+    obsoletes = [
+        pk for pk, recette_id, champ in deja_signalees.values_list('pk', 'recette_id', 'champ')
+        if (recette_id, champ) not in produites
+    ]
+
+    with transaction.atomic():
+        for i in range(0, len(obsoletes), 500):
+            AnomalieRecette.objects.filter(pk__in=obsoletes[i:i + 500]).delete()
+        AnomalieRecette.objects.bulk_create(
+            anomalies,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['recette', 'champ'],
+            update_fields=['valeur', 'mediane', 'score'],
+        )
+        # Filigrane reculé pendant l'analyse (recette écrite entre-temps) : on le garde
+        actuel = Traitement.objects.filter(pk=traitement.pk).values_list('dernier_jour', flat=True).first()
+        if actuel != filigrane:
+            dernier_jour = min(filter(None, [dernier_jour, actuel]), default=None)
+        traitement.dernier_jour = dernier_jour
+        traitement.derniere_execution = timezone.now()
+        traitement.save()
+    # Rien d'analysé (date.min) : aucune saisie n'a de filigrane à reculer
+    caches['versions'].set(_CLE_FILIGRANE, dernier_jour or date.min, None)
+    return analysees, len(anomalies)
@@ -0,0 +1,86 @@
+"""
+Archivage des recettes anciennes.
+
+La table des recettes grandit d'une ligne par conducteur et par jour, alors
+que le tableau de bord, le rapprochement et les anomalies ne lisent que les
+mois récents. `archiver()` déplace les recettes datées d'avant l'horizon
+(en mois entiers) dans `RecetteArchivee`, par petits lots : chaque lot est
+une transaction courte, les saisies des conducteurs passent entre deux lots.
+
+Les cumuls (jour, semaine, mois) ne bougent pas : ils restent le résumé des
+mois archivés, lu par le bilan, le détail et la série d'un conducteur. La
+suppression côté recettes se fait donc en SQL, sans les signaux qui
+retireraient la recette des cumuls. Les exports, la rentabilité par moto, la
+reconstruction des cumuls et le rapprochement lisent les deux tables.
+
+Une recette antérieure à l'horizon ou déjà archivée n'est plus saisie dans
+la table courante (import, formulaires) : voir `cles_archivees`.
+"""
+import time
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import AnomalieRecette, Recette, RecetteArchivee
+
+
+TAILLE_LOT = 500
+PAUSE = 0.05        # secondes laissées aux écrivains entre deux lots
+
+# Toutes les sources de recettes, archive d'abord (lignes les plus anciennes)
+SOURCES = (RecetteArchivee, Recette)
+
+_CHAMPS = ('id', 'conducteur_id', 'date', 'jour', 'montant', 'depense')
+
+
+def limite(mois=None, aujourd_hui=None):
+    """Premier jour du plus ancien mois gardé : les recettes antérieures sont archivées."""
+    mois = settings.ARCHIVE_RECETTES_MOIS if mois is None else mois
+    aujourd_hui = aujourd_hui or timezone.localdate()
+    rang = aujourd_hui.year * 12 + aujourd_hui.month - 1 - mois
+    return date(rang // 12, rang % 12 + 1, 1)
+
+
+def cles_archivees(conducteur_ids, debut, fin):
+    """(conducteur_id, date) déjà archivés pour ces conducteurs entre `debut` et `fin`.
+
+    L'unicité (conducteur, date) porte sur les deux tables : une recette
+    ressaisie à côté de son archive serait comptée deux fois (exports,
+    rentabilité, reconstruction des cumuls) et bloquerait l'archivage.
+    """
+    return set(
+        RecetteArchivee.objects.filter(conducteur_id__in=conducteur_ids, date__range=(debut, fin))
+        .values_list('conducteur_id', 'date')
+    )
+
+
+def _deplacer(ids):
+    maintenant = timezone.now()
+    RecetteArchivee.objects.bulk_create([
+        RecetteArchivee(date_archivage=maintenant, **valeurs)
+        for valeurs in Recette.objects.filter(pk__in=ids).values(*_CHAMPS)
+    ])
+    # Anomalies d'une recette archivée : plus rien à vérifier, et la clé étrangère l'exige
+    AnomalieRecette.objects.filter(recette_id__in=ids).delete()
+    with connection.cursor() as curseur:
+        curseur.execute(
+            f"DELETE FROM {Recette._meta.db_table} WHERE id IN ({', '.join(['%s'] * len(ids))})", ids
+        )
+
+
+def archiver(mois=None, taille=TAILLE_LOT, pause=PAUSE):
+    """Déplace les recettes antérieures à `limite(mois)` par lots de `taille` ; retourne leur nombre."""
+    avant = limite(mois)
+    total = 0
+    while True:
+        with transaction.atomic():
+            ids = list(Recette.objects.filter(date__lt=avant).order_by().values_list('pk', flat=True)[:taille])
+            if ids:
+                _deplacer(ids)
+        if not ids:
+            return total
+        total += len(ids)
+        if pause:
+            time.sleep(pause)
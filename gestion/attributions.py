@@ -0,0 +1,98 @@
+"""
+Historique des attributions de motos et rentabilité par moto.
+
+Chaque changement de conducteur ou de statut d'une moto ferme l'intervalle
+en cours ([debut, fin[) et en ouvre un nouveau. Une recette est imputée à la
+moto que son conducteur avait à cette date : jointure sur intervalle
+(recette.conducteur = attribution.conducteur et debut <= date < fin),
+servie par l'index (conducteur, debut, fin).
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import AttributionMoto, Moto, Panne, Recette, RecetteArchivee
+
+
+def enregistrer(moto_id, conducteur_id, statut, jour=None):
+    """Ferme l'intervalle en cours de la moto et en ouvre un pour le nouvel état."""
+    jour = jour or timezone.localdate()
+    en_cours = AttributionMoto.objects.filter(moto_id=moto_id, fin__isnull=True).first()
+    if en_cours is not None:
+        if en_cours.conducteur_id == conducteur_id and en_cours.statut == statut:
+            return en_cours
+        if en_cours.debut >= jour:
+            # Changements successifs dans la journée : seul le dernier état compte
+            en_cours.delete()
+        else:
+            en_cours.fin = jour
+            en_cours.save(update_fields=['fin'])
+    return AttributionMoto.objects.create(moto_id=moto_id, conducteur_id=conducteur_id, statut=statut, debut=jour)
+
+
+def recettes_imputees(debut=None, fin=None, modele=Recette):
+    """Recettes (`modele` : courantes ou archivées) imputées à la moto extérieure (OuterRef)
+    via l'attribution valable à leur date."""
+    # Toutes les conditions dans un seul filter() : elles portent sur la même jointure
+    conditions = [
+        Q(conducteur__attributions__moto=OuterRef('pk')),
+        Q(date__gte=F('conducteur__attributions__debut')),
+        Q(conducteur__attributions__fin__isnull=True) | Q(date__lt=F('conducteur__attributions__fin')),
+    ]
+    if debut:
+        conditions.append(Q(date__gte=debut))
+    if fin:
+        conditions.append(Q(date__lte=fin))
+    return modele.objects.filter(*conditions).order_by()
+
+
+def moto_du_jour(champ='moto_id'):
+    """Sous-requête : `champ` de l'attribution du conducteur valable à la date de la
+    recette extérieure (OuterRef), ex. 'moto__matricule' ; NULL hors de tout intervalle."""
+    attribution = AttributionMoto.objects.filter(
+        Q(fin__isnull=True) | Q(fin__gt=OuterRef('date')),
+        conducteur=OuterRef('conducteur_id'),
+        debut__lte=OuterRef('date'),
+    ).order_by('-debut')
+    return Subquery(attribution.values(champ)[:1])
+
+
+def conducteur_du_jour():
+    """Sous-requête : conducteur qui avait la moto extérieure (OuterRef 'moto_id') à la date
+    de la ligne extérieure ; NULL si elle n'était attribuée à personne."""
+    attribution = AttributionMoto.objects.filter(
+        Q(fin__isnull=True) | Q(fin__gt=OuterRef('date')),
+        moto=OuterRef('moto_id'),
+        debut__lte=OuterRef('date'),
+    ).order_by('-debut')
+    return Subquery(attribution.values('conducteur_id')[:1])
+
+
+def _total(requete, champ):
+    zero = Value(Decimal('0'), output_field=DecimalField(max_digits=14, decimal_places=2))
+    # Regroupement constant : une seule ligne de total par moto
+    somme = requete.annotate(groupe=Value(1)).values('groupe').annotate(total=Sum(champ)).values('total')
+    return Coalesce(Subquery(somme, output_field=DecimalField(max_digits=14, decimal_places=2)), zero)
+
+
+def rentabilite_motos(debut=None, fin=None):
+    """Toutes les motos avec leurs recettes, dépenses, pannes et résultat, en une requête."""
+    pannes = Panne.objects.filter(moto=OuterRef('pk')).order_by()
+    if debut:
+        pannes = pannes.filter(date__gte=debut)
+    if fin:
+        pannes = pannes.filter(date__lte=fin)
+
+    recettes = recettes_imputees(debut, fin)
+    archivees = recettes_imputees(debut, fin, RecetteArchivee)
+    motos = list(Moto.objects.annotate(
+        total_recettes=_total(recettes, 'montant') + _total(archivees, 'montant'),
+        total_depenses=_total(recettes, 'depense') + _total(archivees, 'depense'),
+        total_pannes=_total(pannes, 'montant_depense'),
+    ))
+    # Résultat calculé ici plutôt qu'en SQL, pour ne pas réévaluer les sous-requêtes
+    for moto in motos:
+        moto.resultat = moto.total_recettes - moto.total_depenses - moto.total_pannes
+    return sorted(motos, key=lambda moto: (-moto.resultat, moto.nom))
@@ -0,0 +1,198 @@
+"""
+Bilan général sur une période (jour, semaine, mois, intervalle libre ou tout).
+
+Les totaux sont lus dans les cumuls (voir `cumuls.py`) avec une seule
+requête d'agrégation par table, puis mis en cache. La clé de cache
+contient la « version » de chaque mois couvert : une écriture dans un mois
+n'invalide que les bilans qui le couvrent. Les versions sont gardées dans
+le cache 'versions', qui n'évince jamais rien. La clé porte aussi la base
+lue (voir `instantane.source`) : un bilan de l'instantané n'est pas resservi
+en direct.
+"""
+import calendar
+import hashlib
+import time
+from datetime import date, timedelta
+
+from django.core.cache import cache, caches
+from django.db.models import Count, Q, Sum
+
+from . import instantane
+from .cumuls import en_date
+from .models import Conducteur, CumulPanne, CumulRecette, Moto
+
+
+PERIODES_BILAN = (
+    ('jour', 'Jour'),
+    ('semaine', 'Semaine'),
+    ('mois', 'Mois'),
+    ('perso', 'Personnalisée'),
+    ('tout', 'Tout'),
+)
+
+DUREE_CACHE = 60 * 60
+_VERSION_TOUT = 'bilan:version:tout'
+_VERSION_FLOTTE = 'bilan:version:flotte'
+
+
+def _lire_date(valeur, defaut):
+    try:
+        return date.fromisoformat(valeur) if valeur else defaut
+    except ValueError:
+        return defaut
+
+
+def intervalle_depuis_requete(params, aujourd_hui=None):
+    """Retourne (periode, debut, fin) à partir des paramètres GET.
+
+    `debut` et `fin` valent None pour la période 'tout'.
+    """
+    aujourd_hui = aujourd_hui or date.today()
+    periode = params.get('periode', 'tout')
+    reference = _lire_date(params.get('date') or params.get('debut'), aujourd_hui)
+
+    if periode == 'jour':
+        return periode, reference, reference
+    if periode == 'semaine':
+        debut = reference - timedelta(days=reference.weekday())
+        return periode, debut, debut + timedelta(days=6)
+    if periode == 'mois':
+        dernier = calendar.monthrange(reference.year, reference.month)[1]
+        return periode, reference.replace(day=1), reference.replace(day=dernier)
+    if periode == 'perso':
+        debut = _lire_date(params.get('debut'), reference)
+        fin = _lire_date(params.get('fin'), debut)
+        if fin < debut:
+            debut, fin = fin, debut
+        return periode, debut, fin
+    return 'tout', None, None
+
+
+def _mois_couverts(debut, fin):
+    mois = []
+    courant = debut.replace(day=1)
+    while courant <= fin:
+        mois.append(courant)
+        courant = (courant + timedelta(days=32)).replace(day=1)
+    return mois
+
+
+def filtre_cumuls(debut, fin, prefixe=''):
+    """Q sélectionnant le plus petit ensemble de lignes de cumul couvrant [debut, fin].
+
+    Les mois entièrement inclus sont lus dans les cumuls mensuels, une
+    semaine exacte dans son cumul hebdomadaire, le reste jour par jour.
+    `prefixe` permet de filtrer à travers une relation (ex. 'cumuls__').
+    """
+    def q(**champs):
+        return Q(**{prefixe + champ: valeur for champ, valeur in champs.items()})
+
+    if debut is None:
+        return q(periode='mois')
+    if debut.weekday() == 0 and fin == debut + timedelta(days=6):
+        return q(periode='semaine', debut=debut)
+
+    mois_complets = [
+        m for m in _mois_couverts(debut, fin)
+        if m >= debut and m.replace(day=calendar.monthrange(m.year, m.month)[1]) <= fin
+    ]
+    if not mois_complets:
+        return q(periode='jour', debut__range=(debut, fin))
+
+    premier = mois_complets[0]
+    apres_dernier = (mois_complets[-1] + timedelta(days=32)).replace(day=1)
+    filtre = q(periode='mois', debut__in=mois_complets)
+    if debut < premier:
+        filtre |= q(periode='jour', debut__range=(debut, premier - timedelta(days=1)))
+    if apres_dernier <= fin:
+        filtre |= q(periode='jour', debut__range=(apres_dernier, fin))
+    return filtre
+
+
+def intervalle_precedent(periode, debut, fin):
+    """Période de même nature juste avant [debut, fin] (None, None pour 'tout')."""
+    if debut is None:
+        return None, None
+    if periode == 'mois':
+        fin_precedente = debut - timedelta(days=1)
+        return fin_precedente.replace(day=1), fin_precedente
+    duree = fin - debut + timedelta(days=1)
+    return debut - duree, fin - duree
+
+
+def calculer_bilan(debut, fin):
+    """Une requête par table : cumuls de recettes, cumuls de pannes, motos (comptage
+    conditionnel par statut) et conducteurs."""
+    filtre = filtre_cumuls(debut, fin)
+
+    recettes = CumulRecette.objects.filter(filtre).aggregate(
+        total_recettes=Sum('montant'),
+        total_depenses=Sum('depense'),
+        nb_recettes=Sum('nb_recettes'),
+    )
+    pannes = CumulPanne.objects.filter(filtre).aggregate(
+        total_pannes=Sum('montant_depense'),
+        nb_pannes=Sum('nb_pannes'),
+    )
+    motos = Moto.objects.aggregate(
+        nb_motos_disponibles=Count('id', filter=Q(statut='disponible')),
+        nb_motos_attribuees=Count('id', filter=Q(statut='attribuee')),
+        nb_motos_reparation=Count('id', filter=Q(statut='reparation')),
+    )
+
+    bilan = {cle: valeur or 0 for cle, valeur in {**recettes, **pannes, **motos}.items()}
+    bilan['nb_conducteurs'] = Conducteur.objects.count()
+    # Bénéfice net = recettes - (dépenses + pannes)
+    bilan['benefice_total'] = bilan['total_recettes'] - (bilan['total_depenses'] + bilan['total_pannes'])
+    return bilan
+
+
+# -----------------------
+# Cache
+# -----------------------
+def _cle_version_mois(jour):
+    return f"bilan:version:{jour:%Y-%m}"
+
+
+def cle_cache(prefixe, debut, fin, *parametres):
+    """Clé de cache qui change dès qu'un mois couvert par [debut, fin] est modifié, ou la base lue."""
+    cles = [_VERSION_FLOTTE]
+    if debut is None:
+        cles.append(_VERSION_TOUT)
+    else:
+        cles.extend(_cle_version_mois(m) for m in _mois_couverts(debut, fin))
+    versions = caches['versions'].get_many(cles)
+    signature = '.'.join(str(versions.get(cle, 0)) for cle in cles)
+    parametres = ':'.join(str(p) for p in parametres)
+    return (
+        f"{prefixe}:{instantane.source()}:{debut}:{fin}:{parametres}:"
+        f"{hashlib.md5(signature.encode()).hexdigest()}"
+    )
+
+
+def cles_par_mois(prefixe, mois):
+    """Une clé par mois, qui ne change que lorsque ce mois est modifié."""
+    versions = caches['versions'].get_many([_cle_version_mois(m) for m in mois])
+    return {m: f"{prefixe}:{m:%Y-%m}:{versions.get(_cle_version_mois(m), 0)}" for m in mois}
+
+
+def bilan_en_cache(debut, fin):
+    cle = cle_cache('bilan', debut, fin)
+    bilan = cache.get(cle)
+    if bilan is None:
+        bilan = calculer_bilan(debut, fin)
+        cache.set(cle, bilan, DUREE_CACHE)
+    return bilan
+
+
+def invalider_periode(*jours):
+    """À appeler quand une recette ou une panne change aux dates données."""
+    version = time.time_ns()
+    cles = {_cle_version_mois(en_date(jour)): version for jour in jours if jour}
+    cles[_VERSION_TOUT] = version
+    caches['versions'].set_many(cles, None)
+
+
+def invalider_flotte():
+    """À appeler quand le nombre de conducteurs ou le statut d'une moto change."""
+    caches['versions'].set(_VERSION_FLOTTE, time.time_ns(), None)
@@ -0,0 +1,122 @@
+"""
+Classement des conducteurs par recettes, dépenses et bénéfice sur une période.
+
+Une seule requête : les cumuls de la période courante et de la période
+précédente sont agrégés par conducteur (sommes conditionnelles), puis
+classés en SQL avec `Window(Rank())`. Seuls les conducteurs ayant des
+recettes sur la période courante sont classés ; le rang précédent n'est
+calculé qu'entre ceux qui en avaient aussi sur la période précédente.
+L'évolution de rang se lit directement dans les deux colonnes de rang.
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import BooleanField, DecimalField, ExpressionWrapper, F, Q, Sum, Value, Window
+from django.db.models.functions import Coalesce, Rank
+
+from .bilan import DUREE_CACHE, cle_cache, filtre_cumuls, intervalle_precedent
+from .models import CumulRecette
+
+
+CRITERES = (
+    ('benefice', 'Bénéfice'),
+    ('montant', 'Recettes'),
+    ('depense', 'Dépenses'),
+)
+PAR_PAGE = 50
+
+# Critère -> annotation (les noms diffèrent des champs sommés, exigé par l'ORM)
+_ANNOTATIONS = {'benefice': 'benefice', 'montant': 'recettes', 'depense': 'depenses'}
+
+
+def _somme(champ, filtre):
+    zero = Value(Decimal('0'), output_field=DecimalField(max_digits=14, decimal_places=2))
+    return Coalesce(Sum(champ, filter=filtre), zero)
+
+
+def requete_classement(debut, fin, debut_prec=None, fin_prec=None, critere='benefice'):
+    courant = filtre_cumuls(debut, fin)
+    filtre = courant
+    sommes = {
+        'recettes': _somme('montant', courant),
+        'depenses': _somme('depense', courant),
+        'nb_courant': Sum('nb_recettes', filter=courant),
+    }
+    avec_precedent = debut_prec is not None
+    if avec_precedent:
+        precedent = filtre_cumuls(debut_prec, fin_prec)
+        filtre |= precedent
+        sommes['recettes_prec'] = _somme('montant', precedent)
+        sommes['depenses_prec'] = _somme('depense', precedent)
+        sommes['nb_prec'] = Sum('nb_recettes', filter=precedent)
+
+    lignes = (
+        CumulRecette.objects.filter(filtre)
+        .values(
+            'conducteur_id', 'conducteur__user__username',
+            'conducteur__user__first_name', 'conducteur__user__last_name',
+        )
+        .annotate(**sommes)
+        # Un conducteur présent seulement sur la période précédente n'est pas classé
+        .filter(nb_courant__gt=0)
+        .annotate(benefice=F('recettes') - F('depenses'))
+    )
+    annotation = _ANNOTATIONS[critere]
+    rangs = {
+        'rang': Window(Rank(), order_by=F(annotation).desc()),
+        'rang_montant': Window(Rank(), order_by=F('recettes').desc()),
+        'rang_depense': Window(Rank(), order_by=F('depenses').desc()),
+        'rang_benefice': Window(Rank(), order_by=F('benefice').desc()),
+    }
+    if avec_precedent:
+        lignes = lignes.annotate(benefice_prec=F('recettes_prec') - F('depenses_prec'))
+        # Classement précédent entre les seuls conducteurs qui y avaient des recettes
+        rangs['rang_prec'] = Window(
+            Rank(),
+            partition_by=ExpressionWrapper(Q(nb_prec__gt=0), output_field=BooleanField()),
+            order_by=F(f'{annotation}_prec').desc(),
+        )
+    return lignes.annotate(**rangs).order_by('rang', 'conducteur_id')
+
+
+def _ligne(ligne):
+    nom = f"{ligne['conducteur__user__first_name']} {ligne['conducteur__user__last_name']}".strip()
+    resultat = {
+        'conducteur': ligne['conducteur_id'],
+        'nom': nom or ligne['conducteur__user__username'],
+        'montant': ligne['recettes'],
+        'depense': ligne['depenses'],
+        'benefice': ligne['benefice'],
+        'rang': ligne['rang'],
+        'rang_montant': ligne['rang_montant'],
+        'rang_depense': ligne['rang_depense'],
+        'rang_benefice': ligne['rang_benefice'],
+        'rang_precedent': None,
+        'evolution': None,
+    }
+    # Pas de rang précédent si le conducteur n'avait aucune recette sur la période précédente
+    if ligne.get('nb_prec'):
+        resultat['rang_precedent'] = ligne['rang_prec']
+        resultat['evolution'] = ligne['rang_prec'] - ligne['rang']
+    return resultat
+
+
+def classement_en_cache(periode, debut, fin, critere='benefice', page=1, par_page=PAR_PAGE):
+    """Une page du classement, mise en cache jusqu'à la prochaine écriture dans les deux périodes."""
+    debut_prec, fin_prec = intervalle_precedent(periode, debut, fin)
+    cle = cle_cache('classement', debut_prec or debut, fin, critere, page, par_page)
+    resultat = cache.get(cle)
+    if resultat is None:
+        pages = Paginator(requete_classement(debut, fin, debut_prec, fin_prec, critere), par_page)
+        page_courante = pages.get_page(page)
+        resultat = {
+            'lignes': [_ligne(ligne) for ligne in page_courante.object_list],
+            'page': page_courante.number,
+            'nb_pages': pages.num_pages,
+            'total': pages.count,
+            'debut_precedent': debut_prec,
+            'fin_precedente': fin_prec,
+        }
+        cache.set(cle, resultat, DUREE_CACHE)
+    return resultat
@@ -0,0 +1,6 @@
+from .decorators import version_contenu
+
+
+def version_gabarits(request):
+    """Empreinte des gabarits, utilisée comme clé des fragments mis en cache."""
+    return {'version_gabarits': version_contenu()[0]}
@@ -0,0 +1,272 @@
+"""
+Cumuls pré-agrégés des recettes (par conducteur) et des pannes (par moto).
+
+Chaque Recette / Panne alimente trois lignes de cumul : son jour, sa semaine
+(débutant le lundi) et son mois. Les vues financières lisent ces quelques
+lignes au lieu de ré-agréger tout l'historique.
+"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum, Count
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
+from django.utils import timezone
+
+from .archivage import SOURCES as SOURCES_RECETTES
+from .models import CumulRecette, CumulPanne, Panne
+
+
+TRONCATURES = {
+    'jour': TruncDay,
+    'semaine': TruncWeek,
+    'mois': TruncMonth,
+}
+
+
+def en_date(valeur):
+    """Normalise une valeur de DateField (date, datetime ou chaîne ISO)."""
+    if isinstance(valeur, datetime):
+        if timezone.is_aware(valeur):
+            valeur = timezone.localtime(valeur)
+        return valeur.date()
+    if isinstance(valeur, str):
+        return date.fromisoformat(valeur)
+    return valeur
+
+
+def en_decimal(valeur):
+    return Decimal(str(valeur or 0))
+
+
+def debut_periode(periode, jour):
+    """Premier jour de la période ('jour', 'semaine' ou 'mois') contenant `jour`."""
+    if periode == 'semaine':
+        return date.fromordinal(jour.toordinal() - jour.weekday())
+    if periode == 'mois':
+        return jour.replace(day=1)
+    return jour
+
+
+def debuts_periodes(jour):
+    jour = en_date(jour)
+    return [(periode, debut_periode(periode, jour)) for periode in TRONCATURES]
+
+
+def _appliquer(modele, filtres, jour, deltas, creer=True):
+    """Ajoute `deltas` aux lignes de cumul du jour, de la semaine et du mois.
+
+    Les mises à jour passent par des expressions F() : deux écritures
+    concurrentes sur le même cumul ne se marchent pas dessus.
+    """
+    increments = {champ: F(champ) + valeur for champ, valeur in deltas.items()}
+    for periode, debut in debuts_periodes(jour):
+        lignes = modele.objects.filter(periode=periode, debut=debut, **filtres)
+        if lignes.update(**increments) or not creer:
+            continue
+        try:
+            with transaction.atomic():
+                modele.objects.create(periode=periode, debut=debut, **filtres, **deltas)
+        except IntegrityError:
+            # Créée entre-temps par une autre requête
+            lignes.update(**increments)
+
+
+# -----------------------
+# Recettes
+# -----------------------
+def etat_recette(recette):
+    return {
+        'conducteur_id': recette.conducteur_id,
+        'date': en_date(recette.date),
+        'montant': en_decimal(recette.montant),
+        'depense': en_decimal(recette.depense),
+    }
+
+
+def ajouter_recette(etat, signe=1):
+    _appliquer(
+        CumulRecette,
+        {'conducteur_id': etat['conducteur_id']},
+        etat['date'],
+        {
+            'montant': signe * etat['montant'],
+            'depense': signe * etat['depense'],
+            'nb_recettes': signe,
+        },
+        # Une suppression ne crée jamais de ligne (cas des suppressions en cascade)
+        creer=signe > 0,
+    )
+
+
+def retirer_recette(etat):
+    ajouter_recette(etat, signe=-1)
+
+
+# -----------------------
+# Pannes
+# -----------------------
+def etat_panne(panne):
+    return {
+        'moto_id': panne.moto_id,
+        'date': en_date(panne.date),
+        'montant_depense': en_decimal(panne.montant_depense),
+    }
+
+
+def ajouter_panne(etat, signe=1):
+    _appliquer(
+        CumulPanne,
+        {'moto_id': etat['moto_id']},
+        etat['date'],
+        {
+            'montant_depense': signe * etat['montant_depense'],
+            'nb_pannes': signe,
+        },
+        creer=signe > 0,
+    )
+
+
+def retirer_panne(etat):
+    ajouter_panne(etat, signe=-1)
+
+
+# -----------------------
+# Reconstruction complète
+# -----------------------
+def fin_periode(periode, jour):
+    """Dernier jour de la période contenant `jour`."""
+    if periode == 'semaine':
+        return debut_periode(periode, jour) + timedelta(days=6)
+    if periode == 'mois':
+        return (jour.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return jour
+
+
+def _reconstruire(modele, sources, cle, sommes, filtres=None, debut=None, fin=None):
+    """Recalcule les cumuls par agrégation ensembliste (une requête par période et par source).
+
+    Les groupes de plusieurs `sources` (recettes courantes et archivées) sont
+    additionnés. Avec `debut`/`fin`, seuls les buckets qui recoupent cet
+    intervalle sont recalculés.
+    """
+    filtres = filtres or {}
+    nb = 0
+    for periode, troncature in TRONCATURES.items():
+        cumuls = modele.objects.filter(periode=periode, **filtres)
+        if debut is not None:
+            cumuls = cumuls.filter(debut__range=(debut_periode(periode, debut), fin))
+        cumuls.delete()
+
+        totaux = {}
+        for source in sources:
+            lignes_source = source.objects.filter(**filtres)
+            if debut is not None:
+                lignes_source = lignes_source.filter(
+                    date__range=(debut_periode(periode, debut), fin_periode(periode, fin)),
+                )
+            groupes = (
+                lignes_source.order_by()
+                .annotate(debut=troncature('date'))
+                .values(cle, 'debut')
+                .annotate(**sommes)
+            )
+            for groupe in groupes.iterator(chunk_size=2000):
+                groupe['debut'] = en_date(groupe['debut'])
+                existant = totaux.setdefault((groupe[cle], groupe['debut']), groupe)
+                if existant is not groupe:
+                    for champ in sommes:
+                        existant[champ] += groupe[champ]
+        modele.objects.bulk_create(
+            [modele(periode=periode, **groupe) for groupe in totaux.values()], batch_size=500,
+        )
+        nb += len(totaux)
+    return nb
+
+
+@transaction.atomic
+def reconstruire_cumuls_recettes(conducteur_ids=None, debut=None, fin=None):
+    """Recalcule les cumuls de recettes (tous, ou ceux des conducteurs / dates donnés),
+    recettes archivées comprises."""
+    filtres = {'conducteur_id__in': conducteur_ids} if conducteur_ids is not None else None
+    return _reconstruire(
+        CumulRecette, SOURCES_RECETTES, 'conducteur_id',
+        {'montant': Sum('montant'), 'depense': Sum('depense'), 'nb_recettes': Count('id')},
+        filtres, debut, fin,
+    )
+
+
+@transaction.atomic
+def reconstruire_cumuls_pannes(moto_ids=None, debut=None, fin=None):
+    """Recalcule les cumuls de pannes (tous, ou ceux des motos / dates donnés)."""
+    filtres = {'moto_id__in': moto_ids} if moto_ids is not None else None
+    return _reconstruire(
+        CumulPanne, (Panne,), 'moto_id',
+        {'montant_depense': Sum('montant_depense'), 'nb_pannes': Count('id')},
+        filtres, debut, fin,
+    )
+
+
+# -----------------------
+# Lecture
+# -----------------------
+def totaux_recettes(**filtres):
+    """Totaux (montant, depense) à partir des cumuls mensuels."""
+    totaux = CumulRecette.objects.filter(periode='mois', **filtres).aggregate(
+        montant=Sum('montant'), depense=Sum('depense'),
+    )
+    return {cle: valeur or 0 for cle, valeur in totaux.items()}
+
+
+def total_pannes(**filtres):
+    total = CumulPanne.objects.filter(periode='mois', **filtres).aggregate(
+        total=Sum('montant_depense'),
+    )['total']
+    return total or 0
+
+
+POINTS_MAX = 120
+
+# Granularité supérieure et nombre maximal de buckets regroupés par point
+PAS_SUPERIEUR = {'jour': ('semaine', 7), 'semaine': ('mois', 5)}
+
+
+def serie_recettes(conducteur_id, pas='jour', points_max=POINTS_MAX, debut=None, fin=None):
+    """Série (debut, montant, depense, benefice) d'un conducteur, lue dans ses cumuls.
+
+    Au-delà de `points_max` buckets, les buckets consécutifs sont regroupés
+    (sommés) : la courbe garde les totaux exacts avec un nombre de points fixe.
+    Si le pas demandé obligerait à lire trop de lignes, on passe au pas
+    supérieur (jour -> semaine -> mois). Retourne (pas utilisé, série).
+    """
+    def lignes_du_pas(pas):
+        lignes = CumulRecette.objects.filter(
+            conducteur_id=conducteur_id, periode=pas, nb_recettes__gt=0,
+        )
+        if debut:
+            lignes = lignes.filter(debut__gte=debut_periode(pas, debut))
+        if fin:
+            lignes = lignes.filter(debut__lte=fin)
+        return lignes
+
+    lignes = lignes_du_pas(pas)
+    while pas in PAS_SUPERIEUR:
+        superieur, facteur = PAS_SUPERIEUR[pas]
+        if lignes.count() <= points_max * facteur:
+            break
+        pas, lignes = superieur, lignes_du_pas(superieur)
+    lignes = list(lignes.order_by('debut').values_list('debut', 'montant', 'depense'))
+
+    taille = -(-len(lignes) // points_max) if lignes else 1
+    serie = []
+    for i in range(0, len(lignes), taille):
+        groupe = lignes[i:i + taille]
+        montant = sum(ligne[1] for ligne in groupe)
+        depense = sum(ligne[2] for ligne in groupe)
+        serie.append({
+            'debut': groupe[0][0].isoformat(),
+            'montant': float(montant),
+            'depense': float(depense),
+            'benefice': float(montant - depense),
+        })
+    return pas, serie
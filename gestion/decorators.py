@@ -1,6 +1,16 @@
-from django.shortcuts import redirect
+import hashlib
+from datetime import date, datetime, time, timezone as dt_timezone
 from functools import wraps
-from .models import Conducteur
+from pathlib import Path
+from time import monotonic
+
+from django.conf import settings
+from django.contrib import messages
+from django.shortcuts import redirect
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
+
+from .middleware import profil
 
 # Pour les conducteurs uniquement
 def conducteur_required(view_func):
@@ -14,8 +24,8 @@ def conducteur_required(view_func):
         if request.user.role != 'conducteur':
             return redirect('home')
 
-        # 🔒 Vérifie qu’un objet Conducteur existe
-        if not Conducteur.objects.filter(user=request.user).exists():
+        # 🔒 Vérifie qu’un objet Conducteur existe (chargé une fois, réutilisé par la vue)
+        if profil(request).conducteur is None:
             return redirect('home')  # ou afficher un message
 
         return view_func(request, *args, **kwargs)
@@ -47,9 +57,86 @@ def client_required(view_func):
         if request.user.role != 'client':
             return redirect('home')
 
-        # 🔒 Vérifie qu’un objet Client existe
-        if not hasattr(request.user, 'client'):
+        # 🔒 Vérifie qu’un objet Client existe (chargé une fois, réutilisé par la vue)
+        if profil(request).client is None:
             return redirect('home')  # ou afficher un message
 
         return view_func(request, *args, **kwargs)
     return wrapper
+
+
+# -----------------------
+# Pages publiques : ETag / Last-Modified, 304 et gzip
+# -----------------------
+_DOSSIER_GABARITS = Path(__file__).resolve().parent / 'templates'
+_VERSION_CONTENU = []
+
+
+def version_contenu():
+    """(empreinte, date) des gabarits : change à chaque déploiement qui les modifie.
+
+    Calculée une fois par processus ; en DEBUG, au plus une fois par seconde.
+    """
+    maintenant = monotonic()
+    if _VERSION_CONTENU and (not settings.DEBUG or maintenant - _VERSION_CONTENU[0] < 1):
+        return _VERSION_CONTENU[1]
+    horodatages = sorted(
+        (str(chemin), chemin.stat().st_mtime_ns) for chemin in _DOSSIER_GABARITS.rglob('*.html')
+    )
+    empreinte = hashlib.md5(repr(horodatages).encode()).hexdigest()
+    derniere = max((ns for _, ns in horodatages), default=0)
+    version = (empreinte, datetime.fromtimestamp(derniere / 1e9, tz=dt_timezone.utc))
+    _VERSION_CONTENU[:] = [maintenant, version]
+    return version
+
+
+def _visiteur(request):
+    """Part propre au visiteur (compte, jeton CSRF), ou None si la page ne doit pas être servie en 304."""
+    stockage = messages.get_messages(request)
+    en_attente = bool(list(stockage))
+    stockage.used = False  # les messages restent à afficher
+    if en_attente:
+        return None
+    return f"{request.user.pk or 0}:{request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')}"
+
+
+def signature_faq(request):
+    """Questions affichées sur `touriste` : cycle de deux jours et version des réponses."""
+    from . import faq
+
+    cycle, version = faq.cycle_courant(), faq.version()
+    debut_cycle = datetime.combine(date.fromordinal(cycle * 2), time.min, tzinfo=dt_timezone.utc)
+    modifie = datetime.fromtimestamp(version / 1e9, tz=dt_timezone.utc) if version else debut_cycle
+    return f"{cycle}:{version}", max(debut_cycle, modifie)
+
+
+def page_publique(*signatures):
+    """ETag et Last-Modified calculés sans requête SQL (gabarits, visiteur et
+    `signatures` des données affichées), réponse 304 si rien n'a changé, gzip sinon."""
+    def _etat(request):
+        if not hasattr(request, '_etat_page'):
+            request._etat_page = _calculer_etat(request)
+        return request._etat_page
+
+    def _calculer_etat(request):
+        visiteur = _visiteur(request)
+        if visiteur is None:
+            return None, None
+        empreinte, modifie = version_contenu()
+        parts = [empreinte, visiteur, request.GET.urlencode()]
+        for signature in signatures:
+            part, date_donnees = signature(request)
+            parts.append(part)
+            modifie = max(modifie, date_donnees)
+        # Last-Modified seul ne distingue pas les visiteurs connectés
+        if request.user.is_authenticated:
+            modifie = None
+        return hashlib.md5('|'.join(parts).encode()).hexdigest(), modifie
+
+    def decorateur(view_func):
+        vue = condition(
+            etag_func=lambda request, *args, **kwargs: _etat(request)[0],
+            last_modified_func=lambda request, *args, **kwargs: _etat(request)[1],
+        )(view_func)
+        return gzip_page(vue)
+    return decorateur
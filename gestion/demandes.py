@@ -0,0 +1,86 @@
+"""
+Demandes des clients : vue d'ensemble des réservations et abonnements
+(page `reservation`).
+
+Les totaux par statut sont calculés en une agrégation conditionnelle par
+modèle (COUNT(*) FILTER (WHERE statut = ...) pour chaque statut), puis mis
+en cache sous un compteur de version ; les signaux de Reservation et
+Abonnement l'incrémentent. Les listes sont filtrées (statut, dates) et
+découpées par `pagination` : la page fait le même nombre de requêtes quel
+que soit l'historique.
+"""
+import time
+from datetime import date, datetime, time as heure, timedelta
+
+from django.core.cache import cache, caches
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Abonnement, Reservation
+
+
+_VERSION = 'demandes:version'
+DUREE_TOTAUX = 24 * 60 * 60
+STATUTS = Reservation.STATUT_CHOICES
+
+
+def version():
+    return caches['versions'].get_or_set(_VERSION, 0, None)
+
+
+def invalider():
+    """À appeler quand une réservation ou un abonnement est créé, change de statut ou est supprimé."""
+    caches['versions'].set(_VERSION, time.time_ns(), None)
+
+
+def _totaux(modele):
+    return modele.objects.aggregate(**{
+        statut: Count('pk', filter=Q(statut=statut)) for statut, _ in modele.STATUT_CHOICES
+    })
+
+
+def totaux():
+    """{'reservations': {statut: nombre}, 'abonnements': {...}}, mis en cache."""
+    cle = f"demandes:totaux:{version()}"
+    resultat = cache.get(cle)
+    if resultat is None:
+        resultat = {'reservations': _totaux(Reservation), 'abonnements': _totaux(Abonnement)}
+        cache.set(cle, resultat, DUREE_TOTAUX)
+    return resultat
+
+
+def _lire_date(valeur):
+    try:
+        return date.fromisoformat(valeur) if valeur else None
+    except ValueError:
+        return None
+
+
+def filtres_depuis_requete(params):
+    """(statut, debut, fin) lus dans les paramètres GET ; une valeur invalide est ignorée."""
+    statut = params.get('statut')
+    if statut not in dict(STATUTS):
+        statut = None
+    debut, fin = _lire_date(params.get('debut')), _lire_date(params.get('fin'))
+    if debut and fin and fin < debut:
+        debut, fin = fin, debut
+    return statut, debut, fin
+
+
+def _minuit(jour):
+    return timezone.make_aware(datetime.combine(jour, heure.min))
+
+
+def filtrer(requete, champ_date, statut=None, debut=None, fin=None):
+    """Filtre sur le statut et sur [debut, fin] (jours inclus) du champ horodaté `champ_date`.
+
+    Les bornes sont comparées à la colonne telle quelle (pas de `__date`),
+    pour que l'index sur la colonne reste utilisable.
+    """
+    if statut:
+        requete = requete.filter(statut=statut)
+    if debut:
+        requete = requete.filter(**{f'{champ_date}__gte': _minuit(debut)})
+    if fin:
+        requete = requete.filter(**{f'{champ_date}__lt': _minuit(fin + timedelta(days=1))})
+    return requete
@@ -0,0 +1,271 @@
+"""
+Exports comptables (recettes, pannes, absences) en CSV ou XLSX, en streaming.
+
+Les lignes sont lues par paquets avec `iterator(chunk_size=...)` et écrites au
+fil de l'eau : la mémoire reste constante quel que soit le nombre de lignes.
+Le XLSX est un zip minimal (une feuille, chaînes « inline », dates en numéros
+de série) produit avec `zipfile` sur un flux non positionnable. Les recettes archivées et courantes
+sont lues chacune dans l'ordre des dates puis fusionnées au fil de l'eau.
+
+Les filtres ?conducteur= et ?moto= suivent l'historique des attributions
+dans toutes les tables : une ligne va avec la moto (ou le conducteur) du
+jour de sa date, pas avec l'attribution actuelle.
+"""
+import csv
+import heapq
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.db.models import DecimalField, ExpressionWrapper, F
+
+from .archivage import SOURCES as SOURCES_RECETTES
+from .attributions import conducteur_du_jour, moto_du_jour
+from .models import Absence, Panne
+
+
+TAILLE_PAQUET = 2000
+
+# Caractères de contrôle interdits en XML 1.0 : une feuille qui en contient ne s'ouvre plus
+_INTERDITS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+# -----------------------
+# Définition des exports
+# -----------------------
+def _recettes(filtres):
+    return tuple(_lignes_recettes(modele, filtres) for modele in SOURCES_RECETTES)
+
+
+def _lignes_recettes(modele, filtres):
+    # Moto que le conducteur avait ce jour-là, d'après l'historique des attributions
+    lignes = modele.objects.order_by('date', 'conducteur_id').annotate(
+        moto_id_du_jour=moto_du_jour(), matricule_du_jour=moto_du_jour('moto__matricule'),
+    )
+    if filtres.get('conducteur'):
+        lignes = lignes.filter(conducteur_id=filtres['conducteur'])
+    if filtres.get('moto'):
+        lignes = lignes.filter(moto_id_du_jour=filtres['moto'])
+    return lignes.values_list(
+        'date', 'jour', 'conducteur__user__username', 'matricule_du_jour',
+        'montant', 'depense',
+        ExpressionWrapper(F('montant') - F('depense'), output_field=DecimalField(max_digits=10, decimal_places=2)),
+    )
+
+
+def _pannes(filtres):
+    lignes = Panne.objects.order_by('date', 'id')
+    if filtres.get('conducteur'):
+        # Conducteur qui avait la moto le jour de la panne
+        lignes = lignes.annotate(conducteur_id_du_jour=conducteur_du_jour()).filter(
+            conducteur_id_du_jour=filtres['conducteur'],
+        )
+    if filtres.get('moto'):
+        lignes = lignes.filter(moto_id=filtres['moto'])
+    return (lignes.values_list(
+        'date', 'moto__nom', 'moto__matricule', 'description', 'montant_depense',
+        'admin__username', 'facture',
+    ),)
+
+
+def _absences(filtres):
+    lignes = Absence.objects.order_by('date', 'id')
+    if filtres.get('conducteur'):
+        lignes = lignes.filter(conducteur_id=filtres['conducteur'])
+    if filtres.get('moto'):
+        lignes = lignes.annotate(moto_id_du_jour=moto_du_jour()).filter(moto_id_du_jour=filtres['moto'])
+    return (lignes.values_list('date', 'conducteur__user__username', 'raison'),)
+
+
+EXPORTS = {
+    'recettes': (
+        ['Date', 'Jour', 'Conducteur', 'Moto', 'Montant', 'Dépense', 'Bénéfice'],
+        _recettes,
+    ),
+    'pannes': (
+        ['Date', 'Moto', 'Matricule', 'Description', 'Montant dépensé', 'Administrateur', 'Facture'],
+        _pannes,
+    ),
+    'absences': (
+        ['Date', 'Conducteur', 'Raison'],
+        _absences,
+    ),
+}
+
+
+def lire_filtres(params):
+    """Filtres communs : ?conducteur=<id>&moto=<id>&debut=AAAA-MM-JJ&fin=AAAA-MM-JJ.
+
+    Lève ValueError si un paramètre est invalide.
+    """
+    filtres = {}
+    for cle in ('conducteur', 'moto'):
+        if params.get(cle):
+            filtres[cle] = int(params[cle])
+    for cle in ('debut', 'fin'):
+        if params.get(cle):
+            filtres[cle] = date.fromisoformat(params[cle])
+    return filtres
+
+
+def lignes_export(table, filtres, base=None):
+    """En-têtes et itérateur des lignes ; `base` fixe l'alias lu (ex. l'instantané).
+
+    Chaque export est un tuple de requêtes triées par date (première colonne) ;
+    à plusieurs, leurs lignes sont fusionnées dans l'ordre des dates.
+    """
+    entetes, requete = EXPORTS[table]
+    flux = []
+    for lignes in requete(filtres):
+        if base:
+            lignes = lignes.using(base)
+        if filtres.get('debut'):
+            lignes = lignes.filter(date__gte=filtres['debut'])
+        if filtres.get('fin'):
+            lignes = lignes.filter(date__lte=filtres['fin'])
+        flux.append(lignes.iterator(chunk_size=TAILLE_PAQUET))
+    if len(flux) == 1:
+        return entetes, flux[0]
+    return entetes, heapq.merge(*flux, key=lambda ligne: ligne[0])
+
+
+# -----------------------
+# CSV
+# -----------------------
+class _Echo:
+    """Pseudo-fichier : `write` renvoie la ligne au lieu de la stocker."""
+    def write(self, valeur):
+        return valeur
+
+
+def flux_csv(entetes, lignes):
+    ecrivain = csv.writer(_Echo(), delimiter=';')
+    yield '\ufeff' + ecrivain.writerow(entetes)  # BOM pour Excel
+    for ligne in lignes:
+        yield ecrivain.writerow(ligne)
+
+
+# -----------------------
+# XLSX
+# -----------------------
+class _Tampon:
+    """Flux non positionnable pour `zipfile` : on vide ce qui a été écrit à chaque paquet."""
+    def __init__(self):
+        self.morceaux = []
+
+    def write(self, donnees):
+        self.morceaux.append(bytes(donnees))
+        return len(donnees)
+
+    def flush(self):
+        pass
+
+    def vider(self):
+        donnees = b''.join(self.morceaux)
+        self.morceaux = []
+        return donnees
+
+    def __bool__(self):
+        return bool(self.morceaux)
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{nom}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+# Style 1 : date (format 14 prédéfini, affiché selon la langue du tableur)
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font/></fonts>'
+    '<fills count="1"><fill/></fills>'
+    '<borders count="1"><border/></borders>'
+    '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+    '<cellXfs count="2"><xf/><xf numFmtId="14" applyNumberFormat="1"/></cellXfs>'
+    '</styleSheet>'
+)
+_ORIGINE_DATES = date(1899, 12, 30)    # jour 0 des numéros de série du tableur
+
+
+def _texte_xml(valeur):
+    return escape(_INTERDITS_XML.sub('', str(valeur)))
+
+
+def _cellule(valeur):
+    if valeur is None:
+        return '<c/>'
+    if isinstance(valeur, (int, float, Decimal)) and not isinstance(valeur, bool):
+        return f'<c t="n"><v>{valeur}</v></c>'
+    if isinstance(valeur, date) and not isinstance(valeur, datetime):
+        # Numéro de série : la colonne se trie et se filtre comme des dates
+        return f'<c s="1"><v>{(valeur - _ORIGINE_DATES).days}</v></c>'
+    return f'<c t="inlineStr"><is><t>{_texte_xml(valeur)}</t></is></c>'
+
+
+def _ligne_xml(valeurs):
+    return '<row>' + ''.join(_cellule(v) for v in valeurs) + '</row>'
+
+
+def flux_xlsx(entetes, lignes, nom_feuille='Export'):
+    tampon = _Tampon()
+    with zipfile.ZipFile(tampon, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _RELS)
+        archive.writestr('xl/workbook.xml', _WORKBOOK.format(nom=_texte_xml(nom_feuille)))
+        archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        archive.writestr('xl/styles.xml', _STYLES)
+        yield tampon.vider()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as feuille:
+            feuille.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + _ligne_xml(entetes)
+            ).encode())
+            paquet = []
+            for ligne in lignes:
+                paquet.append(_ligne_xml(ligne))
+                if len(paquet) >= TAILLE_PAQUET:
+                    feuille.write(''.join(paquet).encode())
+                    paquet = []
+                    if tampon:
+                        yield tampon.vider()
+            feuille.write((''.join(paquet) + '</sheetData></worksheet>').encode())
+    yield tampon.vider()
@@ -0,0 +1,223 @@
+"""
+Factures des pannes : dépôt, déduplication, vignettes et envoi par morceaux.
+
+Le fichier reçu (écrit sur disque par morceaux par Django au-delà de
+FILE_UPLOAD_MAX_MEMORY_SIZE) est haché en SHA-256 morceau par morceau et
+rangé sous ce nom : la même facture déposée deux fois n'est stockée qu'une
+fois. Les images ont deux dérivées WebP, produites au dépôt : une vignette
+pour la liste des pannes et un aperçu lisible à l'écran. Aucune image n'est
+décodée pendant l'affichage ; les factures déposées avant les dérivées
+passent par la commande `produire_derivees`. Les originaux (scans, PDF) sont servis avec prise en charge de
+l'en-tête Range : un lecteur PDF ne télécharge que les pages affichées.
+"""
+import hashlib
+import io
+import re
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from PIL import Image, ImageOps
+
+
+TAILLE_MAX = 10 * 1024 * 1024
+TAILLE_MORCEAU = 64 * 1024
+DOSSIER = 'factures'
+
+# Format détecté -> (extension, type MIME)
+FORMATS = {
+    'PDF': ('.pdf', 'application/pdf'),
+    'JPEG': ('.jpg', 'image/jpeg'),
+    'PNG': ('.png', 'image/png'),
+    'WEBP': ('.webp', 'image/webp'),
+}
+EXTENSIONS_IMAGES = ('.jpg', '.jpeg', '.png', '.webp')     # formats acceptés par `verifier`
+
+# Dérivées des images : côté maximal en pixels, qualité WebP
+DERIVEES = {
+    'miniature': (160, 60),
+    'apercu': (1280, 75),
+}
+DUREE_CACHE = 60 * 60 * 24 * 365
+
+
+# -----------------------
+# Dépôt
+# -----------------------
+def detecter(fichier):
+    """Format du fichier reçu ('PDF', 'JPEG', ...) d'après son contenu, ou None."""
+    fichier.seek(0)
+    if fichier.read(5) == b'%PDF-':
+        fichier.seek(0)
+        return 'PDF'
+    fichier.seek(0)
+    try:
+        with Image.open(fichier) as image:
+            format_image = image.format
+            image.verify()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        format_image = None
+    fichier.seek(0)
+    return format_image if format_image in FORMATS else None
+
+
+def verifier(fichier):
+    """Format du fichier ; ValidationError s'il est trop gros ou n'est ni un PDF ni une image."""
+    if fichier.size > TAILLE_MAX:
+        raise ValidationError(f"Facture trop volumineuse (maximum {TAILLE_MAX // (1024 * 1024)} Mo).")
+    format_fichier = detecter(fichier)
+    if format_fichier is None:
+        raise ValidationError("La facture doit être un PDF ou une image (JPEG, PNG, WebP).")
+    return format_fichier
+
+
+def enregistrer(fichier, format_fichier=None):
+    """Range le fichier sous un nom tiré de son contenu et retourne ce nom ;
+    un fichier identique déjà reçu est réutilisé tel quel."""
+    format_fichier = format_fichier or verifier(fichier)
+    empreinte = hashlib.sha256()
+    fichier.seek(0)
+    for morceau in fichier.chunks(TAILLE_MORCEAU):
+        empreinte.update(morceau)
+    code = empreinte.hexdigest()
+    nom = f'{DOSSIER}/{code[:2]}/{code}{FORMATS[format_fichier][0]}'
+    if not default_storage.exists(nom):
+        fichier.seek(0)
+        nom = default_storage.save(nom, fichier)
+    if format_fichier != 'PDF':
+        try:
+            produire_derivees(nom)
+        except OSError:
+            pass    # image tronquée que verify() laisse passer : l'original reste servi, sans vignette
+    return nom
+
+
+# -----------------------
+# Vignettes et aperçus
+# -----------------------
+def est_image(nom):
+    return bool(nom) and nom.lower().endswith(EXTENSIONS_IMAGES)
+
+
+def version(nom):
+    """Jeton d'URL qui change avec le fichier : vignettes et aperçus se gardent un an dans le navigateur."""
+    return hashlib.md5(nom.encode()).hexdigest()[:12]
+
+
+def derivee(nom, taille):
+    """Nom de l'image réduite `taille` ('miniature' ou 'apercu') de la facture `nom`."""
+    code = hashlib.md5(nom.encode()).hexdigest()
+    return f'{DOSSIER}/{taille}/{code[:2]}/{code}.webp'
+
+
+def produire_derivees(nom):
+    """Écrit les dérivées manquantes de l'image `nom` ; retourne leur nombre.
+
+    Lève OSError si l'image ne peut pas être lue.
+    """
+    produites = 0
+    for taille, (cote, qualite) in DERIVEES.items():
+        nom_derivee = derivee(nom, taille)
+        if default_storage.exists(nom_derivee):
+            continue
+        try:
+            with default_storage.open(nom, 'rb') as source, Image.open(source) as image:
+                # JPEG : décodage directement à une échelle réduite, bien plus rapide sur un scan
+                image.draft('RGB', (cote, cote))
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail((cote, cote))
+                if image.mode not in ('RGB', 'RGBA'):
+                    image = image.convert('RGB')
+                tampon = io.BytesIO()
+                image.save(tampon, 'WEBP', quality=qualite, method=4)
+        except Image.DecompressionBombError as erreur:
+            raise OSError(str(erreur))
+        default_storage.save(nom_derivee, ContentFile(tampon.getvalue()))
+        produites += 1
+    return produites
+
+
+# -----------------------
+# Envoi
+# -----------------------
+class _Tranche:
+    """Lecture limitée à `longueur` octets depuis la position courante, pour FileResponse."""
+
+    def __init__(self, fichier, longueur):
+        self.fichier = fichier
+        self.restant = longueur
+
+    def read(self, taille=-1):
+        taille = self.restant if taille < 0 else min(taille, self.restant)
+        donnees = self.fichier.read(taille) if taille else b''
+        self.restant -= len(donnees)
+        return donnees
+
+    def close(self):
+        self.fichier.close()
+
+
+def _plage(entete, taille):
+    """(debut, fin) inclus demandés par l'en-tête Range ; None pour tout le fichier,
+    False si la plage est hors du fichier (416). Une seule plage est servie."""
+    correspondance = re.fullmatch(r'bytes=(\d*)-(\d*)', (entete or '').strip())
+    if not correspondance or correspondance.groups() == ('', ''):
+        return None
+    debut, fin = correspondance.groups()
+    if not debut:
+        longueur = int(fin)
+        return (max(taille - longueur, 0), taille - 1) if longueur and taille else False
+    debut = int(debut)
+    fin = min(int(fin), taille - 1) if fin else taille - 1
+    if fin < debut and debut < taille:
+        return None
+    if debut >= taille:
+        return False
+    return debut, fin
+
+
+def reponse_fichier(request, nom, immuable=False):
+    """FileResponse du fichier stocké, avec ETag (304) et réponses partielles (206) sur Range.
+
+    `immuable` : l'URL change avec le fichier, le navigateur peut le garder un an sans revalider.
+    """
+    try:
+        taille = default_storage.size(nom)
+    except (FileNotFoundError, OSError):
+        raise Http404("Facture introuvable.")
+    etag = f'"{version(nom)}-{taille}"'
+    conditionnelle = get_conditional_response(request, etag=etag)
+    if conditionnelle is not None:
+        return conditionnelle
+
+    plage = _plage(request.headers.get('Range'), taille)
+    if request.headers.get('If-Range', etag) != etag:
+        plage = None
+    if plage is False:
+        reponse = HttpResponse(status=416)
+        reponse['Content-Range'] = f'bytes */{taille}'
+        return reponse
+
+    fichier = default_storage.open(nom, 'rb')
+    extension = nom[nom.rfind('.'):].lower()
+    type_contenu = next((mime for ext, mime in FORMATS.values() if ext == extension), None)
+    if plage is None:
+        reponse = FileResponse(fichier, content_type=type_contenu, filename=nom.rsplit('/', 1)[-1])
+    else:
+        debut, fin = plage
+        fichier.seek(debut)
+        reponse = FileResponse(
+            _Tranche(fichier, fin - debut + 1), status=206,
+            content_type=type_contenu or 'application/octet-stream', filename=nom.rsplit('/', 1)[-1],
+        )
+        reponse['Content-Range'] = f'bytes {debut}-{fin}/{taille}'
+        reponse['Content-Length'] = fin - debut + 1
+    reponse['Accept-Ranges'] = 'bytes'
+    reponse['ETag'] = etag
+    if immuable:
+        patch_cache_control(reponse, private=True, max_age=DUREE_CACHE, immutable=True)
+    else:
+        patch_cache_control(reponse, private=True, no_cache=True)
+    return reponse
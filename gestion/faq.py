@@ -0,0 +1,64 @@
+"""
+Questions & réponses affichées sur la page publique `touriste`.
+
+La sélection change tous les deux jours (« cycle ») : les identifiants
+retenus sont tirés une fois par cycle, sur les seuls identifiants, puis mis
+en cache ; le bloc HTML correspondant est mis en cache par le template sous
+la même clé. Répondre à une question change la version et force un nouveau
+tirage. La recherche des visiteurs ne porte que sur les questions répondues.
+"""
+import random
+import time
+
+from django.core.cache import cache, caches
+from django.utils import timezone
+
+from . import recherche
+from .models import Question
+
+
+NB_QUESTIONS = 20     # questions tirées par cycle
+NB_AFFICHEES = 12     # les plus récentes parmi elles sont affichées
+DUREE_CYCLE = 2 * 24 * 60 * 60
+_VERSION = 'faq:version'
+
+
+def cycle_courant(aujourd_hui=None):
+    """Index qui change tous les deux jours."""
+    aujourd_hui = aujourd_hui or timezone.now().date()
+    return aujourd_hui.toordinal() // 2
+
+
+def version():
+    return caches['versions'].get_or_set(_VERSION, 0, None)
+
+
+def invalider():
+    """À appeler quand une question reçoit une réponse."""
+    caches['versions'].set(_VERSION, time.time_ns(), None)
+
+
+def identifiants_du_cycle(cycle, version_faq=None):
+    """Identifiants des questions tirées pour le cycle, mis en cache."""
+    cle = f"faq:ids:{version_faq if version_faq is not None else version()}:{cycle}"
+    identifiants = cache.get(cle)
+    if identifiants is None:
+        identifiants = list(
+            Question.objects.filter(statut='repondu').order_by('-date_creation').values_list('id', flat=True)
+        )
+        # Même tirage pour tous les visiteurs pendant le cycle
+        random.Random(cycle).shuffle(identifiants)
+        identifiants = identifiants[:NB_QUESTIONS]
+        cache.set(cle, identifiants, DUREE_CYCLE)
+    return identifiants
+
+
+def questions_du_cycle(cycle, version_faq=None):
+    """Questions à afficher (requête paresseuse : rien n'est lu si le bloc HTML est en cache)."""
+    identifiants = identifiants_du_cycle(cycle, version_faq)
+    return Question.objects.filter(id__in=identifiants).order_by('-date_creation')[:NB_AFFICHEES]
+
+
+def rechercher(texte):
+    """Questions répondues correspondant à `texte`, les plus pertinentes d'abord."""
+    return recherche.rechercher(Question.objects.all(), texte, NB_AFFICHEES, statut='repondu')
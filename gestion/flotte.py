@@ -0,0 +1,92 @@
+"""
+Instantané de la flotte, partagé par toutes les requêtes d'un processus.
+
+Les pages d'administration relisent toutes les mêmes faits : conducteurs
+avec utilisateur et moto, motos par statut, recettes du jour. On les charge
+une fois dans un objet immuable gardé en mémoire, reconstruit seulement
+quand le compteur de version change. Ce compteur est écrit dans le cache
+'versions' (fichiers sur disque, jamais évincés) : tous les processus WSGI
+le voient, sans service externe. Les signaux sur Moto, Conducteur et Recette l'incrémentent.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date
+from types import MappingProxyType
+
+from django.core.cache import caches
+from django.db.models import Q, Sum
+
+from .models import Conducteur, Moto, Recette
+
+
+_VERSION = 'flotte:instantane:version'
+_verrou = threading.Lock()
+_instantane = None
+
+
+@dataclass(frozen=True)
+class Instantane:
+    version: int
+    jour: date
+    conducteurs: tuple            # Conducteur, user et moto préchargés
+    motos: tuple
+    motos_par_statut: MappingProxyType
+    recettes_du_jour: MappingProxyType    # conducteur_id -> Recette
+    totaux_recettes: MappingProxyType     # conducteur_id -> total (cumuls mensuels)
+
+    def lignes_tableau_de_bord(self):
+        return [
+            {
+                'conducteur': conducteur,
+                'recette_du_jour': self.recettes_du_jour.get(conducteur.id),
+                'total_recettes': self.totaux_recettes.get(conducteur.id) or 0,
+            }
+            for conducteur in self.conducteurs
+        ]
+
+
+def version():
+    return caches['versions'].get(_VERSION, 0)
+
+
+def invalider():
+    """À appeler quand une moto, un conducteur ou une recette change."""
+    caches['versions'].set(_VERSION, time.time_ns(), None)
+
+
+def _construire(version_lue, jour):
+    conducteurs = tuple(
+        Conducteur.objects.select_related('user', 'moto')
+        .annotate(total_recettes=Sum('cumuls__montant', filter=Q(cumuls__periode='mois')))
+        .order_by('pk')     # pagination.paginer_sequence découpe par id
+    )
+    motos = tuple(Moto.objects.all())
+    par_statut = {statut: 0 for statut, _ in Moto.STATUT_CHOICES}
+    for moto in motos:
+        par_statut[moto.statut] = par_statut.get(moto.statut, 0) + 1
+    return Instantane(
+        version=version_lue,
+        jour=jour,
+        conducteurs=conducteurs,
+        motos=motos,
+        motos_par_statut=MappingProxyType(par_statut),
+        recettes_du_jour=MappingProxyType(
+            {recette.conducteur_id: recette for recette in Recette.objects.filter(date=jour)}
+        ),
+        totaux_recettes=MappingProxyType({c.id: c.total_recettes for c in conducteurs}),
+    )
+
+
+def instantane():
+    """Instantané à jour : une lecture du compteur dans le cas courant, une reconstruction sinon."""
+    global _instantane
+    # Version lue avant la construction : une écriture pendant celle-ci forcera la suivante
+    version_lue, jour = version(), date.today()
+    courant = _instantane
+    if courant is None or courant.version != version_lue or courant.jour != jour:
+        with _verrou:
+            courant = _instantane
+            if courant is None or courant.version != version_lue or courant.jour != jour:
+                courant = _instantane = _construire(version_lue, jour)
+    return courant
@@ -1,4 +1,6 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from . import factures
 from .models import User
 from django.contrib.auth.forms import UserCreationForm
 from .models import Conducteur, Moto, Panne, Recette, Question, Reservation, Abonnement, JourSemaine, ReservationRapide
@@ -8,7 +10,7 @@ from django.contrib.auth import authenticate
 User = get_user_model()
 
 class AttributionMotoForm(forms.Form):
-    conducteur = forms.ModelChoiceField(queryset=Conducteur.objects.all())
+    conducteur = forms.ModelChoiceField(queryset=Conducteur.objects.select_related('user'))
     moto = forms.ModelChoiceField(queryset=Moto.objects.filter(statut='disponible'))
 
     def __init__(self, *args, **kwargs):
@@ -19,16 +21,34 @@ class AttributionMotoForm(forms.Form):
 class PanneForm(forms.ModelForm):
     class Meta:
         model = Panne
-        fields = ['moto', 'description', 'montant_depense']
+        fields = ['moto', 'description', 'montant_depense', 'facture']
         widgets = {
             'description': forms.Textarea(attrs={'rows': 3, 'placeholder': 'Description des réparations'}),
             'montant_depense': forms.NumberInput(attrs={'placeholder': 'Montant dépensé'}),
+            'facture': forms.ClearableFileInput(attrs={'accept': 'application/pdf,image/jpeg,image/png,image/webp'}),
         }
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # On ne propose que les motos en réparation
         self.fields['moto'].queryset = Moto.objects.filter(statut='reparation')
+        self.format_facture = None
+
+    def clean_facture(self):
+        fichier = self.cleaned_data.get('facture')
+        if isinstance(fichier, UploadedFile):
+            self.format_facture = factures.verifier(fichier)
+        return fichier
+
+    def save(self, commit=True):
+        panne = super().save(commit=False)
+        fichier = self.cleaned_data.get('facture')
+        if isinstance(fichier, UploadedFile):
+            # Rangée sous l'empreinte de son contenu (déduplication), pas sous le nom d'origine
+            panne.facture = factures.enregistrer(fichier, self.format_facture)
+        if commit:
+            panne.save()
+        return panne
 
 
 class RecetteForm(forms.ModelForm):
@@ -45,7 +65,15 @@ class RecetteForm(forms.ModelForm):
             self.fields['conducteur'].widget = forms.HiddenInput()
         else:
             # L'admin peut choisir parmi les conducteurs avec une moto attribuée
-            self.fields['conducteur'].queryset = Conducteur.objects.filter(moto__isnull=False)
+            self.fields['conducteur'].queryset = Conducteur.objects.filter(moto__isnull=False).select_related('user')
+
+
+class ImportRecettesForm(forms.Form):
+    fichier = forms.FileField(
+        label="Fichier CSV",
+        help_text="Colonnes : conducteur;date;montant;depense (conducteur = nom d'utilisateur)",
+        widget=forms.ClearableFileInput(attrs={'accept': '.csv,text/csv'}),
+    )
 
 
 # Formulaire pour le visiteur
@@ -0,0 +1,179 @@
+"""
+Import en masse des recettes journalières depuis un CSV.
+
+Colonnes attendues (avec ligne d'en-tête, séparateur `;` ou `,`) :
+    conducteur;date;montant;depense
+`conducteur` est le nom d'utilisateur (ou l'identifiant) du conducteur,
+`date` au format AAAA-MM-JJ ou JJ/MM/AAAA.
+
+Toutes les lignes sont validées en une passe (conducteurs résolus en une
+requête, doublons détectés sur la contrainte (conducteur, date)), puis les
+lignes valides sont écrites en un seul `bulk_create(update_conflicts=True)`.
+Les dates antérieures à l'horizon d'archivage et les recettes déjà archivées
+sont rejetées : la mise à jour ne porte que sur la table courante.
+"""
+import csv
+import io
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from . import anomalies, archivage, bilan, cumuls, flotte, reconciliation
+from .models import Conducteur, JOURS_SEMAINE, Recette
+
+
+COLONNES = ('conducteur', 'date', 'montant', 'depense')
+MONTANT_MAX = Decimal('99999999.99')  # max_digits=10, decimal_places=2
+TAILLE_LOT = 500
+
+
+def _lire_date(valeur):
+    for format_date in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(valeur, format_date).date()
+        except ValueError:
+            continue
+    raise ValueError(f"date invalide « {valeur} »")
+
+
+def _lire_montant(valeur, nom):
+    try:
+        montant = Decimal(valeur.replace(' ', '').replace(',', '.') or '0')
+    except InvalidOperation:
+        raise ValueError(f"{nom} invalide « {valeur} »")
+    if not montant.is_finite() or montant < 0 or montant > MONTANT_MAX:
+        raise ValueError(f"{nom} hors limites « {valeur} »")
+    return montant.quantize(Decimal('0.01'))
+
+
+def _lire_lignes(fichier):
+    """Lignes du fichier [(numéro de ligne, ligne)] et erreurs [(numéro de ligne, message)] :
+    un enregistrement que le module csv ne sait pas lire (guillemet jamais fermé, champ
+    démesuré...) est signalé et ignoré, la lecture reprend à la ligne suivante."""
+    texte = io.TextIOWrapper(fichier, encoding='utf-8-sig', newline='')
+    debut = texte.read(2048)
+    texte.seek(0)
+    try:
+        dialecte = csv.Sniffer().sniff(debut, delimiters=';,')
+    except csv.Error:
+        dialecte = csv.excel
+    # Lignes physiques numérotées ici : après une erreur, line_num du lecteur n'est plus fiable
+    lues = 0
+
+    def lignes_texte():
+        nonlocal lues
+        for lues, ligne_texte in enumerate(texte, start=1):
+            yield ligne_texte
+
+    lecteur = csv.DictReader(lignes_texte(), dialect=dialecte)
+    try:
+        if lecteur.fieldnames is None:
+            raise ValueError("Fichier vide.")
+    except csv.Error as erreur:
+        raise ValueError(f"ligne d'en-tête illisible ({erreur}).")
+    lecteur.fieldnames = [nom.strip().lower() for nom in lecteur.fieldnames]
+    manquantes = [col for col in COLONNES if col not in lecteur.fieldnames]
+    if manquantes:
+        raise ValueError(f"Colonnes manquantes : {', '.join(manquantes)}.")
+
+    lignes, erreurs = [], []
+    while True:
+        numero = lues + 1
+        try:
+            ligne = next(lecteur)
+        except StopIteration:
+            return lignes, erreurs
+        except csv.Error as erreur:
+            erreurs.append((numero, f"ligne illisible ({erreur})"))
+        else:
+            lignes.append((numero, ligne))
+
+
+def analyser(fichier):
+    """Valide tout le fichier. Retourne (recettes valides, erreurs [(numéro de ligne, message)])."""
+    lignes, erreurs = _lire_lignes(fichier)
+
+    # Résolution des conducteurs en une seule requête
+    references = {(ligne.get('conducteur') or '').strip() for _, ligne in lignes}
+    conducteurs = dict(
+        Conducteur.objects.filter(user__username__in=references).values_list('user__username', 'id')
+    )
+    identifiants = {int(ref) for ref in references if ref.isdigit() and ref not in conducteurs}
+    conducteurs.update(
+        (str(pk), pk) for pk in Conducteur.objects.filter(pk__in=identifiants).values_list('id', flat=True)
+    )
+
+    horizon = archivage.limite()
+    recettes, vues = [], {}
+    for numero, ligne in lignes:
+        reference = (ligne.get('conducteur') or '').strip()
+        try:
+            if reference not in conducteurs:
+                raise ValueError(f"conducteur inconnu « {reference} »")
+            jour = _lire_date((ligne.get('date') or '').strip())
+            montant = _lire_montant(ligne.get('montant') or '', 'montant')
+            depense = _lire_montant(ligne.get('depense') or '', 'dépense')
+            if jour < horizon:
+                raise ValueError(f"date antérieure au {horizon:%d/%m/%Y}, période archivée")
+        except ValueError as erreur:
+            erreurs.append((numero, str(erreur)))
+            continue
+
+        cle = (conducteurs[reference], jour)
+        if cle in vues:
+            erreurs.append((numero, f"doublon de la ligne {vues[cle]} (même conducteur, même date)"))
+            continue
+        vues[cle] = numero
+        recettes.append(Recette(
+            conducteur_id=cle[0],
+            date=jour,
+            jour=JOURS_SEMAINE[jour.weekday()][0],
+            montant=montant,
+            depense=depense,
+        ))
+
+    # Horizon relevé depuis un archivage : l'archive peut déjà tenir des dates plus récentes
+    if recettes:
+        archivees = archivage.cles_archivees(
+            {r.conducteur_id for r in recettes}, min(r.date for r in recettes), max(r.date for r in recettes),
+        ) & vues.keys()
+        for cle in archivees:
+            erreurs.append((vues[cle], "recette déjà archivée (même conducteur, même date)"))
+        recettes = [r for r in recettes if (r.conducteur_id, r.date) not in archivees]
+    return recettes, sorted(erreurs)
+
+
+def importer(fichier):
+    """Importe le fichier et retourne le rapport {'creees', 'mises_a_jour', 'erreurs'}."""
+    recettes, erreurs = analyser(fichier)
+    rapport = {'creees': 0, 'mises_a_jour': 0, 'erreurs': erreurs}
+    if not recettes:
+        return rapport
+
+    conducteur_ids = {r.conducteur_id for r in recettes}
+    debut = min(r.date for r in recettes)
+    fin = max(r.date for r in recettes)
+
+    with transaction.atomic():
+        existantes = set(
+            Recette.objects.filter(conducteur_id__in=conducteur_ids, date__range=(debut, fin))
+            .values_list('conducteur_id', 'date')
+        )
+        Recette.objects.bulk_create(
+            recettes,
+            batch_size=TAILLE_LOT,
+            update_conflicts=True,
+            unique_fields=['conducteur', 'date'],
+            update_fields=['jour', 'montant', 'depense'],
+        )
+        # bulk_create ne déclenche pas les signaux : on recalcule les cumuls touchés
+        cumuls.reconstruire_cumuls_recettes(list(conducteur_ids), debut, fin)
+
+    bilan.invalider_periode(*{date(r.date.year, r.date.month, 1) for r in recettes})
+    reconciliation.rapprocher_apres_import(debut, fin)
+    anomalies.a_reverifier(debut)
+    flotte.invalider()
+    rapport['mises_a_jour'] = sum((r.conducteur_id, r.date) in existantes for r in recettes)
+    rapport['creees'] = len(recettes) - rapport['mises_a_jour']
+    return rapport
@@ -0,0 +1,142 @@
+"""
+Instantané en lecture seule de la base, pour les rapports et les exports.
+
+Le bilan, le détail d'un conducteur et les exports lisent beaucoup de lignes ;
+sur le même fichier SQLite que les saisies, un long rapport retarde l'envoi
+des recettes. La commande `rafraichir_instantane` copie la base avec l'API
+de sauvegarde de SQLite dans un second fichier ; les vues décorées par
+`lecture_instantane` y lisent, via le routeur, tant qu'il est assez récent.
+Les écritures vont toujours à la base principale.
+"""
+import contextvars
+import os
+import sqlite3
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+
+ALIAS = 'instantane'
+
+# Date de la copie lue par la vue en cours, None : base principale
+_actif = contextvars.ContextVar('instantane_actif', default=None)
+
+
+def chemin():
+    """Fichier de l'instantané ; None si l'alias pointe ailleurs (base de test, en mémoire)."""
+    nom = str(connections[ALIAS].settings_dict['NAME'])
+    if nom != str(settings.DATABASES[ALIAS]['NAME']):
+        return None
+    return Path(nom)
+
+
+def date_instantane():
+    """Date de la dernière copie, ou None s'il n'y en a pas."""
+    fichier = chemin()
+    try:
+        return datetime.fromtimestamp(fichier.stat().st_mtime, tz=dt_timezone.utc) if fichier else None
+    except FileNotFoundError:
+        return None
+
+
+def utilisable():
+    """Date de l'instantané s'il peut servir les lectures, None pour lire la base principale."""
+    copie = date_instantane()
+    if copie is None or timezone.now() - copie > settings.INSTANTANE_AGE_MAX:
+        return None
+    return copie
+
+
+def copier(destination):
+    """Copie la base principale dans le fichier `destination` ; renvoie le nombre de pages copiées.
+
+    La copie se fait en une seule étape, dans une transaction de lecture : en
+    WAL, les écrivains continuent pendant ce temps (une copie par étapes
+    recommencerait à chaque écriture).
+    """
+    source = connections[DEFAULT_DB_ALIAS]
+    source.ensure_connection()
+    cible = sqlite3.connect(destination)
+    try:
+        source.connection.backup(cible)
+        # Copie autonome : pas de fichier -wal à côté
+        cible.execute('PRAGMA journal_mode=DELETE')
+        return cible.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        cible.close()
+
+
+def rafraichir():
+    """Copie la base principale dans l'instantané ; renvoie le nombre de pages copiées.
+
+    La copie va dans un fichier temporaire, remplacé d'un coup à la fin : les
+    rapports en cours finissent sur l'ancien.
+    """
+    fichier = Path(settings.DATABASES[ALIAS]['NAME'])
+    temporaire = fichier.with_name(fichier.name + '.tmp')
+    temporaire.unlink(missing_ok=True)
+    try:
+        pages = copier(temporaire)
+    except BaseException:
+        temporaire.unlink(missing_ok=True)
+        raise
+    os.replace(temporaire, fichier)
+    return pages
+
+
+# -----------------------
+# Routage
+# -----------------------
+class Routeur:
+    """Lectures vers l'instantané pendant une vue `lecture_instantane`, tout le reste vers 'default'."""
+
+    def db_for_read(self, model, **hints):
+        return ALIAS if _actif.get() else None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # L'instantané est une copie du fichier principal, déjà migré
+        return db != ALIAS
+
+
+def lecture_instantane(view_func):
+    """Fait lire la vue dans l'instantané s'il est utilisable.
+
+    `request.donnees_au` vaut la date de la copie (None : données en direct),
+    pour l'indicateur de fraîcheur (`instantane.html`). À placer sous les
+    décorateurs d'accès : la session et le compte restent lus en direct.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        request.donnees_au = utilisable()
+        jeton = _actif.set(request.donnees_au)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _actif.reset(jeton)
+    return wrapper
+
+
+def base_courante():
+    """Alias lu en ce moment, à figer avec `using()` sur une requête évaluée après la vue (streaming)."""
+    return ALIAS if _actif.get() else DEFAULT_DB_ALIAS
+
+
+def source():
+    """Données lues en ce moment, pour les clés de cache : « direct » ou la date de la copie.
+
+    Un agrégat calculé sur une copie ne doit servir qu'aux lectures de cette
+    même copie, ni aux lectures en direct (copie trop ancienne), ni à la suivante.
+    """
+    copie = _actif.get()
+    return f'instantane-{copie.timestamp()}' if copie else 'direct'
+
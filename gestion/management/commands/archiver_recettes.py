@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gestion.archivage import PAUSE, TAILLE_LOT, archiver, limite
+
+
+class Command(BaseCommand):
+    help = ("Déplace les recettes plus anciennes que l'horizon dans la table d'archive, par petits lots "
+            "(les cumuls mensuels restent ; à lancer chaque mois).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mois', type=int, default=settings.ARCHIVE_RECETTES_MOIS,
+                            help=f"Mois entiers gardés avant le mois en cours (défaut : {settings.ARCHIVE_RECETTES_MOIS}).")
+        parser.add_argument('--lot', type=int, default=TAILLE_LOT,
+                            help=f"Recettes déplacées par transaction (défaut : {TAILLE_LOT}).")
+        parser.add_argument('--pause', type=float, default=PAUSE,
+                            help=f"Secondes d'attente entre deux lots (défaut : {PAUSE}).")
+
+    def handle(self, *args, **options):
+        mois = max(options['mois'], 0)
+        nombre = archiver(mois, max(options['lot'], 1), max(options['pause'], 0))
+        self.stdout.write(self.style.SUCCESS(
+            f"{nombre} recette(s) antérieure(s) au {limite(mois):%d/%m/%Y} archivée(s)."
+        ))
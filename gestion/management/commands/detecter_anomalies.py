@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from gestion.anomalies import FENETRE, SEUIL, detecter
+
+
+class Command(BaseCommand):
+    help = ("Signale les recettes dont le montant ou la dépense s'écarte fortement de la médiane "
+            "glissante du même jour de la semaine (à lancer chaque nuit).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--complet', action='store_true',
+                            help="Réanalyser tout l'historique au lieu des seuls jours depuis le dernier passage.")
+        parser.add_argument('--fenetre', type=int, default=FENETRE,
+                            help=f"Nombre de mêmes jours précédents pris en compte (défaut : {FENETRE}).")
+        parser.add_argument('--seuil', type=float, default=SEUIL,
+                            help=f"Score robuste à partir duquel une valeur est signalée (défaut : {SEUIL}).")
+
+    def handle(self, *args, **options):
+        analysees, signalees = detecter(options['complet'], options['fenetre'], options['seuil'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{analysees} recette(s) analysée(s), {signalees} anomalie(s) enregistrée(s)."
+        ))
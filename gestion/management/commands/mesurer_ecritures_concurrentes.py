@@ -0,0 +1,144 @@
+import multiprocessing
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.test import override_settings
+from django.utils import timezone
+
+from gestion.models import JOURS_SEMAINE, Conducteur, Recette, User
+
+
+# Connexion SQLite nue (journal DELETE, transactions DEFERRED, attente de 5 s
+# du module sqlite3) puis connexion réglée comme dans settings.DATABASES
+REGLAGES = (
+    ('par défaut', {}),
+    ('réglée', settings.DATABASES['default'].get('OPTIONS', {})),
+)
+
+
+def _basculer(nom, options):
+    """Pointe la connexion 'default' de ce processus vers une autre base."""
+    connexion = connections['default']
+    connexion.close()
+    connexion.settings_dict.update(NAME=nom, OPTIONS=dict(options))
+
+
+def _ecrivain(conducteurs, ecritures, depart, resultats):
+    """Un processus conducteur : `ecritures` saisies de recette, comme le POST de conducteur_dashboard."""
+    aujourd_hui = timezone.localdate()
+    reussies, verrous, latences = 0, 0, []
+    depart.wait()
+    for numero in range(ecritures):
+        # Tour à tour chaque conducteur, un jour plus tôt à chaque tour : des créations et des mises à jour
+        jour = aujourd_hui - timedelta(days=numero // len(conducteurs) % 7)
+        debut = time.perf_counter()
+        try:
+            Recette.objects.update_or_create(
+                conducteur_id=conducteurs[numero % len(conducteurs)],
+                date=jour,
+                defaults={'montant': 15000 + numero, 'depense': 2000, 'jour': JOURS_SEMAINE[jour.weekday()][0]},
+            )
+        except OperationalError as erreur:
+            if 'locked' not in str(erreur):
+                raise
+            verrous += 1
+        else:
+            reussies += 1
+            latences.append(time.perf_counter() - debut)
+    connections.close_all()
+    resultats.put((reussies, verrous, latences))
+
+
+class Command(BaseCommand):
+    help = ("Lance N processus qui enregistrent en même temps des recettes (update_or_create) "
+            "dans une base SQLite temporaire, sans puis avec les réglages de settings.DATABASES, "
+            "et compare débit et erreurs « database is locked ». La base du projet n'est pas touchée.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processus', type=int, default=16,
+                            help="Écrivains simultanés (défaut : 16).")
+        parser.add_argument('--ecritures', type=int, default=200,
+                            help="Recettes enregistrées par processus (défaut : 200).")
+        parser.add_argument('--conducteurs', type=int, default=5,
+                            help="Conducteurs distincts par processus (défaut : 5).")
+
+    def _preparer(self, modele, processus, par_processus):
+        """Base modèle migrée avec ses conducteurs ; ids regroupés par processus."""
+        _basculer(modele, {})
+        call_command('migrate', verbosity=0)
+        users = User.objects.bulk_create([
+            User(username=f'ecrivain_{i}', role='conducteur') for i in range(processus * par_processus)
+        ])
+        conducteurs = Conducteur.objects.bulk_create([
+            Conducteur(user=user, adresse='-', telephone='-') for user in users
+        ])
+        ids = [conducteur.pk for conducteur in conducteurs]
+        connections['default'].close()
+        return [ids[i::processus] for i in range(processus)]
+
+    def _mesurer(self, base, options, groupes, ecritures):
+        _basculer(base, options)
+        contexte = multiprocessing.get_context('fork')
+        depart = contexte.Barrier(len(groupes) + 1)
+        resultats = contexte.Queue()
+        ecrivains = [
+            contexte.Process(target=_ecrivain, args=(groupe, ecritures, depart, resultats))
+            for groupe in groupes
+        ]
+        for ecrivain in ecrivains:
+            ecrivain.start()
+        depart.wait()
+        debut = time.perf_counter()
+        bilans = [resultats.get() for _ in ecrivains]
+        duree = time.perf_counter() - debut
+        for ecrivain in ecrivains:
+            ecrivain.join()
+        reussies = sum(bilan[0] for bilan in bilans)
+        verrous = sum(bilan[1] for bilan in bilans)
+        latences = sorted(latence for bilan in bilans for latence in bilan[2])
+        p95 = latences[int(len(latences) * 0.95)] * 1000 if latences else 0
+        mediane = statistics.median(latences) * 1000 if latences else 0
+        return reussies, verrous, duree, mediane, p95
+
+    # Caches en mémoire : les invalidations des signaux ne touchent pas les caches du projet
+    @override_settings(CACHES={
+        alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': alias}
+        for alias in settings.CACHES
+    })
+    def handle(self, *args, **options):
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError("Cette mesure demande fork() (Linux, macOS).")
+        processus = max(options['processus'], 1)
+        ecritures = max(options['ecritures'], 1)
+        par_processus = max(options['conducteurs'], 1)
+
+        origine = dict(connections['default'].settings_dict)
+        dossier = Path(tempfile.mkdtemp(prefix='ecritures_'))
+        try:
+            modele = dossier / 'modele.sqlite3'
+            groupes = self._preparer(modele, processus, par_processus)
+            self.stdout.write(
+                f"{processus} processus × {ecritures} recettes ({processus * par_processus} conducteurs)\n"
+                f"{'connexion':<14}{'réussies':>10}{'verrouillées':>14}{'durée':>9}"
+                f"{'écritures/s':>13}{'médiane':>10}{'p95':>10}"
+            )
+            for numero, (libelle, reglage) in enumerate(REGLAGES):
+                base = dossier / f'mesure_{numero}.sqlite3'
+                shutil.copy(modele, base)
+                reussies, verrous, duree, mediane, p95 = self._mesurer(base, reglage, groupes, ecritures)
+                self.stdout.write(
+                    f"{libelle:<14}{reussies:>10}{verrous:>14}{duree:>8.2f}s"
+                    f"{reussies / duree:>13.0f}{mediane:>8.1f}ms{p95:>8.1f}ms"
+                )
+        finally:
+            connections['default'].close()
+            connections['default'].settings_dict.update(origine)
+            shutil.rmtree(dossier, ignore_errors=True)
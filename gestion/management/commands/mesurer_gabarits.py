@@ -0,0 +1,52 @@
+import time
+from pathlib import Path
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.test import RequestFactory
+
+from gestion.models import User
+
+
+DOSSIER_GABARITS = Path(__file__).resolve().parents[2] / 'templates'
+
+
+class Command(BaseCommand):
+    help = ("Mesure le temps de rendu de chaque gabarit : premier rendu (chargement, "
+            "compilation, fragments à calculer) puis rendus suivants (gabarit compilé, fragments en cache).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('gabarits', nargs='*',
+                            help="Gabarits à mesurer (défaut : tous ceux de l'application).")
+        parser.add_argument('--repetitions', type=int, default=50,
+                            help="Nombre de rendus mesurés par gabarit (défaut : 50).")
+        parser.add_argument('--role', choices=[role for role, _ in User.ROLE_CHOICES],
+                            help="Rendre pour un utilisateur connecté de ce rôle (défaut : anonyme).")
+
+    def handle(self, *args, **options):
+        noms = options['gabarits'] or sorted(
+            str(chemin.relative_to(DOSSIER_GABARITS)) for chemin in DOSSIER_GABARITS.rglob('*.html')
+        )
+        repetitions = max(options['repetitions'], 1)
+        requete = RequestFactory().get('/')
+        requete.user = User(username='mesure', role=options['role']) if options['role'] else AnonymousUser()
+        moteur = engines['django']
+        cache.clear()
+
+        self.stdout.write(f"{'gabarit':<40}{'premier':>12}{'suivants':>12}{'octets':>10}")
+        for nom in noms:
+            try:
+                debut = time.perf_counter()
+                contenu = moteur.get_template(nom).render({}, requete)
+                premier = (time.perf_counter() - debut) * 1000
+
+                debut = time.perf_counter()
+                for _ in range(repetitions):
+                    moteur.get_template(nom).render({}, requete)
+                suivants = (time.perf_counter() - debut) / repetitions * 1000
+            except Exception as erreur:
+                self.stdout.write(f"{nom:<40}  ignoré ({erreur.__class__.__name__} : contexte requis)")
+                continue
+            self.stdout.write(f"{nom:<40}{premier:>9.2f} ms{suivants:>9.2f} ms{len(contenu):>10}")
@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+
+PAGES = ('touriste', 'home', 'reservation_rapide', 'sitemap')
+
+
+class Command(BaseCommand):
+    help = ("Mesure, pour chaque page publique, les octets et le temps d'une première visite "
+            "(sans compression), d'une visite compressée et d'une visite répétée (304).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repetitions', type=int, default=20,
+                            help="Nombre de requêtes par mesure (défaut : 20).")
+
+    def _mesurer(self, client, url, repetitions, **entetes):
+        debut = time.perf_counter()
+        for _ in range(repetitions):
+            reponse = client.get(url, **entetes)
+        duree = (time.perf_counter() - debut) / repetitions * 1000
+        return reponse, len(reponse.content), duree
+
+    def handle(self, *args, **options):
+        repetitions = max(options['repetitions'], 1)
+        hote = next((h for h in settings.ALLOWED_HOSTS if not h.startswith('.')), 'localhost')
+        client = Client(HTTP_HOST=hote)
+
+        self.stdout.write(f"{'page':<20}{'complète':>22}{'gzip':>22}{'répétée (304)':>22}")
+        for nom in PAGES:
+            url = reverse(nom)
+            client.get(url)  # première visite : cookie CSRF posé
+            complete, octets, duree = self._mesurer(client, url, repetitions)
+            _, octets_gzip, duree_gzip = self._mesurer(client, url, repetitions, HTTP_ACCEPT_ENCODING='gzip')
+
+            conditionnels = {'HTTP_ACCEPT_ENCODING': 'gzip'}
+            if complete.has_header('ETag'):
+                conditionnels['HTTP_IF_NONE_MATCH'] = complete['ETag']
+            repetee, octets_304, duree_304 = self._mesurer(client, url, repetitions, **conditionnels)
+
+            self.stdout.write(
+                f"{nom:<20}"
+                f"{octets:>10} o {duree:>7.2f} ms"
+                f"{octets_gzip:>10} o {duree_gzip:>7.2f} ms"
+                f"{octets_304:>10} o {duree_304:>7.2f} ms"
+                + ('' if repetee.status_code == 304 else f"  (statut {repetee.status_code})")
+            )
@@ -0,0 +1,111 @@
+import itertools
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q
+
+from gestion import instantane, recherche
+from gestion.models import Question, ReservationRapide
+
+
+METIER = (
+    "moto taxi course conducteur casque sécurité prix tarif trajet abidjan cocody plateau yopougon "
+    "marcory treichville aéroport gare nuit matin retard réservation abonnement paiement mobile money "
+    "bagage colis livraison assurance accident permis vitesse pluie client passager attente numéro "
+    "whatsapp annulation remboursement horaire dimanche semaine mois quartier adresse rue carrefour"
+).split()
+TERMES = ('casque', 'aéroport nuit', 'remboursement', 'moto', 'mobile money', 'yopou', 'le prix de la course', 'zzz')
+SYLLABES = "ba be bi bo bu da de di do ka ke ki ko ku la le li lo ma me mi mo na ne ni no pa po ra re ri ro sa se si so ta te ti to va vo za".split()
+
+
+def _vocabulaire(alea):
+    """Mots vides, puis vocabulaire métier, puis une longue traîne de mots inventés,
+    tirés selon une loi de Zipf comme dans un texte réel."""
+    traine = {''.join(alea.choice(SYLLABES) for _ in range(alea.randint(3, 4))) for _ in range(6000)}
+    mots = sorted(recherche.MOTS_VIDES) + list(METIER) + sorted(traine)
+    return mots, list(itertools.accumulate(1 / rang for rang in range(1, len(mots) + 1)))
+
+
+class Command(BaseCommand):
+    help = ("Insère N questions et N réservations rapides dans une copie temporaire de la base "
+            "puis compare la recherche plein texte FTS5 au filtre icontains, en millisecondes par "
+            "recherche. La base du projet n'est pas touchée.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lignes', type=int, default=200_000,
+                            help="Lignes insérées par table (défaut : 200 000).")
+        parser.add_argument('--repetitions', type=int, default=20,
+                            help="Mesures par terme (défaut : 20).")
+
+    def _texte(self, alea, nombre):
+        return ' '.join(alea.choices(self.mots, cum_weights=self.poids, k=nombre))
+
+    def _remplir(self, nombre):
+        alea = random.Random(0)
+        self.mots, self.poids = _vocabulaire(alea)
+        for debut in range(0, nombre, 5000):
+            taille = min(5000, nombre - debut)
+            Question.objects.bulk_create([
+                Question(nom=f'Visiteur {debut + i}', email=f'v{debut + i}@exemple.ci',
+                         sujet=self._texte(alea, 4), message=self._texte(alea, 60),
+                         reponse=self._texte(alea, 40), statut='repondu' if i % 2 else 'en_attente')
+                for i in range(taille)
+            ])
+            ReservationRapide.objects.bulk_create([
+                ReservationRapide(nom=f'Passager {debut + i}', lieu=alea.choice(METIER),
+                                  destination=alea.choice(METIER), sujet=self._texte(alea, 4),
+                                  message=self._texte(alea, 50))
+                for i in range(taille)
+            ])
+
+    def _mesurer(self, fonction, repetitions):
+        durees = []
+        for _ in range(repetitions):
+            debut = time.perf_counter()
+            fonction()
+            durees.append((time.perf_counter() - debut) * 1000)
+        return statistics.median(durees)
+
+    def handle(self, *args, **options):
+        nombre = max(options['lignes'], 1)
+        repetitions = max(options['repetitions'], 1)
+        # Copie temporaire : le remplissage ne prend pas le verrou d'écriture de la base du projet
+        origine = dict(connections['default'].settings_dict)
+        dossier = Path(tempfile.mkdtemp(prefix='recherche_'))
+        try:
+            copie = dossier / 'copie.sqlite3'
+            instantane.copier(copie)
+            connections['default'].close()
+            connections['default'].settings_dict['NAME'] = copie
+            call_command('migrate', verbosity=0)
+            self._comparer(nombre, repetitions)
+        finally:
+            connections['default'].close()
+            connections['default'].settings_dict.update(origine)
+            shutil.rmtree(dossier, ignore_errors=True)
+
+    def _comparer(self, nombre, repetitions):
+        debut = time.perf_counter()
+        self._remplir(nombre)
+        self.stdout.write(f"{nombre} lignes par table insérées et indexées en {time.perf_counter() - debut:.1f} s")
+        self.stdout.write(f"{'terme':<22}{'FTS questions':>15}{'FTS FAQ':>10}{'FTS réserv.':>13}{'icontains':>11}")
+        for terme in TERMES:
+            fts_questions = self._mesurer(lambda: recherche.identifiants(Question, terme), repetitions)
+            fts_faq = self._mesurer(lambda: recherche.identifiants(Question, terme, 12, statut='repondu'), repetitions)
+            fts_reservations = self._mesurer(lambda: recherche.identifiants(ReservationRapide, terme), repetitions)
+            mot = terme.split()[-1]
+            filtre = Q(sujet__icontains=mot) | Q(message__icontains=mot) | Q(reponse__icontains=mot)
+            balayage = self._mesurer(
+                lambda: list(Question.objects.filter(filtre).values_list('id', flat=True)[:recherche.LIMITE]),
+                max(repetitions // 5, 1),
+            )
+            self.stdout.write(
+                f"{terme:<22}{fts_questions:>13.2f}ms{fts_faq:>8.2f}ms{fts_reservations:>11.2f}ms{balayage:>9.2f}ms"
+            )
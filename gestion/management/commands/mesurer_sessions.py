@@ -0,0 +1,149 @@
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from gestion import instantane
+from gestion.models import Conducteur, User
+
+
+MOTEURS = (
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+    'gestion.session_signee',
+)
+MOT_DE_PASSE = 'mesure-sessions'
+
+
+class _Compteur:
+    """Classe les requêtes SQL en lectures / écritures, sur la table des sessions ou ailleurs.
+
+    Partagé par les fils d'exécution : chacun l'installe sur sa propre connexion.
+    """
+
+    def __init__(self):
+        self.requetes = Counter()
+        self._verrou = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        nature = 'ecriture' if sql.lstrip().split(None, 1)[0].upper() in ('INSERT', 'UPDATE', 'DELETE') else 'lecture'
+        table = 'session' if 'django_session' in sql else 'autre'
+        with self._verrou:
+            self.requetes[nature, table] += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = ("Simule la fin de journée de N conducteurs (connexion, tableau de bord, saisie de la "
+            "recette, déconnexion), par vagues simultanées, pour chaque moteur de session : "
+            "écritures SQL, erreurs « database is locked » et latence des connexions. Sur une "
+            "copie temporaire de la base : la base du projet n'est pas touchée.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conducteurs', type=int, default=200,
+                            help="Nombre de conducteurs simulés (défaut : 200).")
+        parser.add_argument('--simultanes', type=int, default=16,
+                            help="Conducteurs connectés en même temps (défaut : 16).")
+
+    def _journee(self, hote, noms, compteur, depart, resultats):
+        """Un fil d'exécution : la fin de journée de ses conducteurs, l'un après l'autre."""
+        verrous, latences = 0, []
+        depart.wait()
+        with connection.execute_wrapper(compteur):
+            for nom in noms:
+                client = Client(HTTP_HOST=hote)
+                try:
+                    debut = time.perf_counter()
+                    client.post(reverse('login'), {'username': nom, 'password': MOT_DE_PASSE})
+                    latences.append(time.perf_counter() - debut)
+                    client.get(reverse('conducteur_dashboard'))
+                    client.post(reverse('conducteur_dashboard'), {'montant': '15000', 'depense': '2000'})
+                    client.get(reverse('conducteur_dashboard'))
+                    client.get(reverse('logout'))
+                except OperationalError as erreur:
+                    if 'locked' not in str(erreur):
+                        raise
+                    verrous += 1
+        connections.close_all()
+        resultats.append((verrous, latences))
+
+    # Hachage rapide : on mesure les sessions, pas PBKDF2 ; caches en mémoire : les
+    # révocations et invalidations ne touchent pas les caches du projet
+    @override_settings(
+        PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+        CACHES={
+            alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': alias}
+            for alias in settings.CACHES
+        },
+    )
+    def handle(self, *args, **options):
+        nombre = max(options['conducteurs'], 1)
+        simultanes = min(max(options['simultanes'], 1), nombre)
+        # Copie temporaire : les écritures de la mesure ne prennent pas le verrou de la base du projet
+        origine = dict(connections['default'].settings_dict)
+        dossier = Path(tempfile.mkdtemp(prefix='sessions_'))
+        try:
+            copie = dossier / 'copie.sqlite3'
+            instantane.copier(copie)
+            connections['default'].close()
+            connections['default'].settings_dict['NAME'] = copie
+            call_command('migrate', verbosity=0)
+            self._mesurer(nombre, simultanes)
+        finally:
+            connections['default'].close()
+            connections['default'].settings_dict.update(origine)
+            shutil.rmtree(dossier, ignore_errors=True)
+
+    def _mesurer(self, nombre, simultanes):
+        hote = next((h for h in settings.ALLOWED_HOSTS if not h.startswith('.')), 'localhost')
+        requetes_http = nombre * 5
+
+        self.stdout.write(
+            f"{nombre} conducteurs dont {simultanes} simultanés, {requetes_http} requêtes HTTP par moteur\n"
+            f"{'moteur':<45}{'écritures session':>18}{'autres écritures':>18}"
+            f"{'lectures session':>18}{'verrouillées':>14}{'p95 connexion':>15}{'durée':>10}"
+        )
+        for numero, moteur in enumerate(MOTEURS):
+            # Des conducteurs neufs par moteur : aucune recette déjà saisie ce jour
+            noms = []
+            for i in range(nombre):
+                user = User.objects.create_user(
+                    username=f'mesure_sessions_{numero}_{i}', password=MOT_DE_PASSE, role='conducteur'
+                )
+                Conducteur.objects.create(user=user, adresse='-', telephone='-')
+                noms.append(user.username)
+            connections['default'].close()
+
+            compteur = _Compteur()
+            depart = threading.Barrier(simultanes + 1)
+            resultats = []
+            with override_settings(SESSION_ENGINE=moteur):
+                fils = [
+                    threading.Thread(target=self._journee,
+                                     args=(hote, noms[i::simultanes], compteur, depart, resultats))
+                    for i in range(simultanes)
+                ]
+                for fil in fils:
+                    fil.start()
+                depart.wait()
+                debut = time.perf_counter()
+                for fil in fils:
+                    fil.join()
+                duree = time.perf_counter() - debut
+            verrous = sum(resultat[0] for resultat in resultats)
+            latences = sorted(latence for resultat in resultats for latence in resultat[1])
+            p95 = latences[int(len(latences) * 0.95)] * 1000 if latences else 0
+            requetes = compteur.requetes
+            self.stdout.write(
+                f"{moteur:<45}{requetes['ecriture', 'session']:>18}{requetes['ecriture', 'autre']:>18}"
+                f"{requetes['lecture', 'session']:>18}{verrous:>14}{p95:>13.1f}ms{duree:>9.2f}s"
+            )
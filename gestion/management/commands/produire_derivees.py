@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from gestion import factures
+from gestion.models import Panne
+
+
+class Command(BaseCommand):
+    help = ("Produit les vignettes et aperçus WebP manquants des factures en image "
+            "(factures déposées avant leur production au dépôt).")
+
+    def handle(self, *args, **options):
+        noms = Panne.objects.exclude(facture='').exclude(facture__isnull=True).values_list('facture', flat=True)
+        produites, illisibles = 0, 0
+        for nom in noms.distinct().iterator():
+            if not factures.est_image(nom):
+                continue
+            try:
+                produites += factures.produire_derivees(nom)
+            except OSError as erreur:
+                illisibles += 1
+                self.stderr.write(f"{nom} : {erreur}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{produites} dérivée(s) produite(s), {illisibles} facture(s) illisible(s)."
+        ))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from gestion import instantane
+
+
+class Command(BaseCommand):
+    help = ("Copie la base dans l'instantané en lecture seule lu par les rapports et les exports "
+            "(API de sauvegarde SQLite). Avec --intervalle, recommence indéfiniment.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalle', type=int, default=0,
+                            help="Secondes entre deux copies ; 0 (défaut) pour une seule copie, via cron par exemple.")
+
+    def _copier(self):
+        debut = time.perf_counter()
+        # Les bilans mis en cache depuis l'ancienne copie portent sa date dans leur clé (instantane.source)
+        pages = instantane.rafraichir()
+        self.stdout.write(self.style.SUCCESS(
+            f"Instantané rafraîchi : {pages} pages en {time.perf_counter() - debut:.2f} s."
+        ))
+
+    def handle(self, *args, **options):
+        intervalle = options['intervalle']
+        self._copier()
+        while intervalle > 0:
+            # Pas de connexion gardée ouverte entre deux copies
+            connections.close_all()
+            time.sleep(intervalle)
+            self._copier()
@@ -0,0 +1,26 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.reconciliation import rapprocher
+
+
+class Command(BaseCommand):
+    help = ("Liste les jours où un conducteur avait une moto attribuée sans recette ni absence "
+            "(à lancer chaque jour ; par défaut depuis le dernier passage jusqu'à hier).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--debut', help="Premier jour à rapprocher (AAAA-MM-JJ).")
+        parser.add_argument('--fin', help="Dernier jour à rapprocher (AAAA-MM-JJ).")
+
+    def handle(self, *args, **options):
+        try:
+            debut = date.fromisoformat(options['debut']) if options['debut'] else None
+            fin = date.fromisoformat(options['fin']) if options['fin'] else None
+        except ValueError as erreur:
+            raise CommandError(f"Date invalide : {erreur}")
+
+        debut, fin, nb = rapprocher(debut, fin)
+        self.stdout.write(self.style.SUCCESS(
+            f"Du {debut} au {fin} : {nb} recette(s) manquante(s)."
+        ))
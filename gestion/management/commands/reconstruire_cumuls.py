@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from gestion.cumuls import reconstruire_cumuls_recettes, reconstruire_cumuls_pannes
+
+
+class Command(BaseCommand):
+    help = "Recalcule entièrement les cumuls jour/semaine/mois des recettes et des pannes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conducteur', type=int, action='append', dest='conducteurs',
+                            help="Limiter aux recettes de ce conducteur (répétable).")
+        parser.add_argument('--moto', type=int, action='append', dest='motos',
+                            help="Limiter aux pannes de cette moto (répétable).")
+
+    def handle(self, *args, **options):
+        conducteurs = options['conducteurs']
+        motos = options['motos']
+        # Sans filtre, on reconstruit tout ; avec un filtre, seulement la table concernée
+        if conducteurs or not motos:
+            nb = reconstruire_cumuls_recettes(conducteurs)
+            self.stdout.write(self.style.SUCCESS(f"{nb} cumuls de recettes reconstruits."))
+        if motos or not conducteurs:
+            nb = reconstruire_cumuls_pannes(motos)
+            self.stdout.write(self.style.SUCCESS(f"{nb} cumuls de pannes reconstruits."))
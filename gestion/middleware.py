@@ -0,0 +1,45 @@
+"""
+Profil métier de l'utilisateur connecté (Conducteur ou Client), résolu au
+plus une fois par requête et partagé par les décorateurs et les vues.
+"""
+from django.utils.functional import cached_property
+
+from .models import Client, Conducteur
+
+
+class Profil:
+    """Chargé à la première lecture ; None si l'utilisateur n'a pas ce rôle ou pas de fiche."""
+
+    def __init__(self, user):
+        self.user = user
+
+    def _charger(self, role, requete):
+        if not self.user.is_authenticated or self.user.role != role:
+            return None
+        profil = requete.filter(user=self.user).first()
+        if profil is not None:
+            profil.user = self.user  # déjà chargé par l'authentification
+        return profil
+
+    @cached_property
+    def conducteur(self):
+        return self._charger('conducteur', Conducteur.objects.select_related('moto'))
+
+    @cached_property
+    def client(self):
+        return self._charger('client', Client.objects.all())
+
+
+def profil(request):
+    """Profil de la requête (créé à la demande si le middleware n'est pas passé)."""
+    if not hasattr(request, 'profil'):
+        request.profil = Profil(request.user)
+    return request.profil
+
+
+def profil_middleware(get_response):
+    # Après AuthenticationMiddleware : request.user doit exister
+    def middleware(request):
+        request.profil = Profil(request.user)
+        return get_response(request)
+    return middleware
@@ -0,0 +1,66 @@
+# Generated by Django 5.2 on 2026-10-18 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+
+def remplir_cumuls(apps, schema_editor):
+    troncatures = {'jour': TruncDay, 'semaine': TruncWeek, 'mois': TruncMonth}
+    sources = [
+        (apps.get_model('gestion', 'Recette'), apps.get_model('gestion', 'CumulRecette'), 'conducteur_id',
+         {'montant': Sum('montant'), 'depense': Sum('depense'), 'nb_recettes': Count('id')}),
+        (apps.get_model('gestion', 'Panne'), apps.get_model('gestion', 'CumulPanne'), 'moto_id',
+         {'montant_depense': Sum('montant_depense'), 'nb_pannes': Count('id')}),
+    ]
+    for source, cumul, cle, sommes in sources:
+        lignes = []
+        for periode, troncature in troncatures.items():
+            groupes = source.objects.order_by().annotate(debut=troncature('date')).values(cle, 'debut').annotate(**sommes)
+            lignes.extend(cumul(periode=periode, **groupe) for groupe in groupes)
+        cumul.objects.bulk_create(lignes, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0010_reservationrapide_destination_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CumulPanne',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periode', models.CharField(choices=[('jour', 'Jour'), ('semaine', 'Semaine'), ('mois', 'Mois')], max_length=10)),
+                ('debut', models.DateField()),
+                ('montant_depense', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('nb_pannes', models.PositiveIntegerField(default=0)),
+                ('moto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cumuls', to='gestion.moto')),
+            ],
+            options={
+                'ordering': ['-debut'],
+                'indexes': [models.Index(fields=['periode', 'debut'], name='gestion_cum_periode_ec53fc_idx')],
+                'unique_together': {('moto', 'periode', 'debut')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CumulRecette',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periode', models.CharField(choices=[('jour', 'Jour'), ('semaine', 'Semaine'), ('mois', 'Mois')], max_length=10)),
+                ('debut', models.DateField()),
+                ('montant', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('depense', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('nb_recettes', models.PositiveIntegerField(default=0)),
+                ('conducteur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cumuls', to='gestion.conducteur')),
+            ],
+            options={
+                'ordering': ['-debut'],
+                'indexes': [models.Index(fields=['periode', 'debut'], name='gestion_cum_periode_94cb37_idx')],
+                'unique_together': {('conducteur', 'periode', 'debut')},
+            },
+        ),
+        migrations.RunPython(remplir_cumuls, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-18 10:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0011_cumuls'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Traitement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=50, unique=True)),
+                ('dernier_jour', models.DateField(blank=True, help_text='Dernier jour traité', null=True)),
+                ('derniere_execution', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AnomalieRecette',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('champ', models.CharField(choices=[('montant', 'Montant'), ('depense', 'Dépense')], max_length=10)),
+                ('valeur', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('mediane', models.DecimalField(decimal_places=2, help_text='Médiane glissante du même jour de la semaine', max_digits=10)),
+                ('score', models.FloatField(help_text='Écart robuste (médiane / MAD)')),
+                ('vue', models.BooleanField(default=False)),
+                ('date_detection', models.DateTimeField(auto_now_add=True)),
+                ('conducteur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalies', to='gestion.conducteur')),
+                ('recette', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalies', to='gestion.recette')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['vue', 'date'], name='gestion_ano_vue_a9d6d0_idx')],
+                'unique_together': {('recette', 'champ')},
+            },
+        ),
+    ]
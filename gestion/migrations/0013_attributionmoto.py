@@ -0,0 +1,55 @@
+# Generated by Django 5.2 on 2026-10-18 10:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def initialiser_historique(apps, schema_editor):
+    # Faute d'historique, on suppose que l'attribution actuelle couvre toutes
+    # les recettes déjà saisies par le conducteur.
+    Moto = apps.get_model('gestion', 'Moto')
+    Conducteur = apps.get_model('gestion', 'Conducteur')
+    AttributionMoto = apps.get_model('gestion', 'AttributionMoto')
+    aujourd_hui = django.utils.timezone.localdate()
+    conducteurs = {
+        c['moto_id']: c
+        for c in Conducteur.objects.filter(moto__isnull=False)
+        .annotate(premiere=Min('recette__date')).values('id', 'moto_id', 'premiere')
+    }
+    AttributionMoto.objects.bulk_create([
+        AttributionMoto(
+            moto_id=moto.id,
+            conducteur_id=conducteurs[moto.id]['id'] if moto.id in conducteurs else None,
+            statut=moto.statut,
+            debut=(conducteurs.get(moto.id) or {}).get('premiere') or aujourd_hui,
+        )
+        for moto in Moto.objects.all()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0012_anomalies_recettes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttributionMoto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('statut', models.CharField(choices=[('disponible', 'Disponible'), ('attribuee', 'Attribuée'), ('reparation', 'En réparation')], max_length=20)),
+                ('debut', models.DateField(default=django.utils.timezone.localdate)),
+                ('fin', models.DateField(blank=True, null=True)),
+                ('conducteur', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='attributions', to='gestion.conducteur')),
+                ('moto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attributions', to='gestion.moto')),
+            ],
+            options={
+                'ordering': ['-debut'],
+                'indexes': [models.Index(fields=['moto', 'debut'], name='gestion_att_moto_id_61d749_idx'), models.Index(fields=['conducteur', 'debut', 'fin'], name='gestion_att_conduct_d0147e_idx')],
+            },
+        ),
+        migrations.RunPython(initialiser_historique, migrations.RunPython.noop),
+    ]
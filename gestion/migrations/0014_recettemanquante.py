@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-18 10:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0013_attributionmoto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecetteManquante',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('date_detection', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='absence',
+            index=models.Index(fields=['conducteur', 'date'], name='gestion_abs_conduct_22cf1b_idx'),
+        ),
+        migrations.AddField(
+            model_name='recettemanquante',
+            name='conducteur',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recettes_manquantes', to='gestion.conducteur'),
+        ),
+        migrations.AddField(
+            model_name='recettemanquante',
+            name='moto',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='gestion.moto'),
+        ),
+        migrations.AddIndex(
+            model_name='recettemanquante',
+            index=models.Index(fields=['date'], name='gestion_rec_date_e0177e_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='recettemanquante',
+            unique_together={('conducteur', 'date')},
+        ),
+    ]
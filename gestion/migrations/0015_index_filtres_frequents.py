@@ -0,0 +1,58 @@
+# Generated by Django 5.2 on 2026-10-18 10:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('gestion', '0014_recettemanquante'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='abonnement',
+            index=models.Index(fields=['statut', 'date_demande'], name='gestion_abo_statut_fb0f67_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='abonnement',
+            index=models.Index(fields=['date_demande'], name='gestion_abo_date_de_48714a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='panne',
+            index=models.Index(fields=['date'], name='gestion_pan_date_083ffa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['statut', 'date_creation'], name='gestion_que_statut_7e0468_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['email', 'statut'], name='gestion_que_email_c554b1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['date_creation'], name='gestion_que_date_cr_a76685_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recette',
+            index=models.Index(fields=['date'], name='gestion_rec_date_3d5c46_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['statut', 'date_reservation'], name='gestion_res_statut_27827e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['date_reservation'], name='gestion_res_date_re_73a10a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservationrapide',
+            index=models.Index(fields=['date_creation'], name='gestion_res_date_cr_ab2e90_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['email'], name='gestion_use_email_d41e73_idx'),
+        ),
+    ]
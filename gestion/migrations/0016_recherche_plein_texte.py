@@ -0,0 +1,56 @@
+"""
+Index plein texte FTS5 des questions et des réservations rapides.
+
+Tables « à contenu externe » : le texte reste dans la table d'origine, FTS5
+ne stocke que l'index inversé. Les triggers le tiennent à jour à chaque
+INSERT / UPDATE / DELETE, y compris bulk_create() et update() qui ne
+déclenchent pas les signaux Django.
+"""
+from django.db import migrations
+
+
+INDEX = {
+    'gestion_question': ('sujet', 'message', 'reponse'),
+    'gestion_reservationrapide': ('nom', 'sujet', 'message', 'lieu', 'destination'),
+}
+
+
+def _creer(table, colonnes):
+    fts = f'{table}_fts'
+    liste = ', '.join(colonnes)
+    nouvelles = ', '.join(f'new.{colonne}' for colonne in colonnes)
+    anciennes = ', '.join(f'old.{colonne}' for colonne in colonnes)
+    supprimer = f"INSERT INTO {fts}({fts}, rowid, {liste}) VALUES ('delete', old.id, {anciennes});"
+    ajouter = f"INSERT INTO {fts}(rowid, {liste}) VALUES (new.id, {nouvelles});"
+    return [
+        # prefix : index des préfixes de 2 et 3 lettres, pour la recherche pendant la saisie
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({liste}, content='{table}', content_rowid='id', "
+        f"prefix='2 3', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN {ajouter} END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN {supprimer} END",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {liste} ON {table} BEGIN {supprimer} {ajouter} END",
+        # Lignes déjà présentes
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def _supprimer(table):
+    fts = f'{table}_fts'
+    return [
+        f"DROP TRIGGER IF EXISTS {fts}_ai",
+        f"DROP TRIGGER IF EXISTS {fts}_ad",
+        f"DROP TRIGGER IF EXISTS {fts}_au",
+        f"DROP TABLE IF EXISTS {fts}",
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0015_index_filtres_frequents'),
+    ]
+
+    operations = [
+        migrations.RunSQL(_creer(table, colonnes), reverse_sql=_supprimer(table))
+        for table, colonnes in INDEX.items()
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 10:59
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0016_recherche_plein_texte'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecetteArchivee',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('jour', models.CharField(choices=[('Lundi', 'Lundi'), ('Mardi', 'Mardi'), ('Mercredi', 'Mercredi'), ('Jeudi', 'Jeudi'), ('Vendredi', 'Vendredi'), ('Samedi', 'Samedi'), ('Dimanche', 'Dimanche')], max_length=10)),
+                ('montant', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('depense', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('date_archivage', models.DateTimeField(default=django.utils.timezone.now)),
+                ('conducteur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recettes_archivees', to='gestion.conducteur')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date'], name='gestion_rec_date_bcd08f_idx')],
+                'unique_together': {('conducteur', 'date')},
+            },
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.db.models.signals import post_migrate
 from django.dispatch import receiver
@@ -16,6 +17,9 @@ class User(AbstractUser):
     )
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='conducteur')
 
+    class Meta(AbstractUser.Meta):
+        indexes = [models.Index(fields=['email'])]
+
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
 
@@ -50,6 +54,28 @@ class Conducteur(models.Model):
         return self.user.get_full_name() or self.user.username
 
 
+# -----------------------
+# Historique des attributions de motos
+# -----------------------
+class AttributionMoto(models.Model):
+    """État d'une moto (conducteur + statut) sur l'intervalle [debut, fin[ ; fin vide = en cours."""
+    moto = models.ForeignKey(Moto, on_delete=models.CASCADE, related_name='attributions')
+    conducteur = models.ForeignKey(Conducteur, on_delete=models.CASCADE, null=True, blank=True, related_name='attributions')
+    statut = models.CharField(max_length=20, choices=Moto.STATUT_CHOICES)
+    debut = models.DateField(default=timezone.localdate)
+    fin = models.DateField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-debut']
+        indexes = [
+            models.Index(fields=['moto', 'debut']),
+            models.Index(fields=['conducteur', 'debut', 'fin']),
+        ]
+
+    def __str__(self):
+        return f"{self.moto_id} - {self.conducteur_id or 'aucun'} ({self.statut}) du {self.debut} au {self.fin or '…'}"
+
+
 # -----------------------
 # Jours de la semaine
 # -----------------------
@@ -77,16 +103,51 @@ class Recette(models.Model):
     class Meta:
         unique_together = ('conducteur', 'date')
         ordering = ['-date']
+        # (conducteur, date) ne sert pas « toutes les recettes du jour »
+        indexes = [models.Index(fields=['date'])]
 
     @property
     def benefice(self):
         """Calcul automatique du bénéfice net"""
         return self.montant - self.depense
 
+    def clean(self):
+        # Unicité (conducteur, date) avec l'archive aussi (voir archivage.py), pour l'admin
+        if self.conducteur_id and self.date and RecetteArchivee.objects.filter(
+            conducteur_id=self.conducteur_id, date=self.date,
+        ).exists():
+            raise ValidationError("Une recette archivée existe déjà pour ce conducteur à cette date.")
+
     def __str__(self):
         return f"{self.conducteur} - {self.date} : {self.montant} FCFA"
 
 
+# -----------------------
+# Recettes archivées (voir archivage.py)
+# -----------------------
+class RecetteArchivee(models.Model):
+    """Recette ancienne sortie de la table chaude ; garde l'id de la recette d'origine."""
+    id = models.BigIntegerField(primary_key=True)
+    conducteur = models.ForeignKey(Conducteur, on_delete=models.CASCADE, related_name='recettes_archivees')
+    date = models.DateField()
+    jour = models.CharField(max_length=10, choices=JOURS_SEMAINE)
+    montant = models.DecimalField(max_digits=10, decimal_places=2)
+    depense = models.DecimalField(max_digits=10, decimal_places=2)
+    date_archivage = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('conducteur', 'date')
+        ordering = ['-date']
+        indexes = [models.Index(fields=['date'])]
+
+    @property
+    def benefice(self):
+        return self.montant - self.depense
+
+    def __str__(self):
+        return f"{self.conducteur} - {self.date} : {self.montant} FCFA (archivée)"
+
+
 # -----------------------
 # Absences
 # -----------------------
@@ -95,6 +156,9 @@ class Absence(models.Model):
     date = models.DateField(default=timezone.now)
     raison = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['conducteur', 'date'])]
+
     def __str__(self):
         return f"{self.conducteur} absent le {self.date}"
 
@@ -112,6 +176,7 @@ class Panne(models.Model):
 
     class Meta:
         ordering = ['-date']
+        indexes = [models.Index(fields=['date'])]
 
     def __str__(self):
         return f"Panne de {self.moto.nom} le {self.date} - Dépense : {self.montant_depense} FCFA"
@@ -135,6 +200,13 @@ class Question(models.Model):
     date_creation = models.DateTimeField(auto_now_add=True)
     date_reponse = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['statut', 'date_creation']),   # FAQ de la page touriste
+            models.Index(fields=['email', 'statut']),           # question déjà en attente ?
+            models.Index(fields=['date_creation']),             # liste paginée
+        ]
+
     def __str__(self):
         return f"{self.sujet} - {self.nom}"
 
@@ -173,6 +245,12 @@ class Reservation(models.Model):
     lieu_arrivee = models.CharField(max_length=255)
     statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['statut', 'date_reservation']),
+            models.Index(fields=['date_reservation']),
+        ]
+
     def __str__(self):
         return f"Réservation de {self.client.user.username} le {self.date_course} ({self.statut})"
 
@@ -206,6 +284,12 @@ class Abonnement(models.Model):
     statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente')
     date_demande = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['statut', 'date_demande']),
+            models.Index(fields=['date_demande']),
+        ]
+
     def __str__(self):
         return f"Abonnement de {self.client.user.username} ({self.statut})"
 
@@ -238,5 +322,114 @@ class ReservationRapide(models.Model):
     statut = models.CharField(max_length=20, default='en attente')  # 'en attente' ou 'lu'
     date_creation = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['date_creation'])]
+
     def __str__(self):
         return f"{self.nom or (self.client.username if self.client else 'Anonyme')} - {self.sujet}"
+
+
+# -----------------------
+# Cumuls pré-agrégés (jour / semaine / mois)
+# -----------------------
+PERIODES_CUMUL = (
+    ('jour', 'Jour'),
+    ('semaine', 'Semaine'),
+    ('mois', 'Mois'),
+)
+
+
+class CumulRecette(models.Model):
+    """Totaux des recettes d'un conducteur sur une période, tenus à jour par signaux."""
+    conducteur = models.ForeignKey(Conducteur, on_delete=models.CASCADE, related_name='cumuls')
+    periode = models.CharField(max_length=10, choices=PERIODES_CUMUL)
+    debut = models.DateField()
+    montant = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    depense = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    nb_recettes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('conducteur', 'periode', 'debut')
+        indexes = [models.Index(fields=['periode', 'debut'])]
+        ordering = ['-debut']
+
+    @property
+    def benefice(self):
+        return self.montant - self.depense
+
+    def __str__(self):
+        return f"{self.conducteur_id} - {self.periode} {self.debut} : {self.montant} FCFA"
+
+
+class CumulPanne(models.Model):
+    """Totaux des pannes d'une moto sur une période, tenus à jour par signaux."""
+    moto = models.ForeignKey(Moto, on_delete=models.CASCADE, related_name='cumuls')
+    periode = models.CharField(max_length=10, choices=PERIODES_CUMUL)
+    debut = models.DateField()
+    montant_depense = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    nb_pannes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('moto', 'periode', 'debut')
+        indexes = [models.Index(fields=['periode', 'debut'])]
+        ordering = ['-debut']
+
+    def __str__(self):
+        return f"{self.moto_id} - {self.periode} {self.debut} : {self.montant_depense} FCFA"
+
+
+# -----------------------
+# Traitements périodiques (filigrane des exécutions incrémentales)
+# -----------------------
+class Traitement(models.Model):
+    nom = models.CharField(max_length=50, unique=True)
+    dernier_jour = models.DateField(null=True, blank=True, help_text="Dernier jour traité")
+    derniere_execution = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.nom} (jusqu'au {self.dernier_jour})"
+
+
+# -----------------------
+# Anomalies détectées sur les recettes
+# -----------------------
+class AnomalieRecette(models.Model):
+    CHAMP_CHOICES = (
+        ('montant', 'Montant'),
+        ('depense', 'Dépense'),
+    )
+    recette = models.ForeignKey(Recette, on_delete=models.CASCADE, related_name='anomalies')
+    conducteur = models.ForeignKey(Conducteur, on_delete=models.CASCADE, related_name='anomalies')
+    date = models.DateField()
+    champ = models.CharField(max_length=10, choices=CHAMP_CHOICES)
+    valeur = models.DecimalField(max_digits=10, decimal_places=2)
+    mediane = models.DecimalField(max_digits=10, decimal_places=2, help_text="Médiane glissante du même jour de la semaine")
+    score = models.FloatField(help_text="Écart robuste (médiane / MAD)")
+    vue = models.BooleanField(default=False)
+    date_detection = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('recette', 'champ')
+        ordering = ['-date']
+        indexes = [models.Index(fields=['vue', 'date'])]
+
+    def __str__(self):
+        return f"{self.conducteur_id} - {self.date} : {self.champ} {self.valeur} (médiane {self.mediane})"
+
+
+# -----------------------
+# Recettes manquantes (jours travaillés sans recette ni absence)
+# -----------------------
+class RecetteManquante(models.Model):
+    conducteur = models.ForeignKey(Conducteur, on_delete=models.CASCADE, related_name='recettes_manquantes')
+    moto = models.ForeignKey(Moto, on_delete=models.SET_NULL, null=True, blank=True)
+    date = models.DateField()
+    date_detection = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('conducteur', 'date')
+        ordering = ['-date']
+        indexes = [models.Index(fields=['date'])]
+
+    def __str__(self):
+        return f"Recette manquante : {self.conducteur_id} le {self.date}"
@@ -0,0 +1,149 @@
+"""
+Pagination par curseur (keyset) des listes d'administration.
+
+Plutôt qu'un OFFSET, qui relit toutes les lignes sautées, la page suivante
+repart de la dernière ligne affichée :
+    WHERE (champ, id) < (valeur, id_dernier) ORDER BY champ DESC, id DESC LIMIT n + 1
+La ligne en plus indique s'il reste une page. Avec un index sur la colonne de
+tri, le coût d'une page ne dépend pas de la taille de la table.
+
+Le curseur est opaque pour le navigateur (base64 url de « valeur|id ») ; un
+curseur illisible ramène simplement à la première page.
+"""
+import base64
+import binascii
+from bisect import bisect_right
+from dataclasses import dataclass
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.db.models.functions import Substr
+from django.http import JsonResponse
+
+
+PAR_PAGE = 50
+PARAMETRE = 'apres'
+APERCU = 300            # caractères d'un long texte lus pour une liste
+
+
+@dataclass(frozen=True)
+class Page:
+    objets: list
+    suivant: str | None     # curseur de la page suivante, None sur la dernière page
+    premiere: bool
+
+
+def encoder(valeur, pk):
+    brut = f"{'' if valeur is None else valeur.isoformat() if hasattr(valeur, 'isoformat') else valeur}|{pk}"
+    return base64.urlsafe_b64encode(brut.encode()).decode().rstrip('=')
+
+
+def decoder(curseur, champ_modele=None):
+    """(valeur, pk) lus dans le curseur, ou None s'il est absent ou illisible."""
+    if not curseur:
+        return None
+    try:
+        brut = base64.urlsafe_b64decode(curseur + '=' * (-len(curseur) % 4)).decode()
+        valeur, _, pk = brut.rpartition('|')
+        pk = int(pk)
+        if champ_modele is not None:
+            valeur = champ_modele.to_python(valeur)
+    except (binascii.Error, UnicodeDecodeError, ValueError, ValidationError):
+        return None
+    return valeur, pk
+
+
+def apercu(champ, longueur=APERCU):
+    """Début d'un long texte, à annoter à la place du champ différé (`defer`/`only`).
+
+    Un caractère de plus que `longueur` : `truncatechars` dans le gabarit sait
+    ainsi si le texte a été coupé.
+    """
+    return Substr(champ, 1, longueur + 1)
+
+
+def paginer(requete, tri='-pk', curseur=None, par_page=PAR_PAGE):
+    """Une page de `requete` triée par `tri` (« -champ » pour l'ordre décroissant) puis par id.
+
+    L'id départage les ex æquo : (champ, id) est un ordre total, aucune ligne
+    n'est sautée ni répétée d'une page à l'autre.
+    """
+    decroissant = tri.startswith('-')
+    champ = tri.lstrip('-')
+    sens = 'lt' if decroissant else 'gt'
+    signe = '-' if decroissant else ''
+
+    if champ == 'pk':
+        requete = requete.order_by(f'{signe}pk')
+        position = decoder(curseur)
+        if position is not None:
+            requete = requete.filter(**{f'pk__{sens}': position[1]})
+    else:
+        requete = requete.order_by(f'{signe}{champ}', f'{signe}pk')
+        position = decoder(curseur, requete.model._meta.get_field(champ))
+        if position is not None:
+            valeur, pk = position
+            requete = requete.filter(
+                Q(**{f'{champ}__{sens}': valeur}) | Q(**{champ: valeur, f'pk__{sens}': pk})
+            )
+
+    objets = list(requete[:par_page + 1])
+    suivant = None
+    if len(objets) > par_page:
+        objets = objets[:par_page]
+        dernier = objets[-1]
+        suivant = encoder(None if champ == 'pk' else getattr(dernier, champ), dernier.pk)
+    return Page(objets, suivant, position is None)
+
+
+def paginer_sequence(objets, curseur=None, par_page=PAR_PAGE):
+    """Même découpage sur une séquence déjà en mémoire, triée par id croissant."""
+    position = decoder(curseur)
+    debut = 0 if position is None else bisect_right(objets, position[1], key=lambda objet: objet.pk)
+    tranche = list(objets[debut:debut + par_page])
+    suivant = encoder(None, tranche[-1].pk) if debut + par_page < len(objets) else None
+    return Page(tranche, suivant, position is None)
+
+
+def curseur_de(request, parametre=PARAMETRE):
+    return request.GET.get(parametre)
+
+
+def navigation(request, page, parametre=PARAMETRE):
+    """Liens « Suivant » et « Début » de la page, les autres paramètres GET conservés."""
+    def url(curseur):
+        parametres = request.GET.copy()
+        parametres.pop(parametre, None)
+        parametres.pop('format', None)
+        if curseur:
+            parametres[parametre] = curseur
+        return f'?{parametres.urlencode()}' if parametres else request.path
+
+    return {
+        'url_suivant': url(page.suivant) if page.suivant else None,
+        'url_debut': None if page.premiere else url(None),
+    }
+
+
+def demande_json(request):
+    return request.GET.get('format') == 'json'
+
+
+def reponse_json(page, champs):
+    """Variante JSON pour le défilement infini : `champs` sont des chemins d'attributs
+    (« client.user.username ») lus sur chaque objet de la page."""
+    def lire(objet, chemin):
+        for nom in chemin.split('.'):
+            objet = getattr(objet, nom, None)
+            if objet is None:
+                return None
+        return objet
+
+    return JsonResponse(
+        {
+            'lignes': [{chemin: lire(objet, chemin) for chemin in champs} for objet in page.objets],
+            'suivant': page.suivant,
+        },
+        encoder=DjangoJSONEncoder,
+    )
@@ -0,0 +1,181 @@
+"""
+Prévision des recettes par jour de la semaine et par saison.
+
+Modèle multiplicatif :
+    prévision(conducteur, jour) = niveau du conducteur pour ce jour de la semaine
+                                  × facteur saisonnier du mois (toute la flotte)
+Les niveaux sont désaisonnalisés, puis lissés vers la moyenne du conducteur
+quand l'historique d'un jour est court. Un conducteur sans historique reçoit
+le profil du conducteur moyen de la flotte.
+
+Les statistiques (sommes et effectifs par conducteur × jour de la semaine)
+sont agrégées en SQL (SQLite) sur les cumuls journaliers, par mois. Chaque mois est
+mis en cache sous la version de ce mois (voir `bilan.py`) : une nouvelle
+recette ne fait réagréger que son mois. Ces statistiques sont toujours lues
+dans la base principale, même sous `lecture_instantane` : la version d'un
+mois ne change pas au rafraîchissement de l'instantané, un mois agrégé sur
+une copie en retard resterait en cache. L'ajustement travaille ensuite sur
+ces quelques sommes, dans des tableaux `array('d')`.
+"""
+import hashlib
+from array import array
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import CharField, Count, Func, IntegerField, Sum
+from django.utils import timezone
+
+from .bilan import DUREE_CACHE, cles_par_mois
+from .models import Conducteur, CumulRecette
+
+
+HISTORIQUE_MOIS = 24
+LISSAGE_JOUR = 2       # observations « moyennes » ajoutées à chaque jour de la semaine
+LISSAGE_SAISON = 20    # idem pour chaque mois de l'année
+
+
+# strftime natif de SQLite : les équivalents ORM (TruncMonth, ExtractIsoWeekDay)
+# passent par des fonctions Python appelées ligne à ligne, deux fois plus lentes ici.
+class _Mois(Func):
+    # % doublé deux fois : une pour le gabarit, une pour le passage des paramètres SQL
+    template = "strftime('%%%%Y-%%%%m-01', %(expressions)s)"
+    output_field = CharField()
+
+
+class _JourSemaine(Func):
+    # 0 = dimanche ... 6 = samedi
+    template = "CAST(strftime('%%%%w', %(expressions)s) AS INTEGER)"
+    output_field = IntegerField()
+
+
+def _mois_historique(aujourd_hui):
+    mois = [aujourd_hui.replace(day=1)]
+    while len(mois) < HISTORIQUE_MOIS:
+        mois.append((mois[-1] - timedelta(days=1)).replace(day=1))
+    return mois[::-1]
+
+
+def _statistiques(mois):
+    """{mois: {(conducteur_id, jour_semaine): (somme, nb)}} pour les mois demandés, en une requête."""
+    fin = (max(mois) + timedelta(days=32)).replace(day=1)
+    lignes = (
+        CumulRecette.objects.using(DEFAULT_DB_ALIAS)
+        .filter(periode='jour', debut__gte=min(mois), debut__lt=fin, nb_recettes__gt=0)
+        .annotate(mois=_Mois('debut'), jour_semaine=_JourSemaine('debut'))
+        .values('mois', 'conducteur_id', 'jour_semaine')
+        .annotate(somme=Sum('montant'), nb=Count('id'))
+        .order_by()
+        .values_list('mois', 'conducteur_id', 'jour_semaine', 'somme', 'nb')
+    )
+    stats = {m: {} for m in mois}
+    for m, conducteur_id, jour_semaine, somme, nb in lignes:
+        m = date.fromisoformat(m)
+        if m in stats:
+            # Ramené à la convention de date.weekday() : 0 = lundi
+            stats[m][(conducteur_id, (jour_semaine + 6) % 7)] = (float(somme), nb)
+    return stats
+
+
+def _statistiques_en_cache(mois):
+    cles = cles_par_mois('prevision:stats', mois)
+    trouvees = cache.get_many(cles.values())
+    stats = {m: trouvees[cle] for m, cle in cles.items() if cle in trouvees}
+    manquants = [m for m in mois if m not in stats]
+    if manquants:
+        calculees = _statistiques(manquants)
+        cache.set_many({cles[m]: calculees[m] for m in manquants}, DUREE_CACHE * 24)
+        stats.update(calculees)
+    return stats
+
+
+def ajuster(stats):
+    """Ajuste le modèle sur les statistiques mensuelles.
+
+    Retourne {'saison': 12 facteurs, 'conducteurs': {id: 7 niveaux}, 'type': 7 niveaux}.
+    """
+    # 1. Facteurs saisonniers (flotte entière), lissés vers 1
+    sommes_mois, nb_mois = array('d', [0.0]) * 12, array('d', [0.0]) * 12
+    for m, lignes in stats.items():
+        for somme, nb in lignes.values():
+            sommes_mois[m.month - 1] += somme
+            nb_mois[m.month - 1] += nb
+    total, effectif = sum(sommes_mois), sum(nb_mois)
+    if not effectif:
+        return None
+    moyenne = total / effectif
+    saison = [
+        (sommes_mois[i] + LISSAGE_SAISON * moyenne) / (nb_mois[i] + LISSAGE_SAISON) / moyenne
+        for i in range(12)
+    ]
+
+    # 2. Sommes désaisonnalisées par conducteur et jour de la semaine
+    sommes, effectifs = {}, {}
+    sommes_type, nb_type = array('d', [0.0]) * 7, array('d', [0.0]) * 7
+    for m, lignes in stats.items():
+        facteur = saison[m.month - 1]
+        for (conducteur_id, jour), (somme, nb) in lignes.items():
+            if conducteur_id not in sommes:
+                sommes[conducteur_id], effectifs[conducteur_id] = array('d', [0.0]) * 7, array('d', [0.0]) * 7
+            sommes[conducteur_id][jour] += somme / facteur
+            effectifs[conducteur_id][jour] += nb
+            sommes_type[jour] += somme / facteur
+            nb_type[jour] += nb
+
+    def niveaux(s, n, defaut):
+        base = sum(s) / sum(n)
+        return [
+            (s[j] + LISSAGE_JOUR * (defaut[j] if defaut else base)) / (n[j] + LISSAGE_JOUR)
+            for j in range(7)
+        ]
+
+    type_ = niveaux(sommes_type, nb_type, None)
+    return {
+        'saison': saison,
+        # Jour jamais travaillé : on tire vers le profil moyen de la flotte
+        'conducteurs': {
+            cid: niveaux(sommes[cid], effectifs[cid], None if all(effectifs[cid]) else type_)
+            for cid in sommes
+        },
+        'type': type_,
+    }
+
+
+def modele_en_cache(aujourd_hui=None):
+    """Modèle ajusté sur l'historique, recalculé seulement quand un mois couvert change."""
+    aujourd_hui = aujourd_hui or timezone.localdate()
+    mois = _mois_historique(aujourd_hui)
+    cles = cles_par_mois('prevision:stats', mois)
+    cle = 'prevision:modele:' + hashlib.md5('|'.join(cles.values()).encode()).hexdigest()
+    modele = cache.get(cle)
+    if modele is None:
+        stats = _statistiques_en_cache(mois)
+        modele = ajuster(stats) or {}
+        cache.set(cle, modele, DUREE_CACHE)
+    return modele
+
+
+def prevoir(modele, conducteur_id, jour):
+    """Recette attendue d'un conducteur pour un jour donné."""
+    niveaux = modele['conducteurs'].get(conducteur_id, modele['type'])
+    return niveaux[jour.weekday()] * modele['saison'][jour.month - 1]
+
+
+def prevision_semaine_prochaine(aujourd_hui=None):
+    """Recettes attendues, jour par jour, des conducteurs ayant une moto, pour la semaine prochaine."""
+    aujourd_hui = aujourd_hui or timezone.localdate()
+    debut = aujourd_hui + timedelta(days=7 - aujourd_hui.weekday())
+    jours = [debut + timedelta(days=i) for i in range(7)]
+    modele = modele_en_cache(aujourd_hui)
+    conducteurs = list(Conducteur.objects.filter(moto__isnull=False).values_list('id', flat=True))
+    if not modele or not conducteurs:
+        return None
+
+    par_jour = [(jour, round(sum(prevoir(modele, cid, jour) for cid in conducteurs))) for jour in jours]
+    return {
+        'debut': jours[0],
+        'fin': jours[-1],
+        'jours': par_jour,
+        'total': sum(montant for _, montant in par_jour),
+        'nb_conducteurs': len(conducteurs),
+    }
@@ -0,0 +1,134 @@
+"""
+Recherche plein texte sur les questions et les réservations rapides.
+
+Les tables FTS5 (migration 0016, tenues à jour par triggers) servent un
+index inversé : une recherche lit la liste des lignes contenant chaque mot
+puis les classe par bm25 (`rank`), au lieu du LIKE '%mot%' sur toutes les
+lignes. Accents et casse sont ignorés (tokenizer unicode61), le dernier
+mot saisi est cherché en préfixe (« mot » trouve « motos »).
+
+Seules les FENETRE correspondances les plus récentes sont classées ; leurs
+résultats se lisent page par page. Au-delà, la liste signale la troncature
+et la recherche peut être limitée aux lignes créées avant une date, ce qui
+fait glisser la fenêtre vers les plus anciennes.
+"""
+import re
+from datetime import datetime, time
+
+from django.db import connection
+from django.utils import timezone
+
+from . import pagination
+from .models import Question, ReservationRapide
+
+
+LIMITE = 50
+MOTS_MAX = 10
+FENETRE = 1000      # correspondances les plus récentes classées par pertinence
+
+MOTS_VIDES = frozenset(
+    "a à au aux avec ce ces c d dans de des du elle en est et il je j l la le les leur lui ma mais me mes "
+    "mon n ne nous on ou par pas pour qu que qui s sa se ses son sur t ta te tes toi ton tu un une vos "
+    "votre vous y bonjour merci".split()
+)
+
+TABLES = {
+    Question: 'gestion_question_fts',
+    ReservationRapide: 'gestion_reservationrapide_fts',
+}
+
+
+def expression(texte):
+    """Texte saisi -> requête FTS5 (tous les mots requis, le dernier en préfixe), ou None.
+
+    Les guillemets neutralisent la syntaxe FTS5 (AND, NEAR, *, :) qu'un
+    visiteur pourrait taper. Seul le dernier mot, peut-être en cours de
+    saisie, est cherché en préfixe. Les mots vides sont retirés s'il reste
+    autre chose : présents dans presque toutes les lignes, ils ne trient rien
+    et coûtent le parcours de tout l'index.
+    """
+    mots = re.findall(r'\w+', (texte or '').lower())[:MOTS_MAX]
+    mots = [mot for mot in mots if mot not in MOTS_VIDES] or mots
+    if not mots:
+        return None
+    return ' '.join(f'"{mot}"' for mot in mots) + '*'
+
+
+def _correspondances_sql(modele, requete, avant, egalites):
+    """FROM ... WHERE des correspondances de `requete` et ses paramètres."""
+    fts = TABLES[modele]
+    conditions = ''.join(f' AND t.{modele._meta.get_field(champ).column} = %s' for champ in egalites)
+    parametres = [requete, *egalites.values()]
+    if avant is not None:
+        conditions += ' AND t.date_creation < %s'
+        debut = timezone.make_aware(datetime.combine(avant, time.min))
+        parametres.append(connection.ops.adapt_datetimefield_value(debut))
+    sql = f'FROM {fts} JOIN {modele._meta.db_table} t ON t.id = {fts}.rowid WHERE {fts} MATCH %s{conditions}'
+    return sql, parametres
+
+
+def identifiants(modele, texte, limite=LIMITE, decalage=0, avant=None, **egalites):
+    """Ids des lignes de `modele` qui correspondent à `texte`, les plus pertinentes d'abord.
+
+    Le classement bm25 porte sur les FENETRE correspondances les plus récentes
+    (FTS5 les parcourt par rowid décroissant et s'arrête tôt) : un mot présent
+    partout ne force pas à noter toute la table. `decalage` saute les premiers
+    résultats classés (pages suivantes), `avant` (date) écarte les lignes créées
+    ce jour-là ou après, `egalites` filtre sur des colonnes de la table
+    d'origine (ex. statut='repondu').
+    """
+    requete = expression(texte)
+    if requete is None:
+        return []
+    fts = TABLES[modele]
+    correspondances_sql, parametres = _correspondances_sql(modele, requete, avant, egalites)
+    sql = (
+        f'SELECT id FROM ('
+        f'    SELECT t.id, {fts}.rank AS pertinence {correspondances_sql} ORDER BY {fts}.rowid DESC LIMIT %s'
+        f') ORDER BY pertinence, id LIMIT %s OFFSET %s'
+    )
+    with connection.cursor() as curseur:
+        curseur.execute(sql, [*parametres, FENETRE, limite, decalage])
+        return [ligne[0] for ligne in curseur.fetchall()]
+
+
+def fenetre_depassee(modele, texte, avant=None, **egalites):
+    """Vrai s'il existe plus de FENETRE correspondances : les plus anciennes ne sont pas classées."""
+    requete = expression(texte)
+    if requete is None:
+        return False
+    correspondances_sql, parametres = _correspondances_sql(modele, requete, avant, egalites)
+    with connection.cursor() as curseur:
+        curseur.execute(
+            f'SELECT 1 {correspondances_sql} ORDER BY {TABLES[modele]}.rowid DESC LIMIT 1 OFFSET %s',
+            [*parametres, FENETRE],
+        )
+        return curseur.fetchone() is not None
+
+
+def rechercher(requete, texte, limite=LIMITE, **egalites):
+    """Objets du QuerySet `requete` qui correspondent à `texte`, classés par pertinence."""
+    ids = identifiants(requete.model, texte, limite, **egalites)
+    return _objets(requete, ids)
+
+
+def _objets(requete, ids):
+    objets = requete.in_bulk(ids)
+    return [objets[pk] for pk in ids if pk in objets]
+
+
+def paginer(requete, texte, curseur=None, avant=None, par_page=LIMITE):
+    """Une page (pagination.Page) des résultats classés par pertinence.
+
+    Le curseur porte le rang du premier résultat de la page suivante : le
+    classement est recalculé à chaque page, il reste stable tant que les
+    correspondances ne changent pas.
+    """
+    position = pagination.decoder(curseur)
+    decalage = int(position[0]) if position is not None and position[0].isdigit() else 0
+    ids = identifiants(requete.model, texte, par_page + 1, decalage, avant)
+    suivant = None
+    if len(ids) > par_page:
+        ids = ids[:par_page]
+        suivant = pagination.encoder(decalage + par_page, ids[-1])
+    return pagination.Page(_objets(requete, ids), suivant, decalage == 0)
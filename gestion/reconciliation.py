@@ -0,0 +1,118 @@
+"""
+Rapprochement quotidien : jours où un conducteur avait une moto attribuée,
+sans recette ni absence enregistrée.
+
+Le calendrier attendu est produit en SQL (série de dates par CTE récursive
+× intervalles d'attribution), puis les recettes et absences existantes sont
+retirées par anti-jointure (NOT EXISTS sur les index (conducteur, date)),
+recettes archivées comprises.
+Le résultat est écrit d'un bloc dans `RecetteManquante` : le tableau de bord
+ne lit que les lignes manquantes. Les signaux tiennent ensuite les jours déjà
+rapprochés à jour : une saisie retire le jour, une suppression le revérifie.
+
+Le SQL (`date(jour, '+1 day')`) est propre à SQLite, seul moteur du projet.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import Absence, AttributionMoto, Recette, RecetteArchivee, RecetteManquante, Traitement
+
+
+NOM_TRAITEMENT = 'recettes_manquantes'
+
+# L'INSERT vient en tête (WITH dans le SELECT) pour que rowcount soit renseigné
+_SQL = """
+INSERT OR IGNORE INTO {manquante} (conducteur_id, moto_id, date, date_detection)
+WITH RECURSIVE jours(jour) AS (
+    SELECT date(%s)
+    UNION ALL
+    SELECT date(jour, '+1 day') FROM jours WHERE jour < date(%s)
+)
+SELECT a.conducteur_id, a.moto_id, j.jour, %s
+FROM jours j
+INNER JOIN {attribution} a
+    ON a.conducteur_id IS NOT NULL
+    AND a.statut = 'attribuee'
+    AND a.debut <= j.jour
+    AND (a.fin IS NULL OR j.jour < a.fin)
+WHERE NOT EXISTS (
+    SELECT 1 FROM {recette} r WHERE r.conducteur_id = a.conducteur_id AND r.date = j.jour
+)
+AND NOT EXISTS (
+    SELECT 1 FROM {archive} ra WHERE ra.conducteur_id = a.conducteur_id AND ra.date = j.jour
+)
+AND NOT EXISTS (
+    SELECT 1 FROM {absence} ab WHERE ab.conducteur_id = a.conducteur_id AND ab.date = j.jour
+)
+"""
+
+
+def _sql():
+    return _SQL.format(
+        manquante=RecetteManquante._meta.db_table,
+        attribution=AttributionMoto._meta.db_table,
+        recette=Recette._meta.db_table,
+        archive=RecetteArchivee._meta.db_table,
+        absence=Absence._meta.db_table,
+    )
+
+
+def rapprocher(debut=None, fin=None):
+    """Recalcule les recettes manquantes de [debut, fin] (par défaut : depuis le
+    dernier passage jusqu'à hier). Retourne (debut, fin, nombre de lignes manquantes)."""
+    traitement, _ = Traitement.objects.get_or_create(nom=NOM_TRAITEMENT)
+    fin = fin or timezone.localdate() - timedelta(days=1)
+    if debut is None:
+        if traitement.dernier_jour:
+            debut = traitement.dernier_jour + timedelta(days=1)
+        else:
+            debut = AttributionMoto.objects.aggregate(premier=Min('debut'))['premier'] or fin
+    if debut > fin:
+        return debut, fin, 0
+
+    ops = connection.ops
+    with transaction.atomic():
+        RecetteManquante.objects.filter(date__range=(debut, fin)).delete()
+        with connection.cursor() as curseur:
+            curseur.execute(_sql(), [
+                ops.adapt_datefield_value(debut),
+                ops.adapt_datefield_value(fin),
+                ops.adapt_datetimefield_value(timezone.now()),
+            ])
+            nb = curseur.rowcount
+        if traitement.dernier_jour is None or fin > traitement.dernier_jour:
+            traitement.dernier_jour = fin
+        traitement.derniere_execution = timezone.now()
+        traitement.save()
+    return debut, fin, nb
+
+
+def retirer(conducteur_id, jour):
+    """Une recette ou une absence vient d'être saisie : le jour n'est plus manquant."""
+    RecetteManquante.objects.filter(conducteur_id=conducteur_id, date=jour).delete()
+
+
+def reverifier(conducteur_id, jour):
+    """Une recette ou une absence vient d'être supprimée (ou déplacée) : le jour, s'il est déjà
+    rapproché, redevient manquant quand plus rien ne le couvre."""
+    dernier_jour = Traitement.objects.filter(nom=NOM_TRAITEMENT).values_list('dernier_jour', flat=True).first()
+    if dernier_jour is None or jour > dernier_jour:
+        return
+    ops = connection.ops
+    with connection.cursor() as curseur:
+        curseur.execute(_sql() + 'AND a.conducteur_id = %s', [
+            ops.adapt_datefield_value(jour),
+            ops.adapt_datefield_value(jour),
+            ops.adapt_datetimefield_value(timezone.now()),
+            conducteur_id,
+        ])
+
+
+def rapprocher_apres_import(debut, fin):
+    """Après un import en masse (sans signaux), recalcule la partie déjà rapprochée de [debut, fin]."""
+    dernier_jour = Traitement.objects.filter(nom=NOM_TRAITEMENT).values_list('dernier_jour', flat=True).first()
+    if dernier_jour and debut <= dernier_jour:
+        rapprocher(debut, min(fin, dernier_jour))
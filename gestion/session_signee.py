@@ -0,0 +1,53 @@
+"""
+Sessions stockées dans un cookie signé, avec révocation côté serveur.
+
+Aucune écriture SQL par connexion ni par requête : les données (utilisateur,
+empreinte du mot de passe, jeton) voyagent dans le cookie, signé avec
+SECRET_KEY. Chaque session porte un jeton aléatoire ; à la déconnexion, le
+jeton est inscrit dans le cache partagé 'sessions' (jamais évincé) jusqu'à l'expiration du cookie, ce
+qui rend inutilisable toute copie de l'ancien cookie.
+
+À utiliser via SESSION_ENGINE = 'gestion.session_signee'.
+"""
+from django.contrib.sessions.backends.signed_cookies import SessionStore as SignedCookieSessionStore
+from django.core.cache import caches
+from django.utils.crypto import get_random_string
+
+
+CLE_JETON = '_jeton_session'
+_PREFIXE_REVOCATION = 'session:revoquee:'
+
+
+def revoquer(jeton, duree):
+    caches['sessions'].set(_PREFIXE_REVOCATION + jeton, True, duree)
+
+
+class SessionStore(SignedCookieSessionStore):
+
+    def load(self):
+        donnees = super().load()
+        jeton = donnees.get(CLE_JETON)
+        if jeton and caches['sessions'].get(_PREFIXE_REVOCATION + jeton):
+            # Cookie d'une session fermée : on repart d'une session vide
+            self.create()
+            return {}
+        return donnees
+
+    def save(self, must_create=False):
+        if self._session and CLE_JETON not in self._session:
+            self._session[CLE_JETON] = get_random_string(32)
+        super().save(must_create)
+
+    def cycle_key(self):
+        # Connexion : nouveau jeton, l'ancien cookie anonyme ne partage rien avec le nouveau
+        ancien = self._session.get(CLE_JETON)
+        if ancien:
+            revoquer(ancien, self.get_session_cookie_age())
+        self._session[CLE_JETON] = get_random_string(32)
+        super().cycle_key()
+
+    def flush(self):
+        jeton = self._session.get(CLE_JETON)
+        if jeton:
+            revoquer(jeton, self.get_session_cookie_age())
+        super().flush()
@@ -0,0 +1,229 @@
+import contextvars
+
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from . import anomalies, attributions, bilan, cumuls, demandes, flotte, reconciliation
+from .models import Abonnement, Absence, Conducteur, Moto, Recette, Panne, Reservation, User
+
+
+# -----------------------
+# Suppressions en cascade
+# -----------------------
+# Un conducteur (une moto) supprimé emporte ses recettes (ses pannes) et ses
+# lignes de cumul : inutile de retirer chaque ligne des cumuls. Les dates des
+# lignes emportées sont notées, puis invalidées une seule fois par suppression.
+_cascade = contextvars.ContextVar('cascade_cumuls', default=None)
+
+
+@receiver(pre_delete, sender=Conducteur)
+@receiver(pre_delete, sender=Moto)
+def parent_noter_cascade(sender, instance, origin=None, **kwargs):
+    cascade = _cascade.get()
+    # Nouvelle opération (une suppression interrompue ne laisse rien d'utilisable)
+    if cascade is None or cascade['origine'] is not origin:
+        cascade = {'origine': origin, 'parents': set(), 'dates': set()}
+        _cascade.set(cascade)
+    cascade['parents'].add((sender, instance.pk))
+
+
+@receiver(post_delete, sender=Conducteur)
+@receiver(post_delete, sender=Moto)
+def parent_invalider_cascade(sender, instance, origin=None, **kwargs):
+    cascade = _cascade.get()
+    if cascade is None or cascade['origine'] is not origin:
+        return
+    cascade['parents'].discard((sender, instance.pk))
+    if cascade['dates']:
+        bilan.invalider_periode(*cascade['dates'])
+        cascade['dates'].clear()
+    if not cascade['parents']:
+        _cascade.set(None)
+
+
+def _en_cascade(origin, parent, jour=None):
+    """Vrai si la ligne part avec `parent` ((modèle, pk)), supprimé par la même opération ;
+    `jour` est alors noté pour l'invalidation groupée."""
+    cascade = _cascade.get()
+    if origin is None or cascade is None or cascade['origine'] is not origin or parent not in cascade['parents']:
+        return False
+    if jour:
+        cascade['dates'].add(jour)
+    return True
+
+
+# -----------------------
+# Cumuls des recettes
+# -----------------------
+@receiver(pre_save, sender=Recette)
+def recette_memoriser_ancien_etat(sender, instance, raw=False, **kwargs):
+    instance._etat_cumul = None
+    if raw or instance.pk is None:
+        return
+    ancienne = sender.objects.filter(pk=instance.pk).first()
+    if ancienne is not None:
+        instance._etat_cumul = cumuls.etat_recette(ancienne)
+
+
+@receiver(post_save, sender=Recette)
+def recette_maj_cumuls(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    ancien = getattr(instance, '_etat_cumul', None)
+    nouveau = cumuls.etat_recette(instance)
+    if ancien == nouveau:
+        return
+    if ancien is not None:
+        cumuls.retirer_recette(ancien)
+        bilan.invalider_periode(ancien['date'])
+    cumuls.ajouter_recette(nouveau)
+    bilan.invalider_periode(nouveau['date'])
+    reconciliation.retirer(nouveau['conducteur_id'], nouveau['date'])
+    if ancien is not None and (ancien['conducteur_id'], ancien['date']) != (nouveau['conducteur_id'], nouveau['date']):
+        reconciliation.reverifier(ancien['conducteur_id'], ancien['date'])
+
+
+@receiver(post_delete, sender=Recette)
+def recette_retirer_cumuls(sender, instance, origin=None, **kwargs):
+    if _en_cascade(origin, (Conducteur, instance.conducteur_id), instance.date):
+        return
+    cumuls.retirer_recette(cumuls.etat_recette(instance))
+    bilan.invalider_periode(instance.date)
+    reconciliation.reverifier(instance.conducteur_id, cumuls.en_date(instance.date))
+
+
+# -----------------------
+# Anomalies : recette écrite à une date déjà analysée
+# -----------------------
+@receiver(post_save, sender=Recette)
+@receiver(post_delete, sender=Recette)
+def recette_reverifier_anomalies(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or _en_cascade(origin, (Conducteur, instance.conducteur_id)):
+        return
+    ancien = getattr(instance, '_etat_cumul', None)
+    jours = [cumuls.en_date(instance.date)] + ([ancien['date']] if ancien else [])
+    anomalies.a_reverifier(min(jours))
+
+
+# -----------------------
+# Cumuls des pannes
+# -----------------------
+@receiver(pre_save, sender=Panne)
+def panne_memoriser_ancien_etat(sender, instance, raw=False, **kwargs):
+    instance._etat_cumul = None
+    if raw or instance.pk is None:
+        return
+    ancienne = sender.objects.filter(pk=instance.pk).first()
+    if ancienne is not None:
+        instance._etat_cumul = cumuls.etat_panne(ancienne)
+
+
+@receiver(post_save, sender=Panne)
+def panne_maj_cumuls(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    ancien = getattr(instance, '_etat_cumul', None)
+    nouveau = cumuls.etat_panne(instance)
+    if ancien == nouveau:
+        return
+    if ancien is not None:
+        cumuls.retirer_panne(ancien)
+        bilan.invalider_periode(ancien['date'])
+    cumuls.ajouter_panne(nouveau)
+    bilan.invalider_periode(nouveau['date'])
+
+
+@receiver(post_delete, sender=Panne)
+def panne_retirer_cumuls(sender, instance, origin=None, **kwargs):
+    if _en_cascade(origin, (Moto, instance.moto_id), instance.date):
+        return
+    cumuls.retirer_panne(cumuls.etat_panne(instance))
+    bilan.invalider_periode(instance.date)
+
+
+# -----------------------
+# Statistiques de flotte du bilan
+# -----------------------
+@receiver(post_save, sender=Moto)
+@receiver(post_delete, sender=Moto)
+@receiver(post_save, sender=Conducteur)
+@receiver(post_delete, sender=Conducteur)
+def flotte_invalider_bilan(sender, raw=False, **kwargs):
+    if not raw:
+        bilan.invalider_flotte()
+        flotte.invalider()
+
+
+@receiver(post_save, sender=Recette)
+@receiver(post_delete, sender=Recette)
+def recette_invalider_flotte(sender, instance, raw=False, origin=None, **kwargs):
+    # En cascade, la suppression du conducteur invalide la flotte une fois
+    if not raw and not _en_cascade(origin, (Conducteur, instance.conducteur_id)):
+        flotte.invalider()
+
+
+@receiver(post_save, sender=User)
+def utilisateur_invalider_flotte(sender, raw=False, update_fields=None, **kwargs):
+    # La connexion ne met à jour que last_login : inutile de reconstruire
+    if not raw and update_fields != frozenset({'last_login'}):
+        flotte.invalider()
+
+
+# -----------------------
+# Historique des attributions de motos
+# -----------------------
+@receiver(pre_save, sender=Conducteur)
+def conducteur_memoriser_moto(sender, instance, raw=False, **kwargs):
+    instance._moto_precedente = None
+    if not raw and instance.pk is not None:
+        instance._moto_precedente = sender.objects.filter(pk=instance.pk).values_list('moto_id', flat=True).first()
+
+
+@receiver(post_save, sender=Conducteur)
+def conducteur_historiser_moto(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    precedente = getattr(instance, '_moto_precedente', None)
+    if precedente == instance.moto_id:
+        return
+    if precedente is not None:
+        statut = Moto.objects.filter(pk=precedente).values_list('statut', flat=True).first()
+        if statut is not None:
+            attributions.enregistrer(precedente, None, statut)
+    if instance.moto_id is not None:
+        attributions.enregistrer(instance.moto_id, instance.pk, instance.moto.statut)
+
+
+@receiver(post_save, sender=Moto)
+def moto_historiser_statut(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    conducteur_id = None if created else Conducteur.objects.filter(moto=instance).values_list('pk', flat=True).first()
+    attributions.enregistrer(instance.pk, conducteur_id, instance.statut)
+
+
+# -----------------------
+# Recettes manquantes
+# -----------------------
+@receiver(post_save, sender=Absence)
+def absence_retirer_manquante(sender, instance, raw=False, **kwargs):
+    if not raw:
+        reconciliation.retirer(instance.conducteur_id, cumuls.en_date(instance.date))
+
+
+@receiver(post_delete, sender=Absence)
+def absence_reverifier_manquante(sender, instance, origin=None, **kwargs):
+    if not _en_cascade(origin, (Conducteur, instance.conducteur_id)):
+        reconciliation.reverifier(instance.conducteur_id, cumuls.en_date(instance.date))
+
+
+# -----------------------
+# Totaux des réservations et abonnements
+# -----------------------
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+@receiver(post_save, sender=Abonnement)
+@receiver(post_delete, sender=Abonnement)
+def demande_invalider_totaux(sender, raw=False, **kwargs):
+    if not raw:
+        demandes.invalider()
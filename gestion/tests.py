@@ -1,3 +1,1216 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import io
+import random
+import shutil
+import tempfile
+import time
+import zipfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache, caches
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import (
+    anomalies, archivage, bilan, classement, cumuls, factures, imports, instantane, pagination, prevision, recherche,
+    reconciliation,
+)
+from .models import (
+    Abonnement, Absence, AnomalieRecette, AttributionMoto, Client, Conducteur, CumulPanne, CumulRecette,
+    JourSemaine, Moto, Panne, Question, Recette, RecetteArchivee, RecetteManquante, Reservation,
+    ReservationRapide, Traitement, User,
+)
+
+
+NB_CONDUCTEURS = 300
+NB_JOURS = 100            # 300 conducteurs × 100 jours = 30 000 recettes
+NB_CLIENTS = 200
+NB_RESERVATIONS = 3000
+NB_ABONNEMENTS = 1000
+NB_QUESTIONS = 2000
+NB_RESERVATIONS_RAPIDES = 2000
+MOT_DE_PASSE = 'budget'
+
+# Caches en mémoire, mêmes alias et options que le projet : les tests ne vident
+# ni ne remplissent les dossiers de cache (BASE_DIR/cache, cache_sessions, cache_versions)
+CACHES_TESTS = {
+    alias: {**reglages, 'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'tests-{alias}'}
+    for alias, reglages in settings.CACHES.items()
+}
+
+
+# -----------------------
+# Jeu de données
+# -----------------------
+def _creer_utilisateurs(prefixe, nombre, role, mot_de_passe):
+    User.objects.bulk_create([
+        User(username=f'{prefixe}{i}', first_name=f'Prénom{i}', last_name=f'Nom{i}',
+             role=role, password=mot_de_passe)
+        for i in range(nombre)
+    ])
+    return list(User.objects.filter(role=role, username__startswith=prefixe).order_by('id'))
+
+
+def creer_jeu_de_donnees():
+    """Une flotte réaliste : des centaines de conducteurs, des dizaines de milliers de recettes."""
+    alea = random.Random(17)
+    aujourd_hui = date.today()
+    mot_de_passe = make_password(MOT_DE_PASSE)
+
+    admin = User.objects.create(username='admin', role='admin', is_staff=True, password=mot_de_passe)
+
+    motos = Moto.objects.bulk_create([
+        Moto(nom=f'Moto {i}', matricule=f'MT-{i:04d}', statut='attribuee') for i in range(NB_CONDUCTEURS)
+    ])
+    utilisateurs = _creer_utilisateurs('conducteur', NB_CONDUCTEURS, 'conducteur', mot_de_passe)
+    Conducteur.objects.bulk_create([
+        Conducteur(user=user, moto=moto, adresse=f'Quartier {i}', telephone=f'0700{i:06d}')
+        for i, (user, moto) in enumerate(zip(utilisateurs, motos))
+    ])
+    conducteurs = list(Conducteur.objects.order_by('id'))
+
+    Recette.objects.bulk_create([
+        Recette(conducteur=conducteur, date=aujourd_hui - timedelta(days=jour),
+                montant=Decimal(alea.randrange(5000, 25000)), depense=Decimal(alea.randrange(0, 5000)))
+        for conducteur in conducteurs
+        for jour in range(NB_JOURS)
+    ], batch_size=2000)
+    cumuls.reconstruire_cumuls_recettes()
+
+    Absence.objects.bulk_create([
+        Absence(conducteur=alea.choice(conducteurs), date=aujourd_hui - timedelta(days=alea.randrange(NB_JOURS)),
+                raison='Maladie')
+        for _ in range(500)
+    ])
+    Panne.objects.bulk_create([
+        Panne(moto=alea.choice(motos), date=aujourd_hui - timedelta(days=alea.randrange(NB_JOURS)),
+              description='Plaquettes de frein ' * 10, montant_depense=Decimal(alea.randrange(2000, 30000)),
+              admin=admin)
+        for _ in range(800)
+    ] + [
+        # Moto du budget de suppression : la cascade sur ses pannes doit rester en requêtes constantes
+        Panne(moto=motos[0], date=aujourd_hui - timedelta(days=jour), description='Vidange',
+              montant_depense=Decimal(5000), admin=admin)
+        for jour in range(20)
+    ])
+    cumuls.reconstruire_cumuls_pannes()
+    recettes = list(Recette.objects.filter(date=aujourd_hui)[:30])
+    AnomalieRecette.objects.bulk_create([
+        AnomalieRecette(recette=recette, conducteur_id=recette.conducteur_id, date=recette.date, champ='montant',
+                        valeur=recette.montant, mediane=Decimal('10000'), score=4.2)
+        for recette in recettes
+    ])
+
+    utilisateurs_clients = _creer_utilisateurs('client', NB_CLIENTS, 'client', mot_de_passe)
+    Client.objects.bulk_create([Client(user=user, whatsapp='0700000000') for user in utilisateurs_clients])
+    clients = list(Client.objects.order_by('id'))
+    Reservation.objects.bulk_create([
+        Reservation(client=alea.choice(clients), date_course=aujourd_hui, heure_course='08:00',
+                    lieu_depart='Cocody', lieu_arrivee='Plateau',
+                    statut=alea.choice(['en_attente', 'valide', 'rejete', 'lu']))
+        for _ in range(NB_RESERVATIONS)
+    ])
+    abonnements = Abonnement.objects.bulk_create([
+        Abonnement(client=alea.choice(clients), heure_passage='07:30', lieu_depart='Yopougon',
+                   lieu_arrivee='Adjamé', statut=alea.choice(['en_attente', 'valide']))
+        for _ in range(NB_ABONNEMENTS)
+    ])
+    jours = list(JourSemaine.objects.all())
+    Abonnement.jours.through.objects.bulk_create([
+        Abonnement.jours.through(abonnement_id=abonnement.id, joursemaine_id=jour.id)
+        for abonnement in abonnements
+        for jour in alea.sample(jours, 3)
+    ])
+
+    Question.objects.bulk_create([
+        Question(nom=f'Visiteur {i}', email=f'visiteur{i}@exemple.ci', sujet=f'Sujet {i}',
+                 message='Bonjour, ' * 100, reponse='Merci, ' * 100 if i % 2 else None,
+                 statut='repondu' if i % 2 else 'en_attente')
+        for i in range(NB_QUESTIONS)
+    ])
+    ReservationRapide.objects.bulk_create([
+        ReservationRapide(client=alea.choice(utilisateurs_clients) if i % 3 == 0 else None, nom=f'Passager {i}',
+                          lieu='Treichville', destination='Marcory', heure='09:00', sujet='Course',
+                          message='Je voudrais une moto. ' * 50, whatsapp='0700000000')
+        for i in range(NB_RESERVATIONS_RAPIDES)
+    ])
+
+    return {
+        'admin': admin,
+        'conducteur': conducteurs[0],
+        'client': clients[0],
+        'moto': motos[0],
+        'recette': Recette.objects.filter(conducteur=conducteurs[0]).first(),
+        'question': Question.objects.filter(statut='en_attente').first(),
+        'reservation': Reservation.objects.first(),
+        'abonnement': Abonnement.objects.first(),
+        'reservation_rapide': ReservationRapide.objects.first(),
+        'anomalie': AnomalieRecette.objects.first(),
+        'panne': Panne.objects.first(),
+    }
+
+
+# -----------------------
+# Budgets de requêtes par URL
+# -----------------------
+# nom d'URL -> (utilisateur, paramètres d'URL, nombre max de requêtes)
+# Les paramètres sont des noms d'objets du jeu de données (voir creer_jeu_de_donnees).
+BUDGETS = {
+    'home': (None, {}, 3),
+    'touriste': (None, {}, 3),
+    'login': (None, {}, 0),
+    'logout': (None, {}, 0),
+    'register': (None, {}, 1),
+    'email': (None, {}, 0),
+    'modifier': (None, {'pk': 'admin'}, 0),
+    'poser_question': (None, {}, 0),
+    'reservation_rapide': (None, {}, 0),
+    'register_client': (None, {}, 0),
+    'client_login': (None, {}, 0),
+    'sitemap': (None, {}, 0),
+    'redirect_by_role': ('admin', {}, 1),
+
+    'admin_dashboard': ('admin', {}, 8),
+    'anomalie_vue': ('admin', {'pk': 'anomalie'}, 4),
+    'ajouter_absence': ('admin', {'conducteur_id': 'conducteur'}, 2),
+    'attribuer_moto': ('admin', {}, 4),
+    'ajouter_moto': ('admin', {}, 3),
+    'supprimer_moto': ('admin', {'moto_id': 'moto'}, 13),
+    'modifier_conducteur': ('admin', {'conducteur_id': 'conducteur'}, 3),
+    'modifier_recette': ('admin', {'recette_id': 'recette'}, 3),
+    'conducteur_detail': ('admin', {'pk': 'conducteur'}, 6),
+    'conducteur_serie': ('admin', {'pk': 'conducteur'}, 4),
+    'ajouter_recette': ('admin', {}, 2),
+    'importer_recettes': ('admin', {}, 1),
+    'liste_conducteurs': ('admin', {}, 3),
+    'supprimer_conducteur': ('admin', {'pk': 'conducteur'}, 2),
+    'liste_questions': ('admin', {}, 2),
+    'repondre_question': ('admin', {'question_id': 'question'}, 2),
+    'modifier_statut_moto': ('admin', {'moto_id': 'moto'}, 2),
+    'bilan_general': ('admin', {}, 10),
+    'classement_conducteurs': ('admin', {}, 3),
+    'classement_conducteurs_json': ('admin', {}, 3),
+    'rentabilite_motos': ('admin', {}, 2),
+    'ajouter_panne': ('admin', {}, 2),
+    'liste_pannes': ('admin', {}, 2),
+    'panne_facture': ('admin', {'pk': 'panne'}, 2),
+    'panne_facture_miniature': ('admin', {'pk': 'panne'}, 2),
+    'panne_facture_apercu': ('admin', {'pk': 'panne'}, 2),
+    'exporter': ('admin', {'table': 'recettes'}, 3),  # recettes courantes et archivées
+    'reservation_valider': ('admin', {'pk': 'reservation'}, 3),
+    'reservation_rejeter': ('admin', {'pk': 'reservation'}, 3),
+    'reservation_lu': ('admin', {'pk': 'reservation'}, 3),
+    'abonnement_valider': ('admin', {'pk': 'abonnement'}, 3),
+    'abonnement_rejeter': ('admin', {'pk': 'abonnement'}, 3),
+    'abonnement_lu': ('admin', {'pk': 'abonnement'}, 3),
+    'reservation': ('admin', {}, 6),
+    'clients_list': ('admin', {}, 2),
+    'reservation_rapide_lu': ('admin', {'pk': 'reservation_rapide'}, 3),
+    'reservations_admin': ('admin', {}, 2),
+    'liste_reservations_rapides': ('admin', {}, 2),
+    'supprimer_reservation': ('admin', {'pk': 'reservation_rapide'}, 3),
+
+    'conducteur_dashboard': ('conducteur', {}, 4),
+
+    'client_dashboard': ('client', {}, 4),
+    'client_ajouter_reservation': ('client', {}, 1),
+    'client_ajouter_abonnement': ('client', {}, 2),
+}
+
+# Temps SQL cumulé maximal par page (secondes), large pour ne pas dépendre de la machine
+TEMPS_SQL_MAX = 0.5
+
+
+@override_settings(CACHES=CACHES_TESTS, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BudgetRequetesTests(TestCase):
+    """Chaque URL de gestion/urls.py reste sous un nombre maximal de requêtes SQL
+    sur un jeu de données réaliste : un N+1 fait exploser le compteur."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.objets = creer_jeu_de_donnees()
+        cls.objets['conducteur_user'] = cls.objets['conducteur'].user
+        cls.objets['client_user'] = cls.objets['client'].user
+
+    def _utilisateur(self, role):
+        return {
+            'admin': self.objets['admin'],
+            'conducteur': self.objets['conducteur_user'],
+            'client': self.objets['client_user'],
+        }[role]
+
+    def _url(self, nom, parametres):
+        kwargs = {
+            cle: (valeur if cle == 'table' else self.objets[valeur].pk)
+            for cle, valeur in parametres.items()
+        }
+        return reverse(nom, kwargs=kwargs)
+
+    def _mesurer(self, url):
+        debut = time.perf_counter()
+        with CaptureQueriesContext(connection) as requetes:
+            reponse = self.client.get(url)
+            if hasattr(reponse, 'streaming_content'):
+                b''.join(reponse.streaming_content)
+        duree = time.perf_counter() - debut
+        temps_sql = sum(float(requete['time']) for requete in requetes.captured_queries)
+        return reponse, requetes.captured_queries, temps_sql, duree
+
+    def test_toutes_les_urls_ont_un_budget(self):
+        from .urls import urlpatterns
+        noms = {motif.name for motif in urlpatterns if motif.name}
+        self.assertEqual(noms - set(BUDGETS), set(), "URL sans budget de requêtes")
+
+    def test_budgets(self):
+        for nom, (role, parametres, budget) in BUDGETS.items():
+            with self.subTest(url=nom), transaction.atomic():
+                for alias in CACHES_TESTS:
+                    caches[alias].clear()
+                self.client.logout()
+                if role:
+                    self.client.force_login(self._utilisateur(role))
+                reponse, requetes, temps_sql, _ = self._mesurer(self._url(nom, parametres))
+                # Les vues d'action (suppression, changement de statut) ne doivent pas déteindre
+                transaction.set_rollback(True)
+                self.assertLess(reponse.status_code, 500)
+                self.assertLessEqual(
+                    len(requetes), budget,
+                    f"{nom} : {len(requetes)} requêtes (budget {budget})\n"
+                    + '\n'.join(requete['sql'][:200] for requete in requetes),
+                )
+                self.assertLessEqual(temps_sql, TEMPS_SQL_MAX, f"{nom} : {temps_sql:.3f} s de SQL")
+
+
+# -----------------------
+# Plans d'exécution des requêtes fréquentes
+# -----------------------
+def requetes_frequentes():
+    """nom -> (QuerySet, trié et limité ?) : les filtres et tris les plus sollicités."""
+    from . import demandes
+
+    aujourd_hui = date.today()
+    return {
+        'faq_touriste': (Question.objects.filter(statut='repondu').order_by('-date_creation').values_list('id', flat=True), True),
+        'question_en_attente': (Question.objects.filter(email='visiteur@exemple.ci', statut='en_attente'), False),
+        'liste_questions': (Question.objects.order_by('-date_creation', '-pk')[:51], True),
+        'reservations_par_statut': (
+            demandes.filtrer(Reservation.objects.all(), 'date_reservation', 'en_attente', aujourd_hui, aujourd_hui)
+            .order_by('-date_reservation', '-pk')[:51],
+            True,
+        ),
+        'liste_reservations': (Reservation.objects.order_by('-date_reservation', '-pk')[:51], True),
+        'abonnements_par_statut': (
+            Abonnement.objects.filter(statut='en_attente').order_by('-date_demande', '-pk')[:51], True,
+        ),
+        'liste_abonnements': (Abonnement.objects.order_by('-date_demande', '-pk')[:51], True),
+        'recettes_du_jour': (Recette.objects.filter(date=aujourd_hui), False),
+        'reservations_rapides': (ReservationRapide.objects.order_by('-date_creation', '-pk')[:51], True),
+        'liste_pannes': (Panne.objects.order_by('-date', '-pk')[:51], True),
+        'utilisateur_par_email': (User.objects.filter(email='visiteur@exemple.ci'), False),
+    }
+
+
+@override_settings(CACHES=CACHES_TESTS)
+class PlansRequetesTests(TestCase):
+    """EXPLAIN QUERY PLAN de chaque requête fréquente : aucun parcours complet de
+    table, et pas de tri temporaire pour les listes paginées (l'index donne l'ordre)."""
+
+    def test_pas_de_parcours_complet(self):
+        for nom, (requete, triee) in requetes_frequentes().items():
+            with self.subTest(requete=nom):
+                plan = requete.explain()
+                for ligne in plan.splitlines():
+                    etape = ligne.split(maxsplit=3)[-1]     # « id parent notused detail »
+                    # « SCAN table » sans index : toute la table est lue
+                    self.assertFalse(
+                        etape.startswith('SCAN ') and ' USING ' not in etape,
+                        f"{nom} : parcours complet\n{plan}",
+                    )
+                if triee:
+                    self.assertNotIn('TEMP B-TREE FOR ORDER BY', plan, f"{nom} : tri sans index\n{plan}")
+
+
+# -----------------------
+# Cumuls tenus par les signaux
+# -----------------------
+@override_settings(CACHES=CACHES_TESTS)
+class CumulsTests(TestCase):
+    """Après chaque création, modification ou suppression de recette ou de panne, les
+    cumuls (jour, semaine, mois) tenus par les signaux égalent une reconstruction complète."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.motos = [Moto.objects.create(nom=f'Moto {i}', matricule=f'CU-{i}') for i in range(2)]
+        cls.conducteurs = [
+            Conducteur.objects.create(
+                user=User.objects.create(username=f'cumul{i}', role='conducteur'),
+                moto=moto, adresse='-', telephone='-',
+            )
+            for i, moto in enumerate(cls.motos)
+        ]
+
+    @staticmethod
+    def _lignes():
+        # Les cumuls tenus gardent des lignes à zéro après un retrait ; la reconstruction n'en crée pas
+        recettes = CumulRecette.objects.exclude(nb_recettes=0, montant=0, depense=0).values_list(
+            'conducteur_id', 'periode', 'debut', 'montant', 'depense', 'nb_recettes',
+        )
+        pannes = CumulPanne.objects.exclude(nb_pannes=0, montant_depense=0).values_list(
+            'moto_id', 'periode', 'debut', 'montant_depense', 'nb_pannes',
+        )
+        return sorted(recettes), sorted(pannes)
+
+    def assertCumulsExacts(self):
+        tenus = self._lignes()
+        cumuls.reconstruire_cumuls_recettes()
+        cumuls.reconstruire_cumuls_pannes()
+        self.assertEqual(tenus, self._lignes())
+
+    def _recette(self, conducteur, jour, montant, depense=Decimal('500')):
+        return Recette.objects.create(conducteur=conducteur, date=jour, montant=Decimal(montant), depense=depense)
+
+    def _panne(self, moto, jour, montant):
+        return Panne.objects.create(moto=moto, date=jour, description='Pneu', montant_depense=Decimal(montant))
+
+    def _jeu(self):
+        # Semaine du lundi 29/01/2024 : à cheval sur janvier et février
+        premier, second = self.conducteurs
+        recettes = [
+            self._recette(premier, date(2024, 1, 29), 10000),
+            self._recette(premier, date(2024, 1, 31), 12000),
+            self._recette(premier, date(2024, 2, 1), 9000),
+            self._recette(second, date(2024, 2, 1), 15000),
+        ]
+        pannes = [
+            self._panne(self.motos[0], date(2024, 1, 31), 3000),
+            self._panne(self.motos[0], date(2024, 2, 2), 4000),
+            self._panne(self.motos[1], date(2024, 2, 2), 2500),
+        ]
+        return recettes, pannes
+
+    def test_creation(self):
+        self._jeu()
+        self.assertCumulsExacts()
+        mois = CumulRecette.objects.get(conducteur=self.conducteurs[0], periode='mois', debut=date(2024, 1, 1))
+        self.assertEqual((mois.montant, mois.nb_recettes), (Decimal('22000'), 2))
+        semaine = CumulPanne.objects.get(moto=self.motos[0], periode='semaine', debut=date(2024, 1, 29))
+        self.assertEqual((semaine.montant_depense, semaine.nb_pannes), (Decimal('7000'), 2))
+
+    def test_modification_du_montant(self):
+        recettes, pannes = self._jeu()
+        recettes[0].montant = Decimal('11000')
+        recettes[0].depense = Decimal('0')
+        recettes[0].save()
+        pannes[0].montant_depense = Decimal('3500')
+        pannes[0].save()
+        self.assertCumulsExacts()
+
+    def test_modification_de_la_date(self):
+        recettes, pannes = self._jeu()
+        # Autre jour, autre semaine et autre mois
+        recettes[1].date = date(2024, 3, 15)
+        recettes[1].save()
+        pannes[1].date = date(2023, 12, 30)
+        pannes[1].save()
+        self.assertCumulsExacts()
+
+    def test_changement_de_conducteur_et_de_moto(self):
+        recettes, pannes = self._jeu()
+        recettes[2].conducteur = self.conducteurs[1]
+        recettes[2].date = date(2024, 2, 2)
+        recettes[2].save()
+        pannes[2].moto = self.motos[0]
+        pannes[2].save()
+        self.assertCumulsExacts()
+
+    def test_suppression(self):
+        recettes, pannes = self._jeu()
+        recettes[0].delete()
+        Recette.objects.filter(pk=recettes[3].pk).delete()
+        pannes[1].delete()
+        self.assertCumulsExacts()
+
+    def test_suppression_en_cascade(self):
+        self._jeu()
+        conducteur_id, moto_id = self.conducteurs[0].pk, self.motos[1].pk
+        self.conducteurs[0].delete()
+        self.motos[1].delete()
+        self.assertFalse(CumulRecette.objects.filter(conducteur_id=conducteur_id).exists())
+        self.assertFalse(CumulPanne.objects.filter(moto_id=moto_id).exists())
+        self.assertCumulsExacts()
+        # Les recettes supprimées ensuite, hors cascade, sortent bien des cumuls
+        Recette.objects.filter(conducteur=self.conducteurs[1]).delete()
+        self.assertCumulsExacts()
+
+
+# -----------------------
+# Compteurs de version des caches
+# -----------------------
+@override_settings(CACHES=CACHES_TESTS)
+class VersionsCacheTests(TestCase):
+    """Les compteurs de version survivent à l'éviction du cache par défaut : retombés
+    à 0, ils feraient resservir des entrées calculées sous une ancienne version."""
+
+    def test_les_versions_survivent_au_remplissage_du_cache(self):
+        from . import demandes, faq, flotte
+
+        bilan.invalider_periode(date(2024, 1, 15))
+        bilan.invalider_flotte()
+        faq.invalider()
+        demandes.invalider()
+        flotte.invalider()
+        janvier = (date(2024, 1, 1), date(2024, 1, 31))
+        avant = (bilan.cle_cache('bilan', *janvier), bilan.cles_par_mois('prevision', [janvier[0]]),
+                 faq.version(), demandes.version(), flotte.version())
+
+        # Bien au-delà de MAX_ENTRIES du cache par défaut : il évince ses plus anciennes entrées
+        limite = settings.CACHES['default'].get('OPTIONS', {}).get('MAX_ENTRIES', 300)
+        cache.set_many({f'remplissage:{i}': i for i in range(limite * 3)})
+
+        apres = (bilan.cle_cache('bilan', *janvier), bilan.cles_par_mois('prevision', [janvier[0]]),
+                 faq.version(), demandes.version(), flotte.version())
+        self.assertEqual(avant, apres)
+        self.assertNotIn(0, avant[2:])
+
+
+# -----------------------
+# Recherche plein texte
+# -----------------------
+@override_settings(CACHES=CACHES_TESTS, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RechercheTests(TestCase):
+    """Les résultats se lisent page par page ; au-delà de la fenêtre classée, la
+    troncature est signalée et la date « avant » atteint les plus anciens."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Question.objects.bulk_create(
+            Question(nom='Visiteur', email=f'v{i}@example.com', sujet=f'Location de moto {i}', message='Tarif ?')
+            for i in range(30)
+        )
+        # Une question par jour, la plus ancienne en premier (comme les ids)
+        debut = timezone.make_aware(datetime(2024, 1, 1, 12))
+        for rang, pk in enumerate(Question.objects.order_by('pk').values_list('pk', flat=True)):
+            Question.objects.filter(pk=pk).update(date_creation=debut + timedelta(days=rang))
+        cls.admin = User.objects.create(username='admin', role='admin', is_staff=True, password=make_password(MOT_DE_PASSE))
+
+    def _toutes_les_pages(self, avant=None):
+        ids, curseur = [], None
+        while True:
+            page = recherche.paginer(Question.objects.all(), 'moto', curseur, avant, par_page=8)
+            ids += [question.pk for question in page.objets]
+            if page.suivant is None:
+                return ids
+            curseur = page.suivant
+
+    def test_pages_de_la_fenetre(self):
+        with mock.patch.object(recherche, 'FENETRE', 20):
+            ids = self._toutes_les_pages()
+            self.assertTrue(recherche.fenetre_depassee(Question, 'moto'))
+        plus_recents = list(Question.objects.order_by('-pk').values_list('pk', flat=True)[:20])
+        self.assertEqual(len(ids), 20)
+        self.assertEqual(sorted(ids), sorted(plus_recents))
+
+    def test_date_avant_atteint_les_plus_anciens(self):
+        avant = date(2024, 1, 11)   # les 10 premières questions
+        with mock.patch.object(recherche, 'FENETRE', 20):
+            ids = self._toutes_les_pages(avant)
+            self.assertFalse(recherche.fenetre_depassee(Question, 'moto', avant))
+        self.assertEqual(sorted(ids), list(Question.objects.order_by('pk').values_list('pk', flat=True)[:10]))
+
+    def test_troncature_signalee(self):
+        self.client.force_login(self.admin)
+        with mock.patch.object(recherche, 'FENETRE', 20):
+            reponse = self.client.get(reverse('liste_questions'), {'q': 'moto'})
+            self.assertContains(reponse, 'Plus de 20 résultats')
+            self.assertContains(reponse, 'name="avant"')
+            reponse = self.client.get(reverse('liste_questions'), {'q': 'moto', 'avant': '2024-01-11'})
+            self.assertNotContains(reponse, 'Plus de 20 résultats')
+        self.assertEqual(len(reponse.context['questions']), 10)
+
+
+# -----------------------
+# Prévision
+# -----------------------
+@override_settings(CACHES=CACHES_TESTS)
+class PrevisionTests(TestCase):
+    """Les statistiques mises en cache sous la version de leur mois sont lues dans la base
+    principale : agrégées sur un instantané en retard, elles resteraient en cache après
+    son rafraîchissement. (Sans 'instantane' dans `databases`, toute lecture y échoue.)"""
+
+    def test_statistiques_lues_dans_la_base_principale(self):
+        user = User.objects.create(username='prevision', role='conducteur')
+        conducteur = Conducteur.objects.create(user=user, adresse='Quartier', telephone='0700000000')
+        Recette.objects.create(conducteur=conducteur, date=date(2024, 3, 4), montant=Decimal('12000'),
+                               depense=Decimal('0'))
+
+        @instantane.lecture_instantane
+        def vue(request):
+            return prevision.modele_en_cache(date(2024, 3, 10))
+
+        with mock.patch.object(instantane, 'utilisable', return_value=timezone.now()):
+            modele = vue(mock.Mock())
+        self.assertIn(conducteur.pk, modele['conducteurs'])
+
+
+# -----------------------
+# Unicité avec l'archive
+# -----------------------
+@override_settings(CACHES=CACHES_TESTS, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ArchiveUniciteTests(TestCase):
+    """Une recette (conducteur, date) déjà archivée ne se ressaisit pas dans la table courante :
+    ni par l'import, ni par le formulaire, ni par l'admin."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.aujourd_hui = date.today()
+        cls.admin = User.objects.create(username='admin', role='admin', is_staff=True,
+                                        password=make_password(MOT_DE_PASSE))
+        moto = Moto.objects.create(nom='Moto', matricule='MT-0001', statut='attribuee')
+        user = User.objects.create(username='archive', role='conducteur')
+        cls.conducteur = Conducteur.objects.create(user=user, moto=moto, adresse='Quartier', telephone='0700000000')
+        # Archivée avec un horizon plus court que l'actuel : plus récente que archivage.limite()
+        for jours in (0, 5):
+            RecetteArchivee.objects.create(
+                id=10 ** 9 + jours, conducteur=cls.conducteur, date=cls.aujourd_hui - timedelta(days=jours),
+                jour='lundi', montant=Decimal('9000'), depense=Decimal('0'),
+            )
+
+    def test_import(self):
+        avant_horizon = archivage.limite() - timedelta(days=1)
+        lignes = [
+            'conducteur;date;montant;depense',
+            f'archive;{self.aujourd_hui - timedelta(days=5)};10000;0',
+            f'archive;{avant_horizon};10000;0',
+            f'archive;{self.aujourd_hui - timedelta(days=3)};10000;0',
+        ]
+        rapport = imports.importer(io.BytesIO('\n'.join(lignes).encode()))
+        self.assertEqual(rapport['creees'], 1)
+        self.assertEqual([numero for numero, _ in rapport['erreurs']], [2, 3])
+        self.assertEqual(
+            list(Recette.objects.values_list('date', flat=True)), [self.aujourd_hui - timedelta(days=3)],
+        )
+
+    def test_formulaire(self):
+        self.client.force_login(self.admin)
+        self.client.post(reverse('ajouter_recette'), {
+            'conducteur': self.conducteur.pk, 'montant': '10000', 'depense': '0',
+        })
+        self.assertFalse(Recette.objects.exists())
+
+    def test_admin(self):
+        recette = Recette(conducteur=self.conducteur, date=self.aujourd_hui, jour='lundi',
+                          montant=Decimal('10000'), depense=Decimal('0'))
+        with self.assertRaises(ValidationError):
+            recette.clean()
+        recette.date = self.aujourd_hui - timedelta(days=1)
+        recette.clean()
+
+
+# -----------------------
+# Bilan et instantané
+# -----------------------
+@override_settings(CACHES=CACHES_TESTS)
+class BilanInstantaneTests(TestCase):
+    """Un bilan calculé sur l'instantané n'est resservi qu'aux lectures de cette même copie :
+    ni en direct quand la copie devient trop ancienne, ni après son rafraîchissement."""
+
+    def _bilan(self, copie, total):
+        @instantane.lecture_instantane
+        def vue(request):
+            return bilan.bilan_en_cache(None, None)
+
+        with mock.patch.object(instantane, 'utilisable', return_value=copie), \
+                mock.patch.object(bilan, 'calculer_bilan', return_value={'total_recettes': total}):
+            return vue(mock.Mock())['total_recettes']
+
+    def test_repli_en_direct(self):
+        copie = timezone.now()
+        self.assertEqual(self._bilan(copie, 100), 100)
+        self.assertEqual(self._bilan(copie, 200), 100)          # même copie : en cache
+        self.assertEqual(self._bilan(None, 300), 300)           # copie trop ancienne : lecture en direct
+        self.assertEqual(self._bilan(copie + timedelta(minutes=5), 400), 400)   # copie rafraîchie
+
+
+# -----------------------
+# Anomalies
+# -----------------------
+@override_settings(CACHES=CACHES_TESTS)
+class AnomaliesTests(TestCase):
+    """Une valeur aberrante est signalée, un passage ne note que les jours après le filigrane,
+    et une recette modifiée ou supprimée après coup fait reculer le filigrane."""
+
+    LUNDI = date(2024, 1, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='anomalie', role='conducteur')
+        cls.conducteur = Conducteur.objects.create(user=user, adresse='Quartier', telephone='0700000000')
+        # Dix lundis autour de 10 000, le neuvième à 50 000
+        for semaine, montant in enumerate([10000, 10200, 9900, 10100, 9800, 10050, 9950, 10150, 50000, 10000]):
+            Recette.objects.create(conducteur=cls.conducteur, date=cls.LUNDI + timedelta(weeks=semaine),
+                                   jour='lundi', montant=Decimal(montant), depense=Decimal('1000'))
+        cls.aberrante = Recette.objects.get(montant=Decimal('50000'))
+
+    def setUp(self):
+        caches['versions'].clear()
+
+    def _filigrane(self):
+        return Traitement.objects.get(nom=anomalies.NOM_TRAITEMENT).dernier_jour
+
+    def test_valeur_aberrante_signalee(self):
+        anomalies.detecter(complet=True)
+        self.assertEqual(
+            list(AnomalieRecette.objects.values_list('recette_id', 'champ')), [(self.aberrante.pk, 'montant')],
+        )
+        self.assertEqual(self._filigrane(), self.LUNDI + timedelta(weeks=9))
+
+    def test_passage_incremental(self):
+        anomalies.detecter(complet=True)
+        for semaine in (10, 11):
+            Recette.objects.create(conducteur=self.conducteur, date=self.LUNDI + timedelta(weeks=semaine),
+                                   jour='lundi', montant=Decimal('10000'), depense=Decimal('1000'))
+        self.assertEqual(anomalies.detecter(), (2, 0))
+        self.assertEqual(self._filigrane(), self.LUNDI + timedelta(weeks=11))
+        # Jour antérieur au filigrane : ni renoté, ni retiré
+        self.assertTrue(AnomalieRecette.objects.filter(recette=self.aberrante).exists())
+        self.assertEqual(anomalies.detecter(), (0, 0))
+
+    def test_saisie_apres_le_filigrane_sans_ecriture(self):
+        anomalies.detecter(complet=True)
+        with CaptureQueriesContext(connection) as requetes:
+            Recette.objects.create(conducteur=self.conducteur, date=self.LUNDI + timedelta(weeks=10),
+                                   jour='lundi', montant=Decimal('10000'), depense=Decimal('1000'))
+        self.assertFalse([r for r in requetes.captured_queries if 'gestion_traitement' in r['sql']])
+
+    def test_recette_corrigee(self):
+        anomalies.detecter(complet=True)
+        self.aberrante.montant = Decimal('10000')
+        self.aberrante.save()
+        self.assertEqual(self._filigrane(), self.aberrante.date - timedelta(days=1))
+        anomalies.detecter()
+        self.assertFalse(AnomalieRecette.objects.exists())
+
+    def test_recette_supprimee(self):
+        anomalies.detecter(complet=True)
+        anterieure = Recette.objects.get(date=self.LUNDI + timedelta(weeks=2))
+        anterieure.delete()
+        self.assertEqual(self._filigrane(), anterieure.date - timedelta(days=1))
+        self.aberrante.delete()
+        self.assertFalse(AnomalieRecette.objects.exists())
+        self.assertEqual(anomalies.detecter(), (6, 0))
+
+
+# -----------------------
+# Exports
+# -----------------------
+@override_settings(CACHES=CACHES_TESTS, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ExportsTests(TestCase):
+    """En-têtes, lignes, filtres selon l'historique des attributions et fusion des recettes
+    courantes et archivées, en CSV et en XLSX."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='admin', role='admin', is_staff=True,
+                                        password=make_password(MOT_DE_PASSE))
+        cls.m1 = Moto.objects.create(nom='Moto 1', matricule='MT-0001', statut='attribuee')
+        cls.m2 = Moto.objects.create(nom='Moto 2', matricule='MT-0002', statut='attribuee')
+        cls.alpha, cls.beta = (
+            Conducteur.objects.create(user=User.objects.create(username=nom, role='conducteur'),
+                                      adresse='Quartier', telephone='0700000000')
+            for nom in ('alpha', 'beta')
+        )
+        # Échange des motos le 1er février ; l'attribution actuelle ne dit rien de janvier
+        AttributionMoto.objects.all().delete()
+        fevrier = date(2024, 2, 1)
+        for moto, janvier_, ensuite in ((cls.m1, cls.alpha, cls.beta), (cls.m2, cls.beta, cls.alpha)):
+            AttributionMoto.objects.create(moto=moto, conducteur=janvier_, statut='attribuee',
+                                           debut=date(2024, 1, 1), fin=fevrier)
+            AttributionMoto.objects.create(moto=moto, conducteur=ensuite, statut='attribuee', debut=fevrier)
+        Conducteur.objects.filter(pk=cls.alpha.pk).update(moto=cls.m2)
+        Conducteur.objects.filter(pk=cls.beta.pk).update(moto=cls.m1)
+
+        for conducteur, jour in ((cls.beta, date(2024, 1, 15)), (cls.alpha, date(2024, 2, 10))):
+            Recette.objects.create(conducteur=conducteur, date=jour, jour='lundi',
+                                   montant=Decimal('10000'), depense=Decimal('2000'))
+        for i, (conducteur, jour) in enumerate(((cls.alpha, date(2024, 1, 10)), (cls.beta, date(2024, 1, 20)))):
+            RecetteArchivee.objects.create(id=10 ** 9 + i, conducteur=conducteur, date=jour, jour='lundi',
+                                           montant=Decimal('8000'), depense=Decimal('1000'))
+        for jour in (date(2024, 1, 5), date(2024, 2, 5)):
+            Panne.objects.create(moto=cls.m1, date=jour, description='Pneu', montant_depense=Decimal('3000'),
+                                 admin=cls.admin)
+            Absence.objects.create(conducteur=cls.alpha, date=jour + timedelta(days=1), raison='Maladie')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _csv(self, table, **filtres):
+        reponse = self.client.get(reverse('exporter', kwargs={'table': table}), filtres)
+        texte = b''.join(reponse.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(io.StringIO(texte), delimiter=';'))
+
+    def test_recettes_csv(self):
+        entetes, *lignes = self._csv('recettes')
+        self.assertEqual(entetes, ['Date', 'Jour', 'Conducteur', 'Moto', 'Montant', 'Dépense', 'Bénéfice'])
+        # Archive et table courante fusionnées par date ; moto du jour de chaque recette
+        self.assertEqual([ligne[:4] for ligne in lignes], [
+            ['2024-01-10', 'lundi', 'alpha', 'MT-0001'],
+            ['2024-01-15', 'lundi', 'beta', 'MT-0002'],
+            ['2024-01-20', 'lundi', 'beta', 'MT-0002'],
+            ['2024-02-10', 'lundi', 'alpha', 'MT-0002'],
+        ])
+        self.assertEqual(lignes[1][4:6], ['10000.00', '2000.00'])
+        self.assertEqual(Decimal(lignes[1][6]), Decimal('8000'))
+
+    def test_filtres_selon_l_historique(self):
+        self.assertEqual([l[0] for l in self._csv('recettes', moto=self.m1.pk)[1:]], ['2024-01-10'])
+        self.assertEqual([l[0] for l in self._csv('recettes', conducteur=self.beta.pk, fin='2024-01-16')[1:]],
+                         ['2024-01-15'])
+        self.assertEqual([l[0] for l in self._csv('pannes', conducteur=self.alpha.pk)[1:]], ['2024-01-05'])
+        self.assertEqual([l[0] for l in self._csv('pannes', conducteur=self.beta.pk)[1:]], ['2024-02-05'])
+        self.assertEqual([l[0] for l in self._csv('absences', moto=self.m1.pk)[1:]], ['2024-01-06'])
+        self.assertEqual([l[0] for l in self._csv('absences', moto=self.m2.pk)[1:]], ['2024-02-06'])
+
+    def test_recettes_xlsx(self):
+        reponse = self.client.get(reverse('exporter', kwargs={'table': 'recettes'}),
+                                  {'format': 'xlsx', 'debut': '2024-01-12'})
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(reponse.streaming_content)))
+        self.assertIn('xl/styles.xml', archive.namelist())
+        espace = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        lignes = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml')).findall('.//x:row', espace)
+        self.assertEqual(len(lignes), 4)        # en-tête + 3 recettes depuis le 12 janvier
+        self.assertEqual(lignes[0].find('x:c/x:is/x:t', espace).text, 'Date')
+        cellule_date = lignes[1].find('x:c', espace)
+        # Date en numéro de série (style 1), pas en texte
+        self.assertEqual(cellule_date.get('s'), '1')
+        self.assertIsNone(cellule_date.get('t'))
+        self.assertEqual(int(cellule_date.find('x:v', espace).text), (date(2024, 1, 15) - date(1899, 12, 30)).days)
+
+
+# -----------------------
+# Classement
+# -----------------------
+@override_settings(CACHES=CACHES_TESTS, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ClassementTests(TestCase):
+    """Rangs courant et précédent connus sur deux jours consécutifs : évolution, conducteur
+    sans historique, conducteur absent de la période courante."""
+
+    JOUR = date(2024, 3, 5)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='admin', role='admin', is_staff=True,
+                                        password=make_password(MOT_DE_PASSE))
+        # Bénéfice (veille, jour) par conducteur ; None : pas de recette ce jour-là
+        benefices = {'a': (5000, 3000), 'b': (2000, 8000), 'c': (4000, 1000), 'd': (None, 6000), 'e': (9000, None)}
+        cls.conducteurs = {}
+        for nom, montants in benefices.items():
+            conducteur = Conducteur.objects.create(user=User.objects.create(username=nom, role='conducteur'),
+                                                   adresse='Quartier', telephone='0700000000')
+            cls.conducteurs[nom] = conducteur.pk
+            for jour, benefice in zip((cls.JOUR - timedelta(days=1), cls.JOUR), montants):
+                if benefice is not None:
+                    Recette.objects.create(conducteur=conducteur, date=jour, jour='lundi',
+                                           montant=Decimal(benefice + 1000), depense=Decimal('1000'))
+
+    def _attendu(self):
+        c = self.conducteurs
+        # (conducteur, rang, rang précédent, évolution) ; « e » n'a rien sur le jour courant
+        return [(c['b'], 1, 3, 2), (c['d'], 2, None, None), (c['a'], 3, 1, -2), (c['c'], 4, 2, -2)]
+
+    def test_rangs_et_evolution(self):
+        resultat = classement.classement_en_cache('jour', self.JOUR, self.JOUR)
+        self.assertEqual(resultat['total'], 4)
+        self.assertEqual(
+            [(l['conducteur'], l['rang'], l['rang_precedent'], l['evolution']) for l in resultat['lignes']],
+            self._attendu(),
+        )
+        self.assertEqual(resultat['lignes'][0]['benefice'], Decimal('8000'))
+
+    def test_json(self):
+        self.client.force_login(self.admin)
+        reponse = self.client.get(reverse('classement_conducteurs_json'),
+                                  {'periode': 'jour', 'date': self.JOUR.isoformat(), 'par_page': 3})
+        donnees = reponse.json()
+        self.assertEqual((donnees['total'], donnees['nb_pages'], donnees['critere']), (4, 2, 'benefice'))
+        self.assertEqual(
+            [(l['conducteur'], l['rang'], l['rang_precedent'], l['evolution']) for l in donnees['lignes']],
+            self._attendu()[:3],
+        )
+
+
+# -----------------------
+# Recettes manquantes
+# -----------------------
+@override_settings(CACHES=CACHES_TESTS)
+class ReconciliationTests(TestCase):
+    """Jours attribués sans recette ni absence (archive comprise), et retour d'un jour rapproché
+    parmi les manquants quand sa recette ou son absence est supprimée."""
+
+    LUNDI = date(2024, 3, 4)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.moto = Moto.objects.create(nom='Moto', matricule='MT-0001', statut='attribuee')
+        cls.conducteur = Conducteur.objects.create(user=User.objects.create(username='rapproche', role='conducteur'),
+                                                   adresse='Quartier', telephone='0700000000')
+        # Attribuée du lundi au samedi exclu, puis en réparation
+        AttributionMoto.objects.all().delete()
+        AttributionMoto.objects.create(moto=cls.moto, conducteur=cls.conducteur, statut='attribuee',
+                                       debut=cls.LUNDI, fin=cls.jour(5))
+        AttributionMoto.objects.create(moto=cls.moto, conducteur=cls.conducteur, statut='reparation',
+                                       debut=cls.jour(5))
+        for i in (0, 1):
+            Recette.objects.create(conducteur=cls.conducteur, date=cls.jour(i), jour='lundi',
+                                   montant=Decimal('10000'), depense=Decimal('0'))
+        RecetteArchivee.objects.create(id=10 ** 9, conducteur=cls.conducteur, date=cls.jour(4), jour='vendredi',
+                                       montant=Decimal('10000'), depense=Decimal('0'))
+        Absence.objects.create(conducteur=cls.conducteur, date=cls.jour(3), raison='Maladie')
+
+    @classmethod
+    def jour(cls, decalage):
+        return cls.LUNDI + timedelta(days=decalage)
+
+    def _manquants(self):
+        return list(RecetteManquante.objects.order_by('date').values_list('date', flat=True))
+
+    def test_jours_manquants(self):
+        self.assertEqual(reconciliation.rapprocher(self.jour(0), self.jour(6))[2], 1)
+        self.assertEqual(self._manquants(), [self.jour(2)])
+        self.assertEqual(RecetteManquante.objects.get().moto_id, self.moto.pk)
+
+    def test_saisie_puis_suppression(self):
+        reconciliation.rapprocher(self.jour(0), self.jour(6))
+        recette = Recette.objects.create(conducteur=self.conducteur, date=self.jour(2), jour='mercredi',
+                                         montant=Decimal('10000'), depense=Decimal('0'))
+        self.assertEqual(self._manquants(), [])
+        recette.delete()
+        self.assertEqual(self._manquants(), [self.jour(2)])
+        Recette.objects.get(date=self.jour(0)).delete()
+        Absence.objects.get().delete()
+        self.assertEqual(self._manquants(), [self.jour(0), self.jour(2), self.jour(3)])
+
+    def test_recette_deplacee(self):
+        reconciliation.rapprocher(self.jour(0), self.jour(6))
+        recette = Recette.objects.get(date=self.jour(1))
+        recette.date = self.jour(2)
+        recette.save()
+        self.assertEqual(self._manquants(), [self.jour(1)])
+
+    def test_jour_pas_encore_rapproche(self):
+        reconciliation.rapprocher(self.jour(0), self.jour(0))
+        Recette.objects.get(date=self.jour(1)).delete()
+        self.assertEqual(self._manquants(), [])
+
+
+# -----------------------
+# Factures
+# -----------------------
+@override_settings(CACHES=CACHES_TESTS, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class FacturesTests(TestCase):
+    """Dépôt dédupliqué avec dérivées produites au dépôt, et envoi avec ETag et Range."""
+
+    PDF = b'%PDF-1.4\n' + bytes(range(256)) * 4
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media = tempfile.mkdtemp()
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media))
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='admin', role='admin', is_staff=True,
+                                        password=make_password(MOT_DE_PASSE))
+        cls.moto = Moto.objects.create(nom='Moto', matricule='MT-0001', statut='reparation')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _png(self):
+        tampon = io.BytesIO()
+        Image.new('RGB', (800, 600), 'orange').save(tampon, 'PNG')
+        return SimpleUploadedFile('scan.png', tampon.getvalue(), content_type='image/png')
+
+    def _panne(self, nom):
+        return Panne.objects.create(moto=self.moto, description='Pneu', montant_depense=Decimal('3000'),
+                                    admin=self.admin, facture=nom)
+
+    def test_depot_deduplique_avec_derivees(self):
+        nom = factures.enregistrer(self._png())
+        self.assertEqual(factures.enregistrer(self._png()), nom)
+        self.assertEqual(len(default_storage.listdir(nom.rsplit('/', 1)[0])[1]), 1)
+        for taille in factures.DERIVEES:
+            self.assertTrue(default_storage.exists(factures.derivee(nom, taille)))
+        reponse = self.client.get(reverse('panne_facture_miniature', kwargs={'pk': self._panne(nom).pk}))
+        self.assertEqual((reponse.status_code, reponse['Content-Type']), (200, 'image/webp'))
+
+    def test_pas_de_derivee_a_l_affichage(self):
+        nom = factures.enregistrer(self._png())
+        default_storage.delete(factures.derivee(nom, 'apercu'))
+        reponse = self.client.get(reverse('panne_facture_apercu', kwargs={'pk': self._panne(nom).pk}))
+        self.assertEqual(reponse.status_code, 404)
+        self.assertFalse(default_storage.exists(factures.derivee(nom, 'apercu')))
+
+    def test_envoi_partiel_et_conditionnel(self):
+        nom = factures.enregistrer(SimpleUploadedFile('facture.pdf', self.PDF, content_type='application/pdf'))
+        self.assertFalse(default_storage.exists(factures.derivee(nom, 'miniature')))
+        url = reverse('panne_facture', kwargs={'pk': self._panne(nom).pk})
+        taille = len(self.PDF)
+
+        complete = self.client.get(url)
+        self.assertEqual((complete.status_code, complete['Accept-Ranges']), (200, 'bytes'))
+        self.assertEqual(b''.join(complete.streaming_content), self.PDF)
+        etag = complete['ETag']
+
+        partielle = self.client.get(url, headers={'Range': 'bytes=10-19'})
+        self.assertEqual(partielle.status_code, 206)
+        self.assertEqual(partielle['Content-Range'], f'bytes 10-19/{taille}')
+        self.assertEqual(b''.join(partielle.streaming_content), self.PDF[10:20])
+        fin = self.client.get(url, headers={'Range': 'bytes=-5'})
+        self.assertEqual(b''.join(fin.streaming_content), self.PDF[-5:])
+
+        for plage in ('bytes=-0', f'bytes={taille}-'):
+            with self.subTest(plage=plage):
+                reponse = self.client.get(url, headers={'Range': plage})
+                self.assertEqual((reponse.status_code, reponse['Content-Range']), (416, f'bytes */{taille}'))
+
+        # Fichier changé depuis la première lecture : tout le fichier, pas la plage
+        perimee = self.client.get(url, headers={'Range': 'bytes=10-19', 'If-Range': '"autre"'})
+        self.assertEqual(perimee.status_code, 200)
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+
+# -----------------------
+# Import des recettes
+# -----------------------
+@override_settings(CACHES=CACHES_TESTS)
+class ImportRecettesTests(TestCase):
+    """Import sans erreur : créations et mises à jour comptées par l'upsert, cumuls reconstruits."""
+
+    @classmethod
+    def setUpTestData(cls):
+        aujourd_hui = date.today()
+        cls.lundi = aujourd_hui - timedelta(days=aujourd_hui.weekday() + 7)
+        cls.alpha, cls.beta = (
+            Conducteur.objects.create(user=User.objects.create(username=nom, role='conducteur'),
+                                      adresse='Quartier', telephone='0700000000')
+            for nom in ('alpha', 'beta')
+        )
+        Recette.objects.create(conducteur=cls.alpha, date=cls.lundi, jour='Lundi',
+                               montant=Decimal('5000'), depense=Decimal('500'))
+
+    def test_creations_et_mises_a_jour(self):
+        mardi = self.lundi + timedelta(days=1)
+        lignes = [
+            'conducteur,date,montant,depense',
+            f'alpha,{self.lundi},12000,2000',
+            f'alpha,{mardi:%d/%m/%Y},8000,1000',
+            f'{self.beta.pk},{mardi},"7 000,50",500',
+        ]
+        rapport = imports.importer(io.BytesIO('\n'.join(lignes).encode()))
+        self.assertEqual(rapport, {'creees': 2, 'mises_a_jour': 1, 'erreurs': []})
+        self.assertEqual(
+            set(Recette.objects.values_list('conducteur_id', 'date', 'jour', 'montant', 'depense')),
+            {
+                (self.alpha.pk, self.lundi, 'Lundi', Decimal('12000'), Decimal('2000')),
+                (self.alpha.pk, mardi, 'Mardi', Decimal('8000'), Decimal('1000')),
+                (self.beta.pk, mardi, 'Mardi', Decimal('7000.50'), Decimal('500')),
+            },
+        )
+
+        def cumul(conducteur, periode, debut):
+            return CumulRecette.objects.filter(conducteur=conducteur, periode=periode, debut=debut).values_list(
+                'montant', 'depense', 'nb_recettes').get()
+
+        self.assertEqual(cumul(self.alpha, 'jour', self.lundi), (Decimal('12000'), Decimal('2000'), 1))
+        self.assertEqual(cumul(self.alpha, 'semaine', self.lundi), (Decimal('20000'), Decimal('3000'), 2))
+        self.assertEqual(cumul(self.beta, 'semaine', self.lundi), (Decimal('7000.50'), Decimal('500'), 1))
+        for conducteur in (self.alpha, self.beta):
+            for mois in {self.lundi.replace(day=1), mardi.replace(day=1)}:
+                recettes = Recette.objects.filter(conducteur=conducteur, date__year=mois.year, date__month=mois.month)
+                if recettes.exists():
+                    self.assertEqual(cumul(conducteur, 'mois', mois)[2], recettes.count())
+
+
+# -----------------------
+# Sessions en cookie signé
+# -----------------------
+@override_settings(CACHES=CACHES_TESTS, SESSION_ENGINE='gestion.session_signee',
+                   PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SessionSigneeTests(TestCase):
+    """Un cookie signé copié avant la déconnexion ou la révocation ne rouvre pas la session."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='gamma', password=MOT_DE_PASSE, role='conducteur')
+        Conducteur.objects.create(user=user, adresse='Quartier', telephone='0700000000')
+
+    def setUp(self):
+        caches['sessions'].clear()
+        self.client.post(reverse('login'), {'username': 'gamma', 'password': MOT_DE_PASSE})
+        self.cookie = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def _rejouer(self):
+        rejoue = self.client_class()
+        rejoue.cookies[settings.SESSION_COOKIE_NAME] = self.cookie
+        return rejoue.get(reverse('conducteur_dashboard'))
+
+    def test_cookie_valide_avant_deconnexion(self):
+        self.assertEqual(self._rejouer().status_code, 200)
+
+    def test_cookie_rejoue_apres_deconnexion(self):
+        self.client.get(reverse('logout'))
+        reponse = self._rejouer()
+        self.assertEqual(reponse.status_code, 302)
+        self.assertTrue(reponse.url.startswith(settings.LOGIN_URL))
+
+    def test_cookie_rejoue_apres_revocation(self):
+        from .session_signee import CLE_JETON, SessionStore, revoquer
+
+        revoquer(SessionStore(self.cookie).load()[CLE_JETON], settings.SESSION_COOKIE_AGE)
+        reponse = self._rejouer()
+        self.assertEqual(reponse.status_code, 302)
+        self.assertTrue(reponse.url.startswith(settings.LOGIN_URL))
+
+
+# -----------------------
+# Pages publiques
+# -----------------------
+@override_settings(CACHES=CACHES_TESTS, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class PagePubliqueTests(TestCase):
+    """ETag propre au visiteur et à la requête, 304 sans SQL quand rien n'a changé, gzip sinon."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='delta', password=MOT_DE_PASSE, role='client')
+
+    def test_304_sur_if_none_match(self):
+        reponse = self.client.get(reverse('home'))
+        self.assertEqual(reponse.status_code, 200)
+        with self.assertNumQueries(0):
+            reponse = self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=reponse['ETag'])
+        self.assertEqual(reponse.status_code, 304)
+        self.assertEqual(reponse.content, b'')
+
+    def test_etag_propre_au_visiteur(self):
+        anonyme = self.client.get(reverse('home'))
+        self.client.login(username='delta', password=MOT_DE_PASSE)
+        connecte = self.client.get(reverse('home'))
+        self.assertNotEqual(anonyme['ETag'], connecte['ETag'])
+        self.assertTrue(anonyme.has_header('Last-Modified'))
+        self.assertFalse(connecte.has_header('Last-Modified'))
+        # L'ETag du visiteur anonyme ne vaut pas pour le visiteur connecté
+        reponse = self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=anonyme['ETag'])
+        self.assertEqual(reponse.status_code, 200)
+
+    def test_etag_propre_a_la_requete(self):
+        sans = self.client.get(reverse('home'))
+        avec = self.client.get(reverse('home') + '?page=2')
+        self.assertNotEqual(sans['ETag'], avec['ETag'])
+        reponse = self.client.get(reverse('home') + '?page=2', HTTP_IF_NONE_MATCH=sans['ETag'])
+        self.assertEqual(reponse.status_code, 200)
+
+    def test_etag_suit_les_reponses_de_la_faq(self):
+        from . import faq
+
+        self.client.get(reverse('touriste'))  # pose le cookie CSRF, qui entre dans l'ETag
+        etag = self.client.get(reverse('touriste'))['ETag']
+        self.assertEqual(self.client.get(reverse('touriste'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        faq.invalider()
+        self.assertEqual(self.client.get(reverse('touriste'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_gzip(self):
+        brute = self.client.get(reverse('home'))
+        compressee = self.client.get(reverse('home'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(brute.has_header('Content-Encoding'))
+        self.assertEqual(compressee['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', compressee['Vary'])
+        self.assertEqual(gzip.decompress(compressee.content), brute.content)
+        reponse = self.client.get(reverse('home'), HTTP_ACCEPT_ENCODING='gzip',
+                                  HTTP_IF_NONE_MATCH=compressee['ETag'])
+        self.assertEqual(reponse.status_code, 304)
+
+
+# -----------------------
+# Pagination par curseur
+# -----------------------
+@override_settings(CACHES=CACHES_TESTS)
+class PaginationTests(TestCase):
+    """Le curseur (date, id) ne saute ni ne répète aucune ligne, même si d'autres sont
+    ajoutées entre deux pages ; un curseur illisible ou falsifié ramène à la première page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.moto = Moto.objects.create(nom='Moto', matricule='PG-0001')
+        cls.lundi = date(2024, 3, 4)
+        Panne.objects.bulk_create([
+            Panne(moto=cls.moto, date=cls.lundi + timedelta(days=i % 3), description='Pneu', montant_depense=1000)
+            for i in range(7)
+        ])
+
+    def _parcourir(self, curseur=None, par_page=2):
+        vues = []
+        while True:
+            page = pagination.paginer(Panne.objects.all(), '-date', curseur, par_page)
+            vues.extend(panne.pk for panne in page.objets)
+            if page.suivant is None:
+                return vues
+            curseur = page.suivant
+
+    def test_parcours_complet_avec_ex_aequo(self):
+        attendu = list(Panne.objects.order_by('-date', '-pk').values_list('pk', flat=True))
+        self.assertEqual(self._parcourir(), attendu)
+
+    def test_insertions_entre_deux_pages(self):
+        premiere = pagination.paginer(Panne.objects.all(), '-date', None, 2)
+        avant = list(Panne.objects.order_by('-date', '-pk').values_list('pk', flat=True))
+        dernier = premiere.objets[-1]
+        # Plus récente, ex æquo de la dernière ligne affichée (id plus grand), plus ancienne
+        nouvelles = Panne.objects.bulk_create([
+            Panne(moto=self.moto, date=jour, description='Frein', montant_depense=500)
+            for jour in (self.lundi + timedelta(days=5), dernier.date, self.lundi - timedelta(days=1))
+        ])
+
+        suite = self._parcourir(premiere.suivant)
+        vues = [panne.pk for panne in premiere.objets] + suite
+        self.assertEqual(len(vues), len(set(vues)))
+        # Toutes les lignes de départ, dans l'ordre ; seule la nouvelle ligne plus ancienne s'y ajoute
+        self.assertEqual([pk for pk in vues if pk in avant], avant)
+        self.assertEqual(set(vues) - set(avant), {nouvelles[2].pk})
+
+    def test_curseur_illisible_ou_falsifie(self):
+        champ = Panne._meta.get_field('date')
+        falsifies = [
+            'pas-du-base64!',
+            base64.urlsafe_b64encode(b'\xff\xfe|3').decode(),
+            pagination.encoder('31/02/2024', 3),
+            pagination.encoder(self.lundi, 'x'),
+            base64.urlsafe_b64encode(b'sans-separateur').decode(),
+        ]
+        premiere = pagination.paginer(Panne.objects.all(), '-date', None, 2)
+        for curseur in falsifies:
+            with self.subTest(curseur=curseur):
+                self.assertIsNone(pagination.decoder(curseur, champ))
+                page = pagination.paginer(Panne.objects.all(), '-date', curseur, 2)
+                self.assertTrue(page.premiere)
+                self.assertEqual(page.objets, premiere.objets)
+        self.assertEqual(pagination.decoder(pagination.encoder(self.lundi, 3), champ), (self.lundi, 3))
@@ -3,6 +3,7 @@ from . import views
 from .views import reservations_rapides_view, reservation_rapide_lu
 from django.contrib.sitemaps.views import sitemap
 from .sitemaps import StaticViewSitemap
+from .decorators import page_publique
 
 sitemaps = {
     'static': StaticViewSitemap,
@@ -20,13 +21,16 @@ urlpatterns = [
     path('ajouter-moto/', views.ajouter_moto, name='ajouter_moto'),
     path('supprimer-moto/<int:moto_id>/', views.supprimer_moto, name='supprimer_moto'),
     path('conducteur/<int:pk>/', views.conducteur_detail, name='conducteur_detail'),
+    path('conducteur/<int:pk>/serie/', views.conducteur_serie, name='conducteur_serie'),
     path("recettes/ajouter/", views.ajouter_recette, name="ajouter_recette"),
+    path("recettes/importer/", views.importer_recettes, name="importer_recettes"),
     path("conducteurs/", views.liste_conducteurs, name="liste_conducteurs"),
     path("conducteurs/supprimer/<int:pk>/", views.supprimer_conducteur, name="supprimer_conducteur"),
     path('poser-question/', views.poser_question, name='poser_question'),
     path('questions/', views.liste_questions, name='liste_questions'),
     path('questions/<int:question_id>/repondre/', views.repondre_question, name='repondre_question'),
     path('dashboard/admin/', views.admin_dashboard, name='admin_dashboard'),
+    path('anomalie/<int:pk>/vue/', views.anomalie_vue, name='anomalie_vue'),
     path('dashboard/conducteur/', views.conducteur_dashboard, name='conducteur_dashboard'),
 
     path('redirect/', views.home_redirect, name='redirect_by_role'),
@@ -37,8 +41,17 @@ urlpatterns = [
     path('absence/<int:conducteur_id>/', views.ajouter_absence, name='ajouter_absence'),
     path('moto/<int:moto_id>/modifier_statut/', views.modifier_statut_moto, name='modifier_statut_moto'),
     path('bilan-general/', views.bilan_general, name='bilan_general'),
+    path('classement/', views.classement_conducteurs, name='classement_conducteurs'),
+    path('classement.json', views.classement_conducteurs_json, name='classement_conducteurs_json'),
+    path('motos/rentabilite/', views.rentabilite_motos, name='rentabilite_motos'),
     path('pannes/ajouter/', views.ajouter_panne, name='ajouter_panne'),
     path('pannes/', views.liste_pannes, name='liste_pannes'),
+    path('pannes/<int:pk>/facture/', views.panne_facture, name='panne_facture'),
+    path('pannes/<int:pk>/facture/miniature/', views.panne_facture_image, {'taille': 'miniature'},
+         name='panne_facture_miniature'),
+    path('pannes/<int:pk>/facture/apercu/', views.panne_facture_image, {'taille': 'apercu'},
+         name='panne_facture_apercu'),
+    path('export/<str:table>/', views.exporter, name='exporter'),
     
     # Réservations
     path('reservation/<int:pk>/valider/', views.reservation_valider, name='reservation_valider'),
@@ -64,5 +77,5 @@ urlpatterns = [
     path('reservations-rapides/', views.liste_reservations_rapides, name='liste_reservations_rapides'),
     path('reservations-rapides/supprimer/<int:pk>/', views.supprimer_reservation, name='supprimer_reservation'),
     
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps}, name='sitemap'),
+    path('sitemap.xml', page_publique()(sitemap), {'sitemaps': sitemaps}, name='sitemap'),
 ]
@@ -3,22 +3,27 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from functools import wraps
-from .models import Conducteur,ReservationRapide, Recette, Client, Moto, Absence, Question, Panne, Reservation, Abonnement
-from django.db.models import Sum
+from .models import Conducteur,ReservationRapide, Recette, Client, Moto, Absence, Question, Panne, Reservation, Abonnement, AnomalieRecette, RecetteManquante
 from datetime import date
 from django.utils.timezone import now
 import calendar
 from django.views.generic import FormView
 from django.urls import reverse_lazy
 from django.contrib.auth.hashers import make_password
-from .forms import AttributionMotoForm, PanneForm, ReservationRapideForm, RecetteForm, QuestionForm, ReponseForm, ClientSignUpForm, ClientLoginForm, AbonnementForm, ReservationForm
+from .forms import AttributionMotoForm, PanneForm, ReservationRapideForm, RecetteForm, QuestionForm, ReponseForm, ClientSignUpForm, ClientLoginForm, AbonnementForm, ReservationForm, ImportRecettesForm
 from django.utils import timezone
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.cache import patch_cache_control
 from django.contrib.admin.views.decorators import staff_member_required
-from .decorators import conducteur_required, admin_required
+from .decorators import conducteur_required, admin_required, page_publique, signature_faq
+from .middleware import profil
+from . import (
+    archivage, attributions, bilan, classement, cumuls, demandes, exports, factures, faq, flotte, imports, instantane,
+    pagination, prevision, recherche,
+)
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.http import HttpResponseForbidden
-import random
+from django.http import Http404, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 
 User = get_user_model()
 
@@ -48,7 +53,8 @@ def home_redirect(request):
 @login_required
 @conducteur_required
 def conducteur_dashboard(request):
-    conducteur = get_object_or_404(Conducteur, user=request.user)
+    # Profil déjà chargé (avec la moto) par `conducteur_required`
+    conducteur = profil(request).conducteur
     recette_du_jour = Recette.objects.filter(conducteur=conducteur, date=date.today()).first()
 
     if request.method == 'POST':
@@ -81,18 +87,8 @@ def admin_dashboard(request):
     # ----------------------------
     # Conducteurs et recettes
     # ----------------------------
-    conducteurs = Conducteur.objects.select_related('user', 'moto') \
-        .annotate(total_recettes=Sum('recette__montant')) \
-        .prefetch_related('recette_set')
-
-    data_conducteurs = []
-    for cond in conducteurs:
-        recette_du_jour = next((r for r in cond.recette_set.all() if r.date == date.today()), None)
-        data_conducteurs.append({
-            'conducteur': cond,
-            'recette_du_jour': recette_du_jour,
-            'total_recettes': cond.total_recettes or 0,
-        })
+    # Conducteurs, recettes du jour et totaux lus dans l'instantané en mémoire (voir `flotte.py`)
+    data_conducteurs = flotte.instantane().lignes_tableau_de_bord()
 
     # ----------------------------
     # Réservations et abonnements
@@ -100,6 +96,16 @@ def admin_dashboard(request):
     reservations = Reservation.objects.all().order_by('-date_reservation')[:10]
     abonnements = Abonnement.objects.all().order_by('-date_demande')[:10]
 
+    # ----------------------------
+    # Anomalies signalées par `detecter_anomalies`
+    # ----------------------------
+    anomalies = AnomalieRecette.objects.filter(vue=False).select_related('conducteur__user')[:10]
+
+    # ----------------------------
+    # Recettes manquantes calculées par `rapprocher_recettes`
+    # ----------------------------
+    nb_manquantes = RecetteManquante.objects.count()
+    manquantes = RecetteManquante.objects.select_related('conducteur__user', 'moto')[:20]
 
     if request.user.role != "admin":
         return HttpResponseForbidden("Vous n'avez pas accès à cette page.")
@@ -108,14 +114,26 @@ def admin_dashboard(request):
         'conducteurs': data_conducteurs,
         'reservations': reservations,
         'abonnements': abonnements,
+        'anomalies': anomalies,
+        'nb_manquantes': nb_manquantes,
+        'manquantes': manquantes,
     })
 
 
+@login_required
+@admin_required
+def anomalie_vue(request, pk):
+    anomalie = get_object_or_404(AnomalieRecette, pk=pk)
+    anomalie.vue = True
+    anomalie.save(update_fields=['vue'])
+    return redirect('admin_dashboard')
+
+
 # Absences - Admin uniquement
 @login_required
 @admin_required
 def ajouter_absence(request, conducteur_id):
-    conducteur = get_object_or_404(Conducteur, id=conducteur_id)
+    conducteur = get_object_or_404(Conducteur.objects.select_related('user'), id=conducteur_id)
     if request.method == 'POST':
         date_absence = request.POST.get('date')
         raison = request.POST.get('raison')
@@ -193,26 +211,21 @@ def modifier_recette(request, recette_id):
     return render(request, 'modifier_recette.html', {'recette': recette})
 
 
+@page_publique()
 def home(request):
     
     return render(request,'home.html')
 
 
+@page_publique(signature_faq)
 def touriste(request):
-    # Date actuelle
-    today = timezone.now().date()
-    
-    # On calcule un "index de cycle" basé sur les jours, qui change tous les 2 jours
-    cycle_index = (today.toordinal() // 2)
-
-    # Récupérer toutes les questions répondue
-    all_questions = list(Question.objects.filter(statut='repondu').order_by('-date_creation'))
-
-    # Mélanger mais de façon stable avec le cycle (pour que tous les utilisateurs voient la même liste sur 2 jours)
-    random.Random(cycle_index).shuffle(all_questions)
-
-    # Limiter à 20 (ou le nombre que tu veux)
-    questions = all_questions[:20]
+    # Sélection renouvelée tous les 2 jours, identique pour tous les visiteurs ;
+    # identifiants et bloc HTML en cache par cycle (voir `faq.py`)
+    cycle_index = faq.cycle_courant()
+    version_faq = faq.version()
+    questions = faq.questions_du_cycle(cycle_index, version_faq)
+    texte = request.GET.get('q', '').strip()
+    resultats = faq.rechercher(texte) if texte else None
 
     # Gestion du formulaire pour poser une question
     if request.method == 'POST':
@@ -233,7 +246,13 @@ def touriste(request):
             )
             messages.success(request, "Votre question a été envoyée avec succès !")
 
-    return render(request, 'touriste.html', {'questions': questions})
+    return render(request, 'touriste.html', {
+        'questions': questions,
+        'cycle_index': cycle_index,
+        'version_faq': version_faq,
+        'q': texte,
+        'resultats': resultats,
+    })
 
 
 
@@ -302,10 +321,10 @@ def register(request):
 @login_required
 @admin_required
 def ajouter_moto(request):
-    motos = Moto.objects.all()
+    motos = flotte.instantane().motos
 
     if request.method == 'POST':
-        if motos.count() >= 100:
+        if len(motos) >= 100:
             messages.error(request, "Nombre maximal de motos atteint (100).")
         else:
             nom = request.POST.get('nom')
@@ -325,12 +344,17 @@ def ajouter_moto(request):
 
 @login_required
 @admin_required
+@instantane.lecture_instantane
 def conducteur_detail(request, pk):
-    conducteur = get_object_or_404(Conducteur, pk=pk)
-    recettes = Recette.objects.filter(conducteur=conducteur)
-
-    total_montant = sum(recette.montant for recette in recettes)
-    total_depense = sum(recette.depense for recette in recettes)
+    # Fiche lue en direct : un conducteur ajouté depuis la dernière copie existe déjà
+    conducteur = get_object_or_404(
+        Conducteur.objects.using(DEFAULT_DB_ALIAS).select_related('user', 'moto'), pk=pk
+    )
+
+    # Totaux calculés en base à partir des cumuls mensuels du conducteur
+    totaux = cumuls.totaux_recettes(conducteur=conducteur)
+    total_montant = totaux['montant']
+    total_depense = totaux['depense']
     net = total_montant - total_depense
 
     context = {
@@ -343,6 +367,60 @@ def conducteur_detail(request, pk):
     return render(request, 'conducteur_detail.html', context)
 
 
+@login_required
+@admin_required
+@instantane.lecture_instantane
+def conducteur_serie(request, pk):
+    """Série JSON recettes/dépenses/bénéfice d'un conducteur (?pas=jour|semaine|mois)."""
+    conducteur_id = get_object_or_404(
+        Conducteur.objects.using(DEFAULT_DB_ALIAS).values_list('pk', flat=True), pk=pk
+    )
+    pas = request.GET.get('pas', 'jour')
+    if pas not in cumuls.TRONCATURES:
+        pas = 'jour'
+    try:
+        points = min(int(request.GET.get('points', cumuls.POINTS_MAX)), 1000)
+        debut = date.fromisoformat(request.GET['debut']) if request.GET.get('debut') else None
+        fin = date.fromisoformat(request.GET['fin']) if request.GET.get('fin') else None
+    except ValueError:
+        return JsonResponse({'erreur': "Paramètres invalides."}, status=400)
+
+    pas, serie = cumuls.serie_recettes(conducteur_id, pas, max(points, 1), debut, fin)
+    return JsonResponse({'conducteur': conducteur_id, 'pas': pas, 'serie': serie})
+
+
+@login_required
+@admin_required
+@instantane.lecture_instantane
+def exporter(request, table):
+    """Export CSV/XLSX en streaming (?format=csv|xlsx&conducteur=&moto=&debut=&fin=)."""
+    if table not in exports.EXPORTS:
+        raise Http404("Export inconnu.")
+    try:
+        filtres = exports.lire_filtres(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest("Filtres invalides.")
+
+    # Les lignes sont lues pendant l'envoi, après la vue : la base est choisie maintenant
+    entetes, lignes = exports.lignes_export(table, filtres, base=instantane.base_courante())
+    nom_fichier = f"{table}_{date.today():%Y%m%d}"
+    if request.GET.get('format') == 'xlsx':
+        response = StreamingHttpResponse(
+            exports.flux_xlsx(entetes, lignes, nom_feuille=table.capitalize()),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{nom_fichier}.xlsx"'
+    else:
+        response = StreamingHttpResponse(
+            exports.flux_csv(entetes, lignes),
+            content_type='text/csv; charset=utf-8',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{nom_fichier}.csv"'
+    if request.donnees_au:
+        response['X-Donnees-Au'] = request.donnees_au.isoformat()
+    return response
+
+
 #les nouvelles vues
 def email(request): 
     if request.method == "POST":
@@ -386,33 +464,23 @@ def modifier_statut_moto(request, moto_id):
     return redirect(request.META.get('HTTP_REFERER', 'admin_dashboard'))
 
 
+@login_required
+@admin_required
+@instantane.lecture_instantane
 def bilan_general(request):
-    # Recettes et dépenses (depuis Recette)
-    total_recettes = Recette.objects.aggregate(total=Sum('montant'))['total'] or 0
-    total_depenses = Recette.objects.aggregate(total=Sum('depense'))['total'] or 0
-
-    # Dépenses liées aux pannes
-    total_pannes = Panne.objects.aggregate(total=Sum('montant_depense'))['total'] or 0
-
-    # Bénéfice net = recettes - (dépenses + pannes)
-    benefice_total = total_recettes - (total_depenses + total_pannes)
-
-    # Statistiques diverses
-    nb_conducteurs = Conducteur.objects.count()
-    nb_motos_disponibles = Moto.objects.filter(statut='disponible').count()
-    nb_motos_attribuees = Moto.objects.filter(statut='attribuee').count()
-    nb_motos_reparation = Moto.objects.filter(statut='reparation').count()
-
-    context = {
-        'total_recettes': total_recettes,
-        'total_depenses': total_depenses,
-        'total_pannes': total_pannes,
-        'benefice_total': benefice_total,
-        'nb_conducteurs': nb_conducteurs,
-        'nb_motos_disponibles': nb_motos_disponibles,
-        'nb_motos_attribuees': nb_motos_attribuees,
-        'nb_motos_reparation': nb_motos_reparation,
-    }
+    # Période demandée (?periode=jour|semaine|mois|perso|tout&date=...&debut=...&fin=...)
+    periode, debut, fin = bilan.intervalle_depuis_requete(request.GET)
+
+    # Totaux lus dans les cumuls, mis en cache jusqu'à la prochaine écriture dans la période
+    context = dict(bilan.bilan_en_cache(debut, fin))
+    context.update({
+        'periode': periode,
+        'periodes': bilan.PERIODES_BILAN,
+        'debut': debut,
+        'fin': fin,
+        # Recettes attendues la semaine prochaine (modèle en cache, voir `prevision.py`)
+        'prevision': prevision.prevision_semaine_prochaine(),
+    })
 
     return render(request, 'bilan_general.html', context)
 
@@ -426,6 +494,58 @@ def admin_required(view_func):
         return view_func(request, *args, **kwargs)
     return wrapper
 
+def _parametres_classement(request):
+    periode, debut, fin = bilan.intervalle_depuis_requete(request.GET)
+    critere = request.GET.get('critere', 'benefice')
+    if critere not in dict(classement.CRITERES):
+        critere = 'benefice'
+    return periode, debut, fin, critere, request.GET.get('page', 1)
+
+
+@login_required
+@admin_required
+def classement_conducteurs(request):
+    periode, debut, fin, critere, page = _parametres_classement(request)
+    resultat = classement.classement_en_cache(periode, debut, fin, critere, page)
+    return render(request, 'classement.html', {
+        **resultat,
+        'periode': periode,
+        'periodes': bilan.PERIODES_BILAN,
+        'debut': debut,
+        'fin': fin,
+        'critere': critere,
+        'criteres': classement.CRITERES,
+    })
+
+
+@login_required
+@admin_required
+def classement_conducteurs_json(request):
+    periode, debut, fin, critere, page = _parametres_classement(request)
+    try:
+        par_page = min(max(int(request.GET.get('par_page', classement.PAR_PAGE)), 1), 500)
+    except ValueError:
+        return JsonResponse({'erreur': "Paramètres invalides."}, status=400)
+    resultat = classement.classement_en_cache(periode, debut, fin, critere, page, par_page)
+    response = JsonResponse({'periode': periode, 'debut': debut, 'fin': fin, 'critere': critere, **resultat})
+    patch_cache_control(response, private=True, max_age=60)
+    return response
+
+
+@login_required
+@admin_required
+def rentabilite_motos(request):
+    periode, debut, fin = bilan.intervalle_depuis_requete(request.GET)
+    motos = attributions.rentabilite_motos(debut, fin)
+    return render(request, 'rentabilite_motos.html', {
+        'motos': motos,
+        'periode': periode,
+        'periodes': bilan.PERIODES_BILAN,
+        'debut': debut,
+        'fin': fin,
+    })
+
+
 @login_required
 @user_passes_test(admin_required)
 def ajouter_panne(request):
@@ -444,8 +564,47 @@ def ajouter_panne(request):
 @user_passes_test(admin_required)
 def liste_pannes(request):
     from .models import Panne
-    pannes = Panne.objects.select_related('moto', 'admin').all()
-    return render(request, 'pannes/liste_pannes.html', {'pannes': pannes})
+    pannes = (
+        Panne.objects.select_related('moto', 'admin')
+        .only('date', 'montant_depense', 'facture', 'moto__nom', 'moto__matricule', 'admin__username')
+        .annotate(apercu=pagination.apercu('description'))
+    )
+    page = pagination.paginer(pannes, '-date', pagination.curseur_de(request))
+    if pagination.demande_json(request):
+        return pagination.reponse_json(page, (
+            'id', 'moto.nom', 'moto.matricule', 'apercu', 'montant_depense', 'date', 'admin.username',
+        ))
+    # Vignettes légères à la place des originaux ; l'URL change avec le fichier (cache navigateur d'un an)
+    for panne in page.objets:
+        panne.facture_image = factures.est_image(panne.facture.name)
+        panne.facture_version = factures.version(panne.facture.name) if panne.facture else ''
+    return render(request, 'pannes/liste_pannes.html', {
+        'pannes': page.objets,
+        'navigation': pagination.navigation(request, page),
+    })
+
+def _nom_facture(pk):
+    nom = get_object_or_404(Panne.objects.values_list('facture', flat=True), pk=pk)
+    if not nom:
+        raise Http404("Pas de facture pour cette panne.")
+    return nom
+
+
+@login_required
+@admin_required
+def panne_facture(request, pk):
+    """Facture d'origine, servie par morceaux sur demande (Range)."""
+    return factures.reponse_fichier(request, _nom_facture(pk))
+
+
+@login_required
+@admin_required
+def panne_facture_image(request, pk, taille):
+    """Vignette ou aperçu WebP d'une facture en image, produit au dépôt de la facture."""
+    nom = _nom_facture(pk)
+    if not factures.est_image(nom):
+        raise Http404("Cette facture n'est pas une image.")
+    return factures.reponse_fichier(request, factures.derivee(nom, taille), immuable=True)
 
 @login_required
 def ajouter_recette(request):
@@ -456,10 +615,11 @@ def ajouter_recette(request):
 
             # Attribution automatique du conducteur si rôle "conducteur"
             if request.user.role == "conducteur":
-                recette.conducteur = Conducteur.objects.get(user=request.user)
+                recette.conducteur = profil(request).conducteur
 
-            # Vérification si une recette existe déjà pour ce conducteur et cette date
-            if Recette.objects.filter(conducteur=recette.conducteur, date=recette.date).exists():
+            # Vérification si une recette existe déjà pour ce conducteur et cette date, même archivée
+            if (Recette.objects.filter(conducteur=recette.conducteur, date=recette.date).exists()
+                    or archivage.cles_archivees({recette.conducteur_id}, recette.date, recette.date)):
                 messages.error(request, "Une recette pour ce conducteur à cette date existe déjà !")
             else:
                 recette.save()
@@ -472,14 +632,44 @@ def ajouter_recette(request):
     return render(request, "recettes/ajouter.html", {"form": form})
 
 
+@login_required
+@admin_required
+def importer_recettes(request):
+    rapport = None
+    if request.method == "POST":
+        form = ImportRecettesForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                rapport = imports.importer(form.cleaned_data['fichier'])
+            except (ValueError, UnicodeDecodeError) as erreur:
+                messages.error(request, f"Fichier illisible : {erreur}")
+            else:
+                messages.success(
+                    request,
+                    f"{rapport['creees']} recette(s) ajoutée(s), {rapport['mises_a_jour']} mise(s) à jour, "
+                    f"{len(rapport['erreurs'])} ligne(s) rejetée(s).",
+                )
+    else:
+        form = ImportRecettesForm()
+
+    return render(request, "recettes/importer.html", {"form": form, "rapport": rapport})
+
+
 @login_required
 def liste_conducteurs(request):
     if request.user.role != "admin":
         messages.error(request, "Accès refusé")
         return redirect("dashboard")  # redirige si pas admin
 
-    conducteurs = Conducteur.objects.all()
-    return render(request, "conducteurs/liste.html", {"conducteurs": conducteurs})
+    page = pagination.paginer_sequence(flotte.instantane().conducteurs, pagination.curseur_de(request))
+    if pagination.demande_json(request):
+        return pagination.reponse_json(page, (
+            'id', 'user.first_name', 'user.last_name', 'telephone', 'adresse', 'moto.nom', 'moto.matricule',
+        ))
+    return render(request, "conducteurs/liste.html", {
+        "conducteurs": page.objets,
+        "navigation": pagination.navigation(request, page),
+    })
 
 
 @login_required
@@ -488,7 +678,7 @@ def supprimer_conducteur(request, pk):
         messages.error(request, "Accès refusé")
         return redirect("dashboard")
 
-    conducteur = get_object_or_404(Conducteur, pk=pk)
+    conducteur = get_object_or_404(Conducteur.objects.select_related('user'), pk=pk)
 
     if request.method == "POST":
         conducteur.delete()
@@ -515,14 +705,45 @@ def poser_question(request):
         form = QuestionForm()
     return render(request, 'poser_question.html', {'form': form})
 
+def _recherche(request, requete):
+    """Recherche plein texte d'une liste d'administration (paramètres GET « q » et « avant »).
+
+    Retourne la page de résultats classés par pertinence (None sans texte
+    saisi) et le contexte du formulaire. `tronque` signale que des
+    correspondances plus anciennes ne sont pas classées : la date « avant »
+    permet de les atteindre.
+    """
+    texte = request.GET.get('q', '').strip()
+    try:
+        avant = date.fromisoformat(request.GET['avant']) if request.GET.get('avant') else None
+    except ValueError:
+        avant = None
+    contexte = {'q': texte, 'avant': avant}
+    if not texte:
+        return None, contexte
+    contexte['tronque'] = recherche.fenetre_depassee(requete.model, texte, avant)
+    contexte['fenetre'] = recherche.FENETRE
+    return recherche.paginer(requete, texte, pagination.curseur_de(request), avant), contexte
+
+
 # 2. Dashboard admin - lister les questions
 @login_required
 def liste_questions(request):
     if not request.user.role == 'admin':
         messages.error(request, "Accès refusé.")
         return redirect('home')
-    questions = Question.objects.all().order_by('-date_creation')  # ordre décroissant
-    return render(request, 'liste_questions.html', {'questions': questions})
+    # Le message complet n'est lu que sur la page de réponse
+    questions = Question.objects.defer('message', 'reponse').annotate(apercu=pagination.apercu('message'))
+    page, recherche_contexte = _recherche(request, questions)
+    if page is None:
+        page = pagination.paginer(questions, '-date_creation', pagination.curseur_de(request))  # ordre décroissant
+    if pagination.demande_json(request):
+        return pagination.reponse_json(page, ('id', 'sujet', 'nom', 'email', 'apercu', 'statut', 'date_creation'))
+    return render(request, 'liste_questions.html', {
+        'questions': page.objets,
+        'navigation': pagination.navigation(request, page),
+        **recherche_contexte,
+    })
 
 # 3. Répondre à une question
 @login_required
@@ -538,6 +759,7 @@ def repondre_question(request, question_id):
             question.statut = 'repondu'
             question.date_reponse = timezone.now()
             question.save()
+            faq.invalider()
             messages.success(request, "Réponse envoyée avec succès.")
             return redirect('liste_questions')
     else:
@@ -551,7 +773,7 @@ def repondre_question(request, question_id):
 @login_required
 @admin_required
 def reservation_valider(request, pk):
-    res = get_object_or_404(Reservation, pk=pk)
+    res = get_object_or_404(Reservation.objects.select_related('client__user'), pk=pk)
     res.statut = 'valide'
     res.save()
     messages.success(request, f"La réservation de {res.client.user.username} a été validée.")
@@ -560,7 +782,7 @@ def reservation_valider(request, pk):
 @login_required
 @admin_required
 def reservation_rejeter(request, pk):
-    res = get_object_or_404(Reservation, pk=pk)
+    res = get_object_or_404(Reservation.objects.select_related('client__user'), pk=pk)
     res.statut = 'rejete'
     res.save()
     messages.warning(request, f"La réservation de {res.client.user.username} a été rejetée.")
@@ -569,7 +791,7 @@ def reservation_rejeter(request, pk):
 @login_required
 @admin_required
 def reservation_lu(request, pk):
-    res = get_object_or_404(Reservation, pk=pk)
+    res = get_object_or_404(Reservation.objects.select_related('client__user'), pk=pk)
     res.statut = 'lu'
     res.save()
     messages.info(request, f"La réservation de {res.client.user.username} a été marquée comme lue.")
@@ -582,7 +804,7 @@ def reservation_lu(request, pk):
 @login_required
 @admin_required
 def abonnement_valider(request, pk):
-    ab = get_object_or_404(Abonnement, pk=pk)
+    ab = get_object_or_404(Abonnement.objects.select_related('client__user'), pk=pk)
     ab.statut = 'valide'
     ab.save()
     messages.success(request, f"L'abonnement de {ab.client.user.username} a été validé.")
@@ -591,7 +813,7 @@ def abonnement_valider(request, pk):
 @login_required
 @admin_required
 def abonnement_rejeter(request, pk):
-    ab = get_object_or_404(Abonnement, pk=pk)
+    ab = get_object_or_404(Abonnement.objects.select_related('client__user'), pk=pk)
     ab.statut = 'rejete'
     ab.save()
     messages.warning(request, f"L'abonnement de {ab.client.user.username} a été rejeté.")
@@ -600,7 +822,7 @@ def abonnement_rejeter(request, pk):
 @login_required
 @admin_required
 def abonnement_lu(request, pk):
-    ab = get_object_or_404(Abonnement, pk=pk)
+    ab = get_object_or_404(Abonnement.objects.select_related('client__user'), pk=pk)
     ab.statut = 'lu'
     ab.save()
     messages.info(request, f"L'abonnement de {ab.client.user.username} a été marqué comme lu.")
@@ -612,7 +834,7 @@ def client_dashboard(request):
     reservations = Reservation.objects.filter(client__user=request.user).order_by('-date_reservation')
 
     # Récupère uniquement les abonnements du client
-    abonnements = Abonnement.objects.filter(client__user=request.user).order_by('-date_demande')
+    abonnements = Abonnement.objects.filter(client__user=request.user).prefetch_related('jours').order_by('-date_demande')
 
     return render(request, 'client_dashboard.html', {
         'reservations': reservations,
@@ -647,32 +869,36 @@ def client_login(request):
 @login_required
 @admin_required
 def reservation(request):
-    reservations = Reservation.objects.select_related('client__user').order_by('-date_reservation')
-    abonnements = Abonnement.objects.select_related('client__user').prefetch_related('jours').order_by('-date_demande')
-
-    # Totaux pour les réservations
-    total_res_valide = reservations.filter(statut='valide').count()
-    total_res_attente = reservations.filter(statut='en_attente').count()
-    total_res_rejete = reservations.filter(statut='rejete').count()
-
-    # Totaux pour les abonnements
-    total_ab_valide = abonnements.filter(statut='valide').count()
-    total_ab_attente = abonnements.filter(statut='en_attente').count()
-    total_ab_rejete = abonnements.filter(statut='rejete').count()
-
+    statut, debut, fin = demandes.filtres_depuis_requete(request.GET)
+    reservations = demandes.filtrer(
+        Reservation.objects.select_related('client__user').only(
+            'date_reservation', 'date_course', 'heure_course', 'lieu_depart', 'lieu_arrivee', 'statut',
+            'client__user__username',
+        ),
+        'date_reservation', statut, debut, fin,
+    )
+    abonnements = demandes.filtrer(
+        Abonnement.objects.select_related('client__user').prefetch_related('jours').only(
+            'date_demande', 'heure_passage', 'lieu_depart', 'lieu_arrivee', 'statut', 'client__user__username',
+        ),
+        'date_demande', statut, debut, fin,
+    )
+    page_res = pagination.paginer(reservations, '-date_reservation', pagination.curseur_de(request, 'apres_res'))
+    page_ab = pagination.paginer(abonnements, '-date_demande', pagination.curseur_de(request, 'apres_ab'))
+
+    # Totaux par statut : une agrégation par modèle, en cache jusqu'au prochain changement
+    totaux = demandes.totaux()
     context = {
-        'reservations': reservations,
-        'abonnements': abonnements,
-        'res_totals': {
-            'valide': total_res_valide,
-            'attente': total_res_attente,
-            'rejete': total_res_rejete,
-        },
-        'ab_totals': {
-            'valide': total_ab_valide,
-            'attente': total_ab_attente,
-            'rejete': total_ab_rejete,
-        }
+        'reservations': page_res.objets,
+        'abonnements': page_ab.objets,
+        'navigation_res': pagination.navigation(request, page_res, 'apres_res'),
+        'navigation_ab': pagination.navigation(request, page_ab, 'apres_ab'),
+        'res_totals': totaux['reservations'],
+        'ab_totals': totaux['abonnements'],
+        'statuts': demandes.STATUTS,
+        'statut': statut,
+        'debut': debut,
+        'fin': fin,
     }
 
     return render(request, 'reservation.html', context)
@@ -682,8 +908,18 @@ def reservation(request):
 @login_required
 @admin_required
 def clients_list(request):
-    clients = Client.objects.select_related('user').all()
-    return render(request, 'clients_list.html', {'clients': clients})
+    clients = Client.objects.select_related('user').only(
+        'whatsapp', 'adresse', 'user__username', 'user__email', 'user__date_joined',
+    )
+    page = pagination.paginer(clients, '-pk', pagination.curseur_de(request))
+    if pagination.demande_json(request):
+        return pagination.reponse_json(page, (
+            'id', 'user.username', 'user.email', 'whatsapp', 'adresse', 'user.date_joined',
+        ))
+    return render(request, 'clients_list.html', {
+        'clients': page.objets,
+        'navigation': pagination.navigation(request, page),
+    })
 
 @login_required
 def client_ajouter_reservation(request):
@@ -694,7 +930,7 @@ def client_ajouter_reservation(request):
         form = ReservationForm(request.POST)
         if form.is_valid():
             res = form.save(commit=False)
-            res.client = request.user.client
+            res.client = profil(request).client
             res.save()
             messages.success(request, "Votre réservation a été enregistrée !")
             return redirect('client_dashboard')
@@ -712,7 +948,7 @@ def client_ajouter_abonnement(request):
         form = AbonnementForm(request.POST)
         if form.is_valid():
             ab = form.save(commit=False)
-            ab.client = request.user.client
+            ab.client = profil(request).client
             ab.save()
             form.save_m2m()  # pour enregistrer les jours sélectionnés
             messages.success(request, "Votre abonnement a été enregistré !")
@@ -732,10 +968,11 @@ def reservation_rapide_lu(request, pk):
     rr = get_object_or_404(ReservationRapide, pk=pk)
     rr.statut = 'lu'
     rr.save()
-    return redirect('reservations_rapides')
+    return redirect('liste_reservations_rapides')
 
 
 
+@page_publique()
 def reservation_rapide_view(request):
     """
     Vue pour permettre aux utilisateurs d'envoyer une réservation rapide.
@@ -746,8 +983,8 @@ def reservation_rapide_view(request):
             reservation = form.save(commit=False)
             
             # Si l'utilisateur est connecté, on lie automatiquement son profil client
-            if request.user.is_authenticated and hasattr(request.user, 'client'):
-                reservation.client = request.user.client
+            if profil(request).client is not None:
+                reservation.client = request.user
             
             reservation.save()
             messages.success(request, "Votre réservation rapide a été envoyée avec succès !")
@@ -761,20 +998,40 @@ def reservation_rapide_view(request):
     return render(request, 'reservation_rapide.html', context)
 
 
+def _page_reservations_rapides(request, reservations, gabarit, champ_message):
+    page, recherche_contexte = _recherche(request, reservations)
+    if page is None:
+        page = pagination.paginer(reservations, '-date_creation', pagination.curseur_de(request))
+    if pagination.demande_json(request):
+        return pagination.reponse_json(page, (
+            'id', 'nom', 'lieu', 'destination', 'heure', 'sujet', champ_message, 'whatsapp', 'statut', 'date_creation',
+        ))
+    return render(request, gabarit, {
+        'reservations': page.objets,
+        'navigation': pagination.navigation(request, page),
+        **recherche_contexte,
+    })
+
+
 @login_required
 @user_passes_test(lambda u: u.is_staff or u.is_superuser)
 def reservations_admin(request):
-    reservations = ReservationRapide.objects.select_related('client').order_by('-date_creation')
-    return render(request, 'reservations_admin.html', {'reservations': reservations})
+    reservations = (
+        ReservationRapide.objects.select_related('client')
+        .only('nom', 'lieu', 'destination', 'heure', 'sujet', 'whatsapp', 'statut', 'date_creation', 'client__email')
+        .annotate(apercu=pagination.apercu('message', 120))
+    )
+    return _page_reservations_rapides(request, reservations, 'reservations_admin.html', 'apercu')
 
 @login_required
 @staff_member_required  # si seulement les admins peuvent voir
 def liste_reservations_rapides(request):
-    reservations = ReservationRapide.objects.select_related('client').order_by('-date_creation')
-    context = {
-        'reservations': reservations
-    }
-    return render(request, 'liste_reservations_rapides.html', context)
+    # Page de lecture : le message reste entier, mais seulement pour les lignes de la page
+    reservations = ReservationRapide.objects.select_related('client').only(
+        'nom', 'lieu', 'destination', 'heure', 'sujet', 'message', 'whatsapp', 'statut', 'date_creation',
+        'client__email',
+    )
+    return _page_reservations_rapides(request, reservations, 'liste_reservations_rapides.html', 'message')
 
 @login_required
 @staff_member_required  # seulement admin
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -57,6 +58,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'gestion.middleware.profil_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -67,12 +69,19 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': ['templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'gestion.context_processors.version_gabarits',
+            ],
+            # Gabarits compilés une fois par processus (rechargés automatiquement si DEBUG)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
             ],
         },
     },
@@ -84,13 +93,83 @@ WSGI_APPLICATION = 'moto_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Réglages appliqués à chaque nouvelle connexion SQLite (init_command), pour
+# les saisies simultanées de fin de journée :
+#   - journal WAL : les lectures ne bloquent plus l'écriture, et inversement ;
+#   - synchronous=NORMAL : pas de fsync à chaque commit en WAL (sûr en cas de
+#     crash du processus, seule une coupure de courant peut perdre le dernier commit) ;
+#   - busy_timeout : un écrivain attend son tour jusqu'à 10 s au lieu d'échouer ;
+#   - mmap_size / cache_size : 256 Mo lus par projection mémoire, 20 Mo de cache de pages.
+# transaction_mode IMMEDIATE prend le verrou d'écriture dès BEGIN : une
+# transaction commencée en lecture n'a plus à le réclamer en cours de route,
+# ce qui échoue aussitôt (« database is locked ») sans attendre busy_timeout.
+# Mesure : python manage.py mesurer_ecritures_concurrentes
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 10_000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20_000,
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {nom}={valeur}' for nom, valeur in SQLITE_PRAGMAS.items()),
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    # Copie en lecture seule pour les rapports et les exports (voir gestion/instantane.py),
+    # rafraîchie par `python manage.py rafraichir_instantane --intervalle 300`
+    'instantane': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'instantane.sqlite3',
+        'OPTIONS': {
+            'init_command': ';'.join(
+                f'PRAGMA {nom}={SQLITE_PRAGMAS[nom]}' for nom in ('mmap_size', 'cache_size', 'temp_store')
+            ) + ';PRAGMA query_only=ON',
+        },
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['gestion.instantane.Routeur']
+
+# Au-delà, l'instantané n'est plus lu (tâche de rafraîchissement arrêtée ?) : retour à la base principale
+INSTANTANE_AGE_MAX = timedelta(minutes=30)
+
+
+# Cache partagé par tous les processus WSGI (fichiers locaux, aucun service externe)
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    },
+    # Jetons de sessions révoquées : ne doivent pas être évincés avant leur expiration
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache_sessions',
+        'OPTIONS': {'MAX_ENTRIES': 1_000_000},
+    },
+    # Compteurs de version (bilan, flotte, FAQ, demandes) : évincés, ils retomberaient
+    # à 0 et les entrées calculées sous une ancienne version redeviendraient valides
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache_versions',
+        'OPTIONS': {'MAX_ENTRIES': 1_000_000},
+    },
+}
+
+# Sessions en cookie signé (aucune écriture SQL par connexion ou par requête),
+# révocables côté serveur à la déconnexion : voir gestion/session_signee.py
+SESSION_ENGINE = 'gestion.session_signee'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -128,6 +207,10 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Fichiers déposés (factures des pannes) : servis par les vues de gestion, après contrôle d'accès
+MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_URL = 'media/'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -141,3 +224,7 @@ TIME_ZONE = 'Africa/Brazzaville'
 USE_I18N = True
 USE_L10N = True
 USE_TZ = True
+
+# Recettes gardées dans la table courante (mois entiers, en plus du mois en cours) ;
+# les plus anciennes passent dans l'archive : python manage.py archiver_recettes
+ARCHIVE_RECETTES_MOIS = 24